@@ -0,0 +1,417 @@
+"""
+Microbenchmarks of aicode's own hot paths, with JSON baselines.
+
+    ./bench [--baseline FILE] [--save] [--threshold 1.5] [--only NAME]...
+            [--min-time SECONDS] [--out FILE]
+
+runs python benchmarks/microbench.py with the same arguments. Every
+benchmark is timed with timeit, with enough calls for --min-time seconds per
+repeat, and the best repeat counts. Machines differ, so every result is also
+stored divided by the time of a fixed pure-Python calibration loop, timed in
+turns with the benchmark, and baselines are compared on those normalized
+numbers. A benchmark that is more than --threshold times slower than its
+baseline fails the run, --save writes the results as the new baseline
+instead.
+
+Nothing touches the real install, config or network, the install root,
+config storage and git trees are all made up in a temp directory. The
+runner lives next to its baseline rather than in the package, its fixtures
+patch aicode with unittest.mock.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+from unittest import mock
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_THRESHOLD = 1.5
+DEFAULT_MIN_TIME = 0.2  # seconds per repeat
+_REPEATS = 5
+
+_GENERATIONS = 200
+_TREE_DEPTH = 60
+
+
+@dataclass
+class BenchResult:
+    name: str
+    seconds: float  # per call, best repeat
+    normalized: float  # seconds / calibration seconds
+
+
+def _calls_for(timer: timeit.Timer, min_time: float) -> int:
+    timer.timeit(1)  # Warm up, first calls fill caches and import things.
+    once = timer.timeit(1)
+    return max(1, int(min_time / max(once, 1e-9)))
+
+
+def _time(func: Callable[[], object], min_time: float) -> tuple[float, float]:
+    """Returns the per call time of func and of the calibration loop, best
+    of _REPEATS. The two take turns, so that both see the same machine."""
+    timer = timeit.Timer(func)
+    calibration = timeit.Timer(_calibration)
+    number = _calls_for(timer, min_time)
+    calibration_number = _calls_for(calibration, min_time)
+    best = best_calibration = float("inf")
+    for _ in range(_REPEATS):
+        best_calibration = min(
+            best_calibration,
+            calibration.timeit(calibration_number) / calibration_number,
+        )
+        best = min(best, timer.timeit(number) / number)
+    return best, best_calibration
+
+
+def _calibration() -> None:
+    total = 0
+    for i in range(10_000):
+        total += i * i % 7
+    "-".join(str(i) for i in range(200))
+
+
+@contextlib.contextmanager
+def _quiet() -> Iterator[None]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def _chdir(path: Path) -> Iterator[None]:
+    old = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+# Every benchmark is a context manager that sets up its fixture and yields
+# the function to time.
+
+
+@contextlib.contextmanager
+def bench_args_parse(_tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode.args import Args
+
+    argv = ["--claude", "--keep", "--no-watch", "src/app.py", "--map-tokens", "1024"]
+    yield lambda: Args.parse(argv)
+
+
+@contextlib.contextmanager
+def bench_config_roundtrip(tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode import openaicfg
+    from aicode.config import Config
+
+    def _roundtrip() -> None:
+        config = Config.load()
+        config.aider_update_failures += 1
+        config.save()
+        # Like a new process would, re-read from the storage file.
+        openaicfg.reload_storage()
+
+    with mock.patch.object(openaicfg, "STORAGE_PATH", tmp / "config"):
+        openaicfg.reload_storage()
+        try:
+            yield _roundtrip
+        finally:
+            openaicfg.reload_storage()
+
+
+def _make_repo(tmp: Path) -> Path:
+    repo = tmp / "repo"
+    (repo / ".git").mkdir(parents=True)
+    (repo / ".gitignore").write_text(
+        ".aider*\n!.aider.conf.yml\n!.aiderignore\n", encoding="utf-8"
+    )
+    (repo / ".aiderignore").write_text("run\n", encoding="utf-8")
+    return repo
+
+
+@contextlib.contextmanager
+def _stubbed_launch(tmp: Path) -> Iterator[Path]:
+    from aicode import openaicfg
+    from aicode.config import Config
+
+    repo = _make_repo(tmp)
+    config = Config.from_dict(
+        {"anthropic_key": "sk-ant-bench", "openai_key": "sk-bench"}
+    )
+    patches: list[contextlib.AbstractContextManager] = [
+        mock.patch("aicode.build_cmd_list.Config.load", return_value=config),
+        mock.patch("aicode.build_cmd_list.aider_installed", return_value=True),
+        mock.patch("aicode.launch_plan.AIDER_INSTALL_PATH", tmp / "install"),
+        mock.patch("aicode.launch_plan.CONFIG_STORAGE_PATH", tmp / "config"),
+        mock.patch("aicode.launch_plan.LAUNCH_PLAN_PATH", tmp / "plans"),
+        mock.patch("aicode.prewarm.PREWARM_PATH", tmp / "prewarm"),
+        mock.patch.object(openaicfg, "STORAGE_PATH", tmp / "config"),
+        # build_cmd_list exports the keys, keep them out of this process.
+        mock.patch.dict(os.environ),
+    ]
+    (tmp / "install" / "0").mkdir(parents=True)
+    (tmp / "install" / "0" / "installed").touch()
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        stack.enter_context(_chdir(repo))
+        stack.enter_context(_quiet())
+        yield repo
+
+
+@contextlib.contextmanager
+def bench_build_cmd_list(tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode.args import Args
+    from aicode.build_cmd_list import build_cmd_list_or_die
+
+    args = Args(cli=True, claude=True)
+    with _stubbed_launch(tmp) as repo:
+        # The full preflight, no launch plan to skip it.
+        with mock.patch("aicode.build_cmd_list.compute_launch_key", return_value=None):
+
+            def _build() -> None:
+                build_cmd_list_or_die(args)
+                os.chdir(repo)
+
+            yield _build
+
+
+@contextlib.contextmanager
+def bench_build_cmd_list_cached(tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode.args import Args
+    from aicode.build_cmd_list import build_cmd_list_or_die
+
+    args = Args(cli=True, claude=True)
+    with _stubbed_launch(tmp) as repo:
+        build_cmd_list_or_die(args)  # Saves the launch plan.
+
+        def _build() -> None:
+            build_cmd_list_or_die(args)
+            os.chdir(repo)
+
+        yield _build
+
+
+def _make_install_root(tmp: Path) -> Path:
+    from aicode.install_manifest import (
+        STATUS_INSTALLED,
+        Generation,
+        InstallManifest,
+        save_manifest,
+    )
+
+    root = tmp / "install"
+    manifest = InstallManifest()
+    for i in range(_GENERATIONS):
+        (root / str(i)).mkdir(parents=True)
+        manifest.generations[str(i)] = Generation(
+            name=str(i), status=STATUS_INSTALLED, created=0.0, aider_version=f"0.{i}.0"
+        )
+    manifest.active = str(_GENERATIONS - 1)
+    save_manifest(root, manifest)
+    return root
+
+
+@contextlib.contextmanager
+def bench_highest_version_path(tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode.aider_control import _get_highest_version_path
+
+    root = _make_install_root(tmp)
+    yield lambda: _get_highest_version_path(root)
+
+
+@contextlib.contextmanager
+def bench_highest_version_path_cold(tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode import install_manifest
+    from aicode.aider_control import _get_highest_version_path
+
+    root = _make_install_root(tmp)
+
+    def _cold() -> None:
+        # Like the first call of a new process.
+        install_manifest._cache.clear()  # pylint: disable=protected-access
+        _get_highest_version_path(root)
+
+    yield _cold
+
+
+@contextlib.contextmanager
+def bench_extract_version_string(_tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode.util import extract_version_string
+
+    outputs = ["aider 0.86.2", "Aider v0.86.2\nModel: sonnet", "0.86.2.dev12+g1a2b3c4"]
+
+    def _extract() -> None:
+        for output in outputs:
+            extract_version_string(output)
+
+    yield _extract
+
+
+@contextlib.contextmanager
+def bench_update_result_from_json(_tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode.aider_update_result import AiderUpdateResult
+
+    data: dict[str, str | bool | None] = AiderUpdateResult(
+        True, "0.86.2", "0.85.1"
+    ).to_json_data()
+    yield lambda: AiderUpdateResult.from_json(data)
+
+
+@contextlib.contextmanager
+def bench_find_git_directory(tmp: Path) -> Iterator[Callable[[], object]]:
+    from aicode.util import _find_path_to_git_directory
+
+    repo = _make_repo(tmp)
+    deep = repo.joinpath(*[f"d{i}" for i in range(_TREE_DEPTH)])
+    deep.mkdir(parents=True)
+    yield lambda: _find_path_to_git_directory(deep)
+
+
+BENCHMARKS: dict[
+    str, Callable[[Path], contextlib.AbstractContextManager[Callable[[], object]]]
+] = {
+    "args_parse": bench_args_parse,
+    "config_roundtrip": bench_config_roundtrip,
+    "build_cmd_list": bench_build_cmd_list,
+    "build_cmd_list_cached": bench_build_cmd_list_cached,
+    "highest_version_path": bench_highest_version_path,
+    "highest_version_path_cold": bench_highest_version_path_cold,
+    "extract_version_string": bench_extract_version_string,
+    "update_result_from_json": bench_update_result_from_json,
+    "find_git_directory": bench_find_git_directory,
+}
+
+
+def run_benchmarks(
+    names: list[str] | None = None, min_time: float = DEFAULT_MIN_TIME
+) -> tuple[float, list[BenchResult]]:
+    """Returns the median calibration time and the results."""
+    calibrations: list[float] = []
+    results: list[BenchResult] = []
+    for name in names or list(BENCHMARKS):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with BENCHMARKS[name](Path(temp_dir)) as func:
+                seconds, calibration = _time(func, min_time)
+        calibrations.append(calibration)
+        results.append(
+            BenchResult(name=name, seconds=seconds, normalized=seconds / calibration)
+        )
+    return statistics.median(calibrations), results
+
+
+def to_json_data(calibration: float, results: list[BenchResult]) -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "calibration_seconds": calibration,
+        "results": {r.name: asdict(r) for r in results},
+    }
+
+
+@dataclass
+class Regression:
+    name: str
+    ratio: float
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float
+) -> tuple[dict[str, float], list[Regression]]:
+    """Returns the slowdown ratio of every benchmark in both, and the ones
+    over threshold."""
+    ratios: dict[str, float] = {}
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None or base["normalized"] <= 0:
+            continue
+        ratios[name] = result["normalized"] / base["normalized"]
+    regressions = [
+        Regression(name, ratio) for name, ratio in ratios.items() if ratio > threshold
+    ]
+    return ratios, regressions
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    return f"{seconds * 1e3:.2f}ms"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks/microbench.py",
+        description="Microbenchmarks of aicode's hot paths",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=DEFAULT_BASELINE,
+        help=f"Baseline JSON (default: {DEFAULT_BASELINE})",
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="Write the results as the new baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Fail when this many times slower than the baseline",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=list(BENCHMARKS),
+        help="Run only these benchmarks",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=DEFAULT_MIN_TIME,
+        help="Seconds per timing repeat",
+    )
+    parser.add_argument("--out", type=Path, help="Also write the results as JSON here")
+    args = parser.parse_args(argv)
+
+    calibration, results = run_benchmarks(args.only, args.min_time)
+    current = to_json_data(calibration, results)
+    baseline: dict | None = None
+    if not args.save and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    ratios, regressions = (
+        compare(baseline, current, args.threshold) if baseline else ({}, [])
+    )
+    print(f"calibration: {_format_seconds(calibration)}")
+    for result in results:
+        line = f"{result.name}: {_format_seconds(result.seconds)} ({result.normalized:.3f}x calibration)"
+        if result.name in ratios:
+            line += f", {ratios[result.name]:.2f}x baseline"
+        print(line)
+    if args.out is not None:
+        args.out.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, run with --save to make one")
+        return 0
+    for regression in regressions:
+        print(
+            f"REGRESSION: {regression.name} is {regression.ratio:.2f}x slower than the baseline (threshold {args.threshold}x)"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
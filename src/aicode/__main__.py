@@ -2,11 +2,13 @@
 
 import sys
 
-from aicode.cli import cli
-
 
 def main() -> int:
     try:
+        # Imported here so that "python -m aicode" and the console script
+        # share the same lazy import path, see cli.py.
+        from aicode.cli import cli
+
         return cli()
     except KeyboardInterrupt:
         return 1
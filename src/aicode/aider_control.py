@@ -1,21 +1,45 @@
+import os
 import shutil
 import subprocess
 import sys
+import time
 import warnings
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from iso_env import IsoEnv, IsoEnvArgs, Requirements
 
-from aicode.aider_update_result import AiderUpdateResult
+from aicode.aider_update_result import AiderUpdateResult, Version
 from aicode.config import Config
+from aicode.install_lock import install_lock, write_owner
+from aicode.install_manifest import (
+    STATUS_FAILED,
+    STATUS_INSTALLED,
+    STATUS_INSTALLING,
+    Generation,
+    InstallManifest,
+    describe_generation,
+    is_install_root,
+    load_manifest,
+    read_aider_version,
+    update_manifest,
+)
 from aicode.paths import AIDER_INSTALL_PATH
+from aicode.startup_trace import traced
 from aicode.util import extract_version_string
 
+if TYPE_CHECKING:
+    from aicode.install_lock import InstallOwner
+    from aicode.version_source import VersionSource
+
 REQUIREMENTS_TXT = """
 aider-chat[playwright,browser]
 dotenv
 """
 
+# Written into a generation that was installed with a pinned aider version.
+_REQUIREMENTS_FILE = "requirements.txt"
+
 
 # AIDER_CHAT = "git+https://github.com/Aider-AI/aider.git@main#egg=aider"
 # # REQUIREMENTS = [AIDER_CHAT]
@@ -35,28 +59,24 @@ dotenv
 
 
 def _get_highest_version_path(path: Path) -> Path:
-    subpaths = list(path.iterdir())
-    # paths will be labeled with 0, 1, 2, 3, etc.
-    path_ints = [int(p.name) for p in subpaths if p.is_dir() if p.name.isdigit()]
-    path_ints.sort()
-    if path_ints:
-        return path / str(path_ints[-1])
+    """Returns the active install generation under path, or path if none."""
+    # paths will be labeled with 0, 1, 2, 3, etc. See install_manifest.py
+    manifest = load_manifest(path)
+    if manifest.active is not None:
+        return path / manifest.active
     return path
 
 
 def _get_next_install_path(path: Path) -> Path:
-    subpaths = list(path.iterdir())
-    # paths will be labeled with 0, 1, 2, 3, etc.
-    path_ints = [int(p.name) for p in subpaths if p.is_dir() if p.name.isdigit()]
-    if path_ints:
-        return path / str(max(path_ints) + 1)
-    return path / "0"
+    return path / load_manifest(path).next_name()
 
 
 def _get_path(path: Path | None) -> Path:
-    if path:
-        return path
-    return _get_highest_version_path(AIDER_INSTALL_PATH)
+    if path is None:
+        return _get_highest_version_path(AIDER_INSTALL_PATH)
+    if is_install_root(path):
+        return _get_highest_version_path(path)
+    return path
 
 
 def _save_install_breadcrumb(path: Path) -> None:
@@ -69,18 +89,88 @@ def _has_install_breadcrumb(path: Path) -> bool:
     return (path / "installed").exists()
 
 
+def get_venv_path(path: Path) -> Path:
+    """The venv that iso-env builds for an install generation."""
+    return path / ".venv" / ".venv"
+
+
+def get_venv_bin(path: Path) -> Path:
+    venv = get_venv_path(path)
+    return venv / "Scripts" if sys.platform == "win32" else venv / "bin"
+
+
+def get_venv_python(path: Path) -> Path:
+    exe = "python.exe" if sys.platform == "win32" else "python"
+    return get_venv_bin(path) / exe
+
+
+def get_venv_env(path: Path, env: dict[str, str] | None = None) -> dict[str, str]:
+    """Returns env with the install generation's venv activated."""
+    out = dict(os.environ if env is None else env)
+    out["VIRTUAL_ENV"] = str(get_venv_path(path))
+    out["PATH"] = os.pathsep.join([str(get_venv_bin(path)), out.get("PATH", "")])
+    out.pop("PYTHONHOME", None)
+    return out
+
+
+def pin_requirements(aider_version: str) -> str:
+    return REQUIREMENTS_TXT.replace(
+        "aider-chat[playwright,browser]",
+        f"aider-chat[playwright,browser]=={aider_version}",
+    )
+
+
+def _get_requirements(path: Path) -> str:
+    # iso-env rebuilds the venv when the requirements change, so a pinned
+    # generation has to keep being opened with its own pin.
+    try:
+        return (path / _REQUIREMENTS_FILE).read_text(encoding="utf-8")
+    except OSError:
+        return REQUIREMENTS_TXT
+
+
+@traced("get_iso_env")
 def get_iso_env(path: Path) -> IsoEnv:
     """Creates and returns an IsoEnv instance"""
     args = IsoEnvArgs(
         venv_path=path / ".venv",
-        build_info=Requirements(REQUIREMENTS_TXT, python_version="==3.11.*"),
+        build_info=Requirements(_get_requirements(path), python_version="==3.11.*"),
     )
     return IsoEnv(args)
 
 
-def aider_fetch_update_status(path: Path | None = None) -> AiderUpdateResult:
-    """Fetches the update string if it exists, else returns None if up to date"""
-    path = _get_path(path)
+def _is_newer(latest: str, current: str) -> bool:
+    try:
+        return Version(latest) > Version(current)
+    except ValueError:
+        return latest != current  # dev versions and the like
+
+
+def aider_fetch_update_status(
+    path: Path | None = None, source: "VersionSource | None" = None
+) -> AiderUpdateResult:
+    """Compares the installed aider version with the latest one from source.
+
+    Neither needs aider to run, the installed version comes from the venv's
+    dist-info and the latest from the version source (PyPI by default).
+    """
+    from aicode.version_source import AIDER_PACKAGE, get_version_source
+
+    path = ensure_installed(path)
+    current_version = read_aider_version(get_venv_path(path))
+    if current_version is None:
+        return _fetch_update_status_from_aider(path)
+    # Errors propagate, the background update check backs off on them.
+    latest_version = (source or get_version_source()).latest_version(AIDER_PACKAGE)
+    return AiderUpdateResult(
+        has_update=_is_newer(latest_version, current_version),
+        latest_version=latest_version,
+        current_version=current_version,
+    )
+
+
+def _fetch_update_status_from_aider(path: Path) -> AiderUpdateResult:
+    """Asks aider itself, for installs without readable dist-info."""
     cp = aider_run(
         ["aider", "--just-check-update"],
         path=path,
@@ -124,11 +214,7 @@ def aider_run(
     cmd_list: list[str], path: Path | None = None, **process_args
 ) -> subprocess.CompletedProcess:
     """Runs the command using the isolated environment."""
-    path = _get_path(path)
-    if not aider_installed(path):
-        aider_install(path)
-
-    iso = get_iso_env(path)
+    iso = get_iso_env(ensure_installed(path))
     return iso.run(cmd_list, **process_args)
 
     # cwd = os.getcwd()
@@ -136,22 +222,116 @@ def aider_run(
     #     return iso.run(cmd_list, **process_args)
 
 
-def aider_install(path: Path | None = None) -> None:
-    """Uses iso-env to install aider."""
-    path = path or AIDER_INSTALL_PATH
-    path = _get_next_install_path(path)
-    if aider_installed(path):
-        return
+def aider_open_proc(
+    cmd_list: list[str], path: Path | None = None, **process_args
+) -> subprocess.Popen:
+    """Like aider_run, but returns the running process."""
+    iso = get_iso_env(ensure_installed(path))
+    return iso.open_proc(cmd_list, **process_args)
+
+
+def _set_generation(root: Path, generation: Generation, activate: bool) -> None:
+    def _update(manifest: InstallManifest) -> None:
+        manifest.generations[generation.name] = generation
+        if activate:
+            manifest.active = generation.name
+
+    update_manifest(root, _update)
+
+
+def _reserve_next_install_path(root: Path, aider_version: str | None = None) -> Path:
+    """Claims the next generation in the manifest so that it's never reused."""
+    reserved: list[str] = []
+
+    def _reserve(manifest: InstallManifest) -> None:
+        name = manifest.next_name()
+        manifest.generations[name] = Generation(
+            name=name,
+            status=STATUS_INSTALLING,
+            created=time.time(),
+            aider_version=aider_version,
+        )
+        reserved.append(name)
+
+    update_manifest(root, _reserve)
+    return root / reserved[0]
+
+
+def _install_locked(
+    root: Path, owner: "InstallOwner", aider_version: str | None, activate: bool
+) -> Path:
+    path = _reserve_next_install_path(root, aider_version)
+    owner.generation = path.name
+    write_owner(root, owner)
 
     # print("Installing aider...")
     print(f"Installing aider to {path}...")
     path.mkdir(exist_ok=True, parents=True)
+    if aider_version is not None:
+        (path / _REQUIREMENTS_FILE).write_text(
+            pin_requirements(aider_version), encoding="utf-8"
+        )
 
     # noqa: F841 - IsoEnv constructor creates the environment even if we don't use the returned object
     iso = get_iso_env(path)
-    iso.run(["aider", "--version"], check=True)
+    try:
+        iso.run(["aider", "--version"], check=True)
+    except BaseException:
+        _set_generation(root, describe_generation(path, STATUS_FAILED), activate=False)
+        raise
     _save_install_breadcrumb(path)
+    generation = describe_generation(path, STATUS_INSTALLED)
+    generation.aider_version = generation.aider_version or aider_version
+    _set_generation(root, generation, activate=activate)
     print("Aider installed successfully.")
+    return path
+
+
+def aider_install(
+    path: Path | None = None, aider_version: str | None = None, activate: bool = True
+) -> Path:
+    """Uses iso-env to install aider into a new generation and returns it.
+
+    With activate=False the generation is recorded as installed but launches
+    keep using the active one until activate_generation is called. Installs
+    into the same root take turns, see install_lock.py.
+    """
+    root = path or AIDER_INSTALL_PATH
+    with install_lock(root) as owner:
+        return _install_locked(root, owner, aider_version, activate)
+
+
+def ensure_installed(path: Path | None = None) -> Path:
+    """Returns the generation to run aider from, installing one if there is
+    none. Of several processes that find none, one installs and the others
+    wait for it and use its install."""
+    resolved = _get_path(path)
+    if aider_installed(resolved):
+        return resolved
+    root = path or AIDER_INSTALL_PATH
+    with install_lock(root) as owner:
+        resolved = _get_path(root)
+        if aider_installed(resolved):
+            return resolved
+        return _install_locked(root, owner, None, activate=True)
+
+
+def activate_generation(root: Path, name: str) -> None:
+    """Points new launches at generation name. Running sessions are unaffected,
+    they resolved their generation at launch."""
+
+    def _activate(manifest: InstallManifest) -> None:
+        if manifest.generations[name].status != STATUS_INSTALLED:
+            raise ValueError(f"Generation {name} is not installed")
+        manifest.active = name
+
+    update_manifest(root, _activate)
+
+
+def mark_generation_failed(root: Path, name: str) -> None:
+    _set_generation(
+        root, describe_generation(root / name, STATUS_FAILED), activate=False
+    )
 
 
 def aider_install_path() -> str | None:
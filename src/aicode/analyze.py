@@ -0,0 +1,422 @@
+"""
+Repo analyzer, "aicode analyze".
+
+Walks the repo with os.scandir from a thread pool, skipping what git and
+.aiderignore already ignore, and reports files, bytes and estimated tokens
+per directory. It flags the files that only cost context: binaries,
+generated files (lock files, minified bundles, protobuf output, anything
+that says it is generated), vendored copies and oversized files, and offers
+to put them in .aiderignore. Vendored directories are flagged as a whole
+and not walked. Many flagged files in one place become one entry, the
+directory or a pattern of their extension. The entries go into a block of
+their own, which a later run replaces, so the hand written lines are kept.
+
+    aicode analyze [--depth N] [--max-file-kb KB] [--write | --dry-run] [--json]
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from aicode.ignore_rules import IgnoreRules
+
+AIDERIGNORE = ".aiderignore"
+
+_BLOCK_START = "# Added by aicode analyze, rerun it to update"
+_BLOCK_END = "# End of aicode analyze"
+
+DEFAULT_MAX_FILE_KB = 256
+
+# Flagged files in one directory from which on they get a single entry.
+_COLLAPSE_MIN = 10
+
+# A rough average for code and prose.
+_BYTES_PER_TOKEN = 4
+
+_SNIFF_BYTES = 8192
+
+_BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".tif", ".tiff", ".psd",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar", ".tar", ".jar", ".whl",
+    ".so", ".dll", ".dylib", ".exe", ".o", ".a", ".lib", ".obj", ".pyc", ".class", ".wasm",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
+    ".mp3", ".mp4", ".wav", ".ogg", ".flac", ".mov", ".avi", ".mkv", ".webm",
+    ".ttf", ".otf", ".woff", ".woff2", ".eot", ".db", ".sqlite", ".sqlite3", ".bin", ".dat",
+}  # fmt: skip
+
+_GENERATED_NAMES = [
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*.lock",
+    "package-lock.json",
+    "pnpm-lock.yaml",
+    "go.sum",
+    "*_pb2.py",
+    "*_pb2_grpc.py",
+    "*.pb.go",
+    "*.pb.cc",
+    "*.pb.h",
+    "*.generated.*",
+    "*.g.dart",
+]
+
+# What generators put at the top of their output: the @generated tag, Go's
+# "Code generated ... DO NOT EDIT." and the like, and comment lines that
+# start with "generated by".
+_GENERATED_HEADER = re.compile(
+    rb"@generated\b"
+    rb"|\bgenerated\b.{0,80}\bdo not (?:edit|modify)\b"
+    rb"|\bdo not (?:edit|modify)\b.{0,80}\bgenerated\b"
+    rb"|^\W{0,4}(?:this (?:file|code) (?:is|was) )?(?:auto-?)?generated (?:by|from|with)\b",
+    re.DOTALL | re.MULTILINE,
+)
+
+_VENDOR_DIRS = {
+    "vendor",
+    "vendored",
+    "third_party",
+    "thirdparty",
+    "3rdparty",
+    "external",
+    "node_modules",
+    "bower_components",
+}
+
+
+@dataclass
+class DirStats:
+    path: str
+    files: int = 0
+    bytes: int = 0
+    tokens: int = 0
+
+
+@dataclass
+class Flagged:
+    path: str
+    reason: str  # binary, generated, vendored or oversized
+    bytes: int | None  # None for vendored directories, they aren't walked
+
+
+@dataclass
+class Analysis:
+    root: str
+    files: int = 0
+    bytes: int = 0
+    tokens: int = 0
+    dirs: list[DirStats] = field(default_factory=list)
+    flagged: list[Flagged] = field(default_factory=list)
+    # The .aiderignore lines that drop the flagged files.
+    ignore_entries: list[str] = field(default_factory=list)
+
+
+def classify(path: Path, name: str, size: int, max_bytes: int) -> str | None:
+    """Why the file should be ignored, None if it shouldn't."""
+    ext = os.path.splitext(name)[1].lower()
+    if ext in _BINARY_EXTENSIONS:
+        return "binary"
+    if any(fnmatch.fnmatch(name, pattern) for pattern in _GENERATED_NAMES):
+        return "generated"
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_SNIFF_BYTES)
+    except OSError:
+        return None
+    if b"\0" in head:
+        return "binary"
+    if _GENERATED_HEADER.search(head[:1024].lower()):
+        return "generated"
+    if size > max_bytes:
+        return "oversized"
+    return None
+
+
+@dataclass
+class _DirResult:
+    rel: str
+    subdirs: list[str]
+    vendored: list[str] = field(default_factory=list)
+    files: int = 0
+    bytes: int = 0
+    tokens: int = 0
+    flagged: list[Flagged] = field(default_factory=list)
+    # Extensions of the files here that aren't flagged.
+    kept_exts: set[str] = field(default_factory=set)
+
+
+class _Walker:
+    def __init__(self, rules: IgnoreRules, max_bytes: int) -> None:
+        self.rules = rules
+        self.max_bytes = max_bytes
+        # IgnoreRules fills its caches as it goes and isn't thread safe, the
+        # directory listings and file reads are what runs in parallel.
+        self._lock = threading.Lock()
+
+    def _ignored(self, rel: str, is_dir: bool) -> bool:
+        with self._lock:
+            return self.rules.is_ignored(rel, is_dir)
+
+    def scan(self, rel_dir: str) -> _DirResult:
+        result = _DirResult(rel_dir, [])
+        path = self.rules.root / rel_dir if rel_dir else self.rules.root
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return result
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if self._ignored(rel, True):
+                        continue
+                    # Dropped as a whole, what is in there doesn't matter.
+                    if entry.name.lower() in _VENDOR_DIRS:
+                        result.vendored.append(rel)
+                    else:
+                        result.subdirs.append(rel)
+                    continue
+                if not entry.is_file(follow_symlinks=False) or self._ignored(
+                    rel, False
+                ):
+                    continue
+                size = entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+            reason = classify(Path(entry.path), entry.name, size, self.max_bytes)
+            result.files += 1
+            result.bytes += size
+            if reason != "binary":
+                result.tokens += size // _BYTES_PER_TOKEN
+            if reason is not None:
+                result.flagged.append(Flagged(rel, reason, size))
+            else:
+                result.kept_exts.add(os.path.splitext(entry.name)[1].lower())
+        return result
+
+
+def _collapse(results: dict[str, _DirResult]) -> list[str]:
+    """The .aiderignore entries of the flagged files: a directory with
+    nothing but flagged files below it is one entry, so are the flagged
+    files of an extension that no kept file of the directory has, once
+    there are _COLLAPSE_MIN of them. The rest are listed one by one."""
+    flagged_below: dict[str, int] = {}
+    clean: dict[str, bool] = {}
+    # Children before parents, by depth.
+    for rel in sorted(results, key=lambda r: r.count("/") if r else -1, reverse=True):
+        result = results[rel]
+        flagged_below[rel] = len(result.flagged) + sum(
+            flagged_below[sub] for sub in result.subdirs
+        )
+        clean[rel] = not result.kept_exts and all(clean[sub] for sub in result.subdirs)
+
+    entries: list[str] = []
+
+    def _add(rel: str) -> None:
+        result = results[rel]
+        if rel and clean[rel] and flagged_below[rel] >= _COLLAPSE_MIN:
+            entries.append(f"/{rel}/")
+            return
+        entries.extend(f"/{vendored}/" for vendored in result.vendored)
+        by_ext: dict[str, list[Flagged]] = {}
+        for flagged in result.flagged:
+            ext = os.path.splitext(flagged.path)[1].lower()
+            by_ext.setdefault(ext, []).append(flagged)
+        for ext, files in by_ext.items():
+            if ext and ext not in result.kept_exts and len(files) >= _COLLAPSE_MIN:
+                entries.append(f"/{rel}/*{ext}" if rel else f"/*{ext}")
+            else:
+                entries.extend(f"/{flagged.path}" for flagged in files)
+        for sub in result.subdirs:
+            _add(sub)
+
+    _add("")
+    return sorted(entries)
+
+
+def analyze_repo(
+    root: Path,
+    depth: int = 1,
+    max_file_kb: int = DEFAULT_MAX_FILE_KB,
+    workers: int | None = None,
+) -> Analysis:
+    """Walks the repo, ignoring what git does and the hand written part of
+    the .aiderignore, and rolls the numbers up to directories depth levels
+    deep."""
+    root = root.resolve()
+    rules = IgnoreRules(root)
+    own_lines, _ = split_aiderignore(_read_aiderignore(root))
+    rules.add_extra(own_lines)
+    walker = _Walker(rules, max_file_kb * 1024)
+    analysis = Analysis(str(root))
+    dirs: dict[str, DirStats] = {}
+    results: dict[str, _DirResult] = {}
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze") as pool:
+        running: set[Future] = {pool.submit(walker.scan, "")}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result: _DirResult = future.result()
+                results[result.rel] = result
+                running.update(pool.submit(walker.scan, rel) for rel in result.subdirs)
+                key = "/".join(result.rel.split("/")[:depth]) if result.rel else "."
+                stats = dirs.setdefault(key, DirStats(key))
+                stats.files += result.files
+                stats.bytes += result.bytes
+                stats.tokens += result.tokens
+                analysis.files += result.files
+                analysis.bytes += result.bytes
+                analysis.tokens += result.tokens
+                analysis.flagged += result.flagged
+                analysis.flagged += [
+                    Flagged(rel + "/", "vendored", None) for rel in result.vendored
+                ]
+    analysis.flagged.sort(key=lambda f: f.path)
+    analysis.dirs = sorted(dirs.values(), key=lambda s: s.tokens, reverse=True)
+    analysis.ignore_entries = _collapse(results)
+    return analysis
+
+
+def _read_aiderignore(root: Path) -> list[str]:
+    try:
+        return (root / AIDERIGNORE).read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return []
+
+
+def split_aiderignore(lines: list[str]) -> tuple[list[str], list[str]]:
+    """(hand written lines, lines of the analyze block)."""
+    own: list[str] = []
+    block: list[str] = []
+    inside = False
+    for line in lines:
+        if line.strip() == _BLOCK_START:
+            inside = True
+        elif line.strip() == _BLOCK_END and inside:
+            inside = False
+        elif inside:
+            block.append(line)
+        else:
+            own.append(line)
+    return own, block
+
+
+def merge_aiderignore(lines: list[str], entries: list[str]) -> list[str]:
+    """The .aiderignore with the analyze block replaced by entries."""
+    own, _ = split_aiderignore(lines)
+    while own and not own[-1].strip():
+        own.pop()
+    if not entries:
+        return own
+    return own + ([""] if own else []) + [_BLOCK_START] + entries + [_BLOCK_END]
+
+
+def write_aiderignore(root: Path, entries: list[str]) -> Path:
+    path = root / AIDERIGNORE
+    lines = merge_aiderignore(_read_aiderignore(root), entries)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def _human(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def print_report(analysis: Analysis, top: int = 20) -> None:
+    print(
+        f"{analysis.root}: {analysis.files} files, {_human(analysis.bytes)}, ~{analysis.tokens:,} tokens"
+    )
+    print(f"\n{'tokens':>12} {'size':>10} {'files':>7}  directory")
+    for stats in analysis.dirs[:top]:
+        print(
+            f"{stats.tokens:>12,} {_human(stats.bytes):>10} {stats.files:>7}  {stats.path}"
+        )
+    if len(analysis.dirs) > top:
+        print(f"{'':>31}  ... {len(analysis.dirs) - top} more")
+    if not analysis.flagged:
+        print("\nNothing to drop from the context.")
+        return
+    print("\nFlagged:")
+    for flagged in analysis.flagged:
+        size = _human(flagged.bytes) if flagged.bytes is not None else "-"
+        print(f"  {flagged.reason:<10} {size:>10}  {flagged.path}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="aicode analyze", description="Find what aider should ignore in a repo"
+    )
+    parser.add_argument(
+        "root", nargs="?", type=Path, help="Repo root, the current repo by default"
+    )
+    parser.add_argument(
+        "--depth", type=int, default=1, help="Directory depth of the report"
+    )
+    parser.add_argument(
+        "--max-file-kb",
+        type=int,
+        default=DEFAULT_MAX_FILE_KB,
+        help="Flag text files bigger than this",
+    )
+    parser.add_argument("--workers", type=int, help="Scanning threads")
+    parser.add_argument("--json", action="store_true", help="Print JSON, write nothing")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--write", action="store_true", help=f"Update {AIDERIGNORE} without asking"
+    )
+    group.add_argument(
+        "--dry-run",
+        action="store_true",
+        help=f"Print the {AIDERIGNORE} instead of writing it",
+    )
+    args = parser.parse_args(argv)
+    root = args.root
+    if root is None:
+        from aicode.markers import repo_root
+
+        root = repo_root(Path.cwd())
+    analysis = analyze_repo(
+        root, depth=args.depth, max_file_kb=args.max_file_kb, workers=args.workers
+    )
+    if args.json:
+        print(json.dumps(asdict(analysis), indent=2))
+        return 0
+    print_report(analysis)
+    entries = analysis.ignore_entries
+    lines = _read_aiderignore(Path(analysis.root))
+    _, current = split_aiderignore(lines)
+    if entries == current:
+        if entries:
+            print(f"\n{AIDERIGNORE} is up to date.")
+        return 0
+    if args.dry_run:
+        print(f"\n{AIDERIGNORE} would be:\n")
+        print("\n".join(merge_aiderignore(lines, entries)))
+        return 0
+    if not args.write:
+        if not sys.stdin.isatty():
+            print(f"\nRun with --write to update {AIDERIGNORE}.")
+            return 0
+        resp = input(f"\nUpdate {AIDERIGNORE} with {len(entries)} entries? [y/N] ")
+        if resp.strip().lower() != "y":
+            return 0
+    path = write_aiderignore(Path(analysis.root), entries)
+    print(f"Updated {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
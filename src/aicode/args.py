@@ -5,6 +5,8 @@ import sys
 from dataclasses import dataclass, field
 from pathlib import Path
 
+from aicode.startup_trace import traced
+
 
 def fix_escape_chars(path: str) -> str:
     if os.name != "nt":
@@ -62,6 +64,10 @@ class Args:
     open_aider_path: bool = False
     purge: bool = False
     upgrade: bool = False
+    gc: bool = False
+    gc_keep: int | None = None
+    export_wheelhouse: Path | None = None
+    install_from_wheelhouse: Path | None = None
     keep: bool = False
     auto_commit: bool = False
     no_watch: bool = False
@@ -74,6 +80,10 @@ class Args:
     gui: bool = False
     cli: bool = False
     message_file: Path | None = None
+    yes_always: bool = False
+    warm: bool = False
+    trace_startup: str | None = None
+    session_log: Path | None = None
     unknown_args: list[str] = field(default_factory=list)
 
     @staticmethod
@@ -81,6 +91,27 @@ class Args:
         return _parse_args(args)
 
 
+def pop_trace_startup(args: list[str]) -> tuple[str | None, list[str]]:
+    """Removes --trace-startup[=FILE] from args, returns (trace file, rest).
+
+    Handled outside of argparse so that a bare --trace-startup never swallows
+    the next positional arg as its file name.
+    """
+    from aicode.startup_trace import DEFAULT_TRACE_FILE
+
+    trace_file: str | None = None
+    rest: list[str] = []
+    for arg in args:
+        if arg == "--trace-startup":
+            trace_file = DEFAULT_TRACE_FILE
+        elif arg.startswith("--trace-startup="):
+            trace_file = arg.split("=", 1)[1] or DEFAULT_TRACE_FILE
+        else:
+            rest.append(arg)
+    return trace_file, rest
+
+
+@traced("args.parse")
 def _parse_args(args: list[str] | None) -> Args:
     from aicode.models import MODEL_CHOICES
     from aicode.paths import AIDER_INSTALL_PATH
@@ -90,7 +121,8 @@ def _parse_args(args: list[str] | None) -> Args:
         usage=(
             "Ask OpenAI for help with code, uses aider-chat on the backend. "
             "Any args not listed here are assumed to be for aider and will be passed on to it.\n"
-            f"The real aider install path will be located at {AIDER_INSTALL_PATH}"
+            f"The real aider install path will be located at {AIDER_INSTALL_PATH}\n"
+            "Subcommands: aicode agent|analyze|batch|bench-models|fanout|history|markers|prewarm|stats ..., see aicode <subcommand> --help"
         )
     )
     argparser.add_argument("prompt", nargs="*", help="Args to pass onto aider")
@@ -106,10 +138,36 @@ def _parse_args(args: list[str] | None) -> Args:
         "--purge", action="store_true", help="Purge aider installation"
     )
     argparser.add_argument(
-        "--upgrade", action="store_true", help="Upgrade aider using pipx"
+        "--upgrade",
+        action="store_true",
+        help="Upgrade aider in the background, the next launch uses the new version",
+    )
+    argparser.add_argument(
+        "--gc",
+        action="store_true",
+        help="Delete stale aider install generations and deduplicate the rest",
+    )
+    argparser.add_argument(
+        "--gc-keep",
+        type=int,
+        help="Number of newest installed generations that --gc keeps, the active one is always kept (default: 2)",
+    )
+    argparser.add_argument(
+        "--export-wheelhouse",
+        type=Path,
+        metavar="DIR",
+        help="Bundle the wheels of the installed aider into DIR for offline installs",
     )
     argparser.add_argument(
-        "--keep", action="store_true", help="Keep chat/input history"
+        "--install-from-wheelhouse",
+        type=Path,
+        metavar="DIR",
+        help="Install aider offline from a bundle made with --export-wheelhouse",
+    )
+    argparser.add_argument(
+        "--keep",
+        action="store_true",
+        help="Keep the last session in the chat/input history, see aicode history",
     )
     argparser.add_argument(
         "--auto-commit",
@@ -133,11 +191,32 @@ def _parse_args(args: list[str] | None) -> Args:
         action="store_true",
         help="Usses architect mode",
     )
+    argparser.add_argument(
+        "--warm",
+        action="store_true",
+        help="Launch aider from a warm background worker that has aider preloaded (not on Windows)",
+    )
+    argparser.add_argument(
+        "--trace-startup",
+        action="store_true",
+        help="Record the startup phases to a Chrome trace file, use --trace-startup=FILE to pick the file (default: aicode-trace.json)",
+    )
+    argparser.add_argument(
+        "--session-log",
+        type=Path,
+        metavar="FILE",
+        help="Record the session to FILE as a compressed asciicast, zstd for a .zst FILE, gzip otherwise",
+    )
     argparser.add_argument(
         "--message-file",
         type=Path,
         help="Path to a file containing messages to send to aider",
     )
+    argparser.add_argument(
+        "--yes-always",
+        action="store_true",
+        help="Never prompt, answer yes to aicode's and aider's questions",
+    )
     model_group = argparser.add_mutually_exclusive_group()
     model_group.add_argument(
         "--claude",
@@ -167,6 +246,10 @@ def _parse_args(args: list[str] | None) -> Args:
         help="Use CLI mode (default)",
     )
 
+    if args is None:
+        args = sys.argv[1:]
+    trace_startup, args = pop_trace_startup(args)
+
     # Parse known arguments, leaving unknown args for aider
     parsed, unknown_args = argparser.parse_known_args(args)
 
@@ -183,6 +266,10 @@ def _parse_args(args: list[str] | None) -> Args:
         open_aider_path=parsed.open_aider_path,
         purge=parsed.purge,
         upgrade=parsed.upgrade,
+        gc=parsed.gc,
+        gc_keep=parsed.gc_keep,
+        export_wheelhouse=parsed.export_wheelhouse,
+        install_from_wheelhouse=parsed.install_from_wheelhouse,
         keep=parsed.keep,
         auto_commit=parsed.auto_commit,
         no_watch=parsed.no_watch,
@@ -194,5 +281,11 @@ def _parse_args(args: list[str] | None) -> Args:
         chatgpt=parsed.chatgpt,
         gui=parsed.gui,
         cli=parsed.cli,
+        # Absolute, aicode changes into the git root before aider reads it.
+        message_file=parsed.message_file.absolute() if parsed.message_file else None,
+        yes_always=parsed.yes_always,
+        warm=parsed.warm,
+        trace_startup=trace_startup,
+        session_log=parsed.session_log.absolute() if parsed.session_log else None,
         unknown_args=unknown_args,
     )
@@ -1,22 +1,140 @@
+"""
+Background aider update check.
+
+The check runs at most once per Config.aider_update_ttl. A file lock makes
+sure that concurrent aicode processes on the same host do a single check,
+the others skip it and pick the result up from the config. A failing check
+is retried with a jittered exponential backoff instead of on every launch.
+
+The time of the next check is also kept as the mtime of a stamp file, so
+that a launch from a cached plan, which never decrypts the config, can
+tell with a stat whether to start a check at all.
+"""
+
+import os
+import random
 import subprocess
+import sys
 import time
 import warnings
+from pathlib import Path
 from threading import Thread
 
 from aicode.config import Config
+from aicode.paths import CONFIG_STORAGE_PATH
+
+_UPDATE_CHECK_LOCK = CONFIG_STORAGE_PATH / "update_check.lock"
+
+_BACKOFF_BASE = 5 * 60  # seconds
+_BACKOFF_MAX = 12 * 60 * 60
+
+
+def update_check_due(config: Config, now: float | None = None) -> bool:
+    now = time.time() if now is None else now
+    return now >= config.aider_update_next_check
+
+
+def _next_check_stamp() -> Path:
+    return _UPDATE_CHECK_LOCK.with_suffix(".next")
+
+
+def update_check_maybe_due(config: Config | None, now: float | None = None) -> bool:
+    """update_check_due without loading the config, from the stamp when
+    config is None. True when in doubt, the check itself looks again."""
+    if config is not None:
+        return update_check_due(config, now)
+    now = time.time() if now is None else now
+    try:
+        return now >= os.stat(_next_check_stamp()).st_mtime
+    except OSError:
+        return True
+
+
+def backoff_seconds(failures: int) -> float:
+    """Delay before retrying after the given number of failed checks."""
+    delay = min(_BACKOFF_BASE * 2 ** max(failures - 1, 0), _BACKOFF_MAX)
+    # Jitter so that hosts that failed together don't retry together.
+    return delay * random.uniform(0.5, 1.5)
 
 
-def _background_update_task(config: Config) -> None:
+def _save_update_state(
+    update_info: dict | None, next_check: float, failures: int
+) -> None:
+    """Merges the update fields into the stored config, leaving the rest of
+    it as other processes may have just saved it."""
+    from aicode.openaicfg import update_config
+
+    changes: dict = {
+        "aider_update_next_check": next_check,
+        "aider_update_failures": failures,
+    }
+    if update_info is not None:
+        changes["aider_update_info"] = update_info
+    update_config(changes)
+    stamp = _next_check_stamp()
+    try:
+        with open(stamp, "a", encoding="utf-8"):
+            pass
+        os.utime(stamp, (next_check, next_check))
+    except OSError as err:
+        warnings.warn(f"Failed to write {stamp}: {err}")
+
+
+def clear_update_info() -> None:
+    """Drops the update info after an upgrade, the next launch checks again."""
+    from filelock import FileLock
+
+    _UPDATE_CHECK_LOCK.parent.mkdir(parents=True, exist_ok=True)
+    with FileLock(str(_UPDATE_CHECK_LOCK)):
+        _save_update_state({}, next_check=0, failures=0)
+
+
+def _check_for_update() -> None:
+    from filelock import FileLock, Timeout
+
     from aicode.aider_control import aider_fetch_update_status
-    from aicode.openaicfg import save_config
+    from aicode.staged_upgrade import maybe_stage_update
 
+    _UPDATE_CHECK_LOCK.parent.mkdir(parents=True, exist_ok=True)
+    lock = FileLock(str(_UPDATE_CHECK_LOCK))
+    try:
+        lock.acquire(timeout=0)
+    except Timeout:
+        return  # Another process is checking right now.
     try:
+        # Another process may have finished a check meanwhile, the load
+        # sees it since the config file changed.
+        config = Config.load()
+        if not update_check_due(config):
+            return
+        try:
+            update_info = aider_fetch_update_status()
+        except BaseException:
+            failures = config.aider_update_failures + 1
+            next_check = time.time() + backoff_seconds(failures)
+            _save_update_state(None, next_check, failures)
+            raise
+        next_check = time.time() + config.aider_update_ttl
+        _save_update_state(update_info.to_json_data(), next_check, failures=0)
+    finally:
+        lock.release()
+    # Build the new aider now so that the next launch just switches to it.
+    maybe_stage_update(update_info)
+
+
+def _background_update_task(config: Config | None) -> None:
+    try:
+        if not update_check_maybe_due(config):
+            return
         # Wait for aider to start so that we don't impact startup time.
         # This is really needed for windows because startup is so slow.
         time.sleep(5)
-        update_info = aider_fetch_update_status()
-        config.aider_update_info = update_info.to_json_data()
-        save_config(config.to_dict())
+        if config is None:
+            # Launched from a cached plan, so the config was never decrypted.
+            config = Config.load()
+        if not update_check_due(config):
+            return
+        _check_for_update()
     except KeyboardInterrupt:
         pass
     except SystemExit:
@@ -37,13 +155,27 @@ def _background_update_task(config: Config) -> None:
         pass
 
 
-def background_update_task(config: Config) -> Thread:
+def background_update_task(config: Config | None) -> Thread:
     update_thread = Thread(target=_background_update_task, args=(config,))
     update_thread.daemon = True
     update_thread.start()
     return update_thread
 
 
+def background_update_process(config: Config | None) -> subprocess.Popen | None:
+    """Like background_update_task, but in a detached process so that it
+    outlives an exec into aider. Only started when a check is due."""
+    if not update_check_maybe_due(config):
+        return None
+    return subprocess.Popen(
+        [sys.executable, "-m", "aicode.background", "--run"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
 def _test() -> None:
     config = Config()
     thread = background_update_task(config)
@@ -52,4 +184,7 @@ def _test() -> None:
 
 
 if __name__ == "__main__":
-    _test()
+    if "--run" in sys.argv[1:]:
+        _background_update_task(None)
+    else:
+        _test()
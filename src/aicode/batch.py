@@ -0,0 +1,291 @@
+"""
+Headless batch mode, runs many message files across many repos.
+
+    aicode batch MANIFEST [--workers N] [--timeout SECONDS] [--report FILE]
+
+MANIFEST is JSONL, one job per line:
+
+    {"repo": "path/to/repo", "message_file": "refactor.md", "model": "claude",
+     "args": ["--auto-commit"], "timeout": 600, "id": "job-1"}
+
+Only repo and message_file are required, relative paths are relative to the
+manifest. Every job runs "aicode --message-file ... --yes-always" in its repo
+with no stdin, so nothing can prompt. Up to --workers jobs run at once, jobs
+on the same repo run one after the other. A job that exceeds its timeout is
+killed along with everything it started. One JSON line per job is appended
+to the report as soon as the job finishes, with the exit code, duration,
+changed files and the tail of the log. The full logs are in <report>.logs/.
+"""
+
+import argparse
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 30 * 60  # seconds
+
+# How much of the log goes into the report line.
+_LOG_TAIL_BYTES = 4096
+
+
+@dataclass
+class BatchJob:
+    id: str
+    repo: Path
+    message_file: Path
+    model: str | None = None
+    args: list[str] = field(default_factory=list)
+    timeout: float | None = None
+
+    @staticmethod
+    def from_json(json_data: dict, base_dir: Path, index: int) -> "BatchJob":
+        for key in ("repo", "message_file"):
+            if key not in json_data:
+                raise ValueError(f"Job {index} has no {key}")
+        timeout = json_data.get("timeout")
+        return BatchJob(
+            id=str(json_data.get("id", index)),
+            repo=(base_dir / json_data["repo"]).absolute(),
+            message_file=(base_dir / json_data["message_file"]).absolute(),
+            model=json_data.get("model"),
+            args=[str(arg) for arg in json_data.get("args", [])],
+            timeout=float(timeout) if timeout is not None else None,
+        )
+
+
+@dataclass
+class JobResult:
+    id: str
+    repo: str
+    message_file: str
+    returncode: int | None
+    timed_out: bool
+    duration: float
+    changed_files: list[str]
+    log_file: str | None
+    log_tail: str
+    error: str | None = None
+
+    def to_json_data(self) -> dict:
+        return asdict(self)
+
+
+def load_manifest(manifest_path: Path) -> list[BatchJob]:
+    jobs: list[BatchJob] = []
+    base_dir = manifest_path.absolute().parent
+    with open(manifest_path, encoding="utf-8") as file:
+        for index, line in enumerate(file):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            jobs.append(BatchJob.from_json(json.loads(line), base_dir, index))
+    return jobs
+
+
+def _git(repo: Path, *args: str) -> list[str]:
+    cp = subprocess.run(
+        ["git", *args],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+        check=False,
+        stdin=subprocess.DEVNULL,
+    )
+    if cp.returncode != 0:
+        return []
+    return [line for line in cp.stdout.splitlines() if line.strip()]
+
+
+def _git_snapshot(repo: Path) -> tuple[str | None, set[str]]:
+    """HEAD and the files that differ from it, untracked ones included."""
+    head = _git(repo, "rev-parse", "HEAD")
+    # -z would be safer for odd names, but the report is for humans.
+    status = _git(repo, "status", "--porcelain", "--untracked-files=all")
+    return (head[0] if head else None), {line[3:] for line in status}
+
+
+def changed_files(repo: Path, before: tuple[str | None, set[str]]) -> list[str]:
+    """Files the job changed, whether it committed them or not."""
+    head_before, dirty_before = before
+    _, dirty_after = _git_snapshot(repo)
+    changed = dirty_after - dirty_before
+    if head_before is not None:
+        changed.update(_git(repo, "diff", "--name-only", head_before, "HEAD"))
+    return sorted(changed)
+
+
+def _kill_tree(proc: subprocess.Popen) -> None:
+    try:
+        if sys.platform == "win32":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                capture_output=True,
+                check=False,
+            )
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        report_path: Path,
+        workers: int = DEFAULT_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        aicode_cmd: list[str] | None = None,
+    ) -> None:
+        self.report_path = report_path
+        self.logs_dir = report_path.with_name(report_path.name + ".logs")
+        self.workers = workers
+        self.timeout = timeout
+        # Overridable so that the tests can stand in for aicode.
+        self.aicode_cmd = aicode_cmd or [sys.executable, "-m", "aicode"]
+        self._report_lock = threading.Lock()
+        self._repo_locks: dict[Path, threading.Lock] = {}
+        self._repo_locks_lock = threading.Lock()
+
+    def _repo_lock(self, repo: Path) -> threading.Lock:
+        with self._repo_locks_lock:
+            return self._repo_locks.setdefault(repo.resolve(), threading.Lock())
+
+    def job_cmd(self, job: BatchJob) -> list[str]:
+        cmd = list(self.aicode_cmd)
+        cmd += ["--message-file", str(job.message_file), "--yes-always", "--cli"]
+        if job.model is not None:
+            cmd += ["--model", job.model]
+        return cmd + job.args
+
+    def _run_job(self, job: BatchJob) -> JobResult:
+        start = time.monotonic()
+        log_file = self.logs_dir / (re.sub(r"[^\w.-]", "_", job.id) + ".log")
+        if not job.repo.is_dir() or not job.message_file.is_file():
+            missing = job.repo if not job.repo.is_dir() else job.message_file
+            return JobResult(
+                id=job.id,
+                repo=str(job.repo),
+                message_file=str(job.message_file),
+                returncode=None,
+                timed_out=False,
+                duration=0.0,
+                changed_files=[],
+                log_file=None,
+                log_tail="",
+                error=f"{missing} does not exist",
+            )
+        env = dict(os.environ)
+        # Upgrades are for interactive use, not for every job of a batch.
+        env["AICODE_NO_AUTO_UPGRADE"] = "1"
+        timeout = job.timeout or self.timeout
+        timed_out = False
+        with self._repo_lock(job.repo):
+            before = _git_snapshot(job.repo)
+            with open(log_file, "wb") as log:
+                proc = subprocess.Popen(  # pylint: disable=consider-using-with
+                    self.job_cmd(job),
+                    cwd=job.repo,
+                    env=env,
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=sys.platform != "win32",
+                )
+                try:
+                    returncode: int | None = proc.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    timed_out = True
+                    _kill_tree(proc)
+                    proc.wait()
+                    returncode = None
+            changed = changed_files(job.repo, before)
+        with open(log_file, "rb") as log:
+            log.seek(max(log_file.stat().st_size - _LOG_TAIL_BYTES, 0))
+            log_tail = log.read().decode("utf-8", errors="replace")
+        return JobResult(
+            id=job.id,
+            repo=str(job.repo),
+            message_file=str(job.message_file),
+            returncode=returncode,
+            timed_out=timed_out,
+            duration=time.monotonic() - start,
+            changed_files=changed,
+            log_file=str(log_file),
+            log_tail=log_tail,
+        )
+
+    def _report(self, result: JobResult) -> None:
+        with self._report_lock:
+            with open(self.report_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(result.to_json_data()) + "\n")
+
+    def run(self, jobs: list[BatchJob]) -> list[JobResult]:
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        results: list[JobResult] = []
+        # Threads only wait on the job processes, the work happens in those.
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._run_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                result = future.result()
+                self._report(result)
+                results.append(result)
+                status = (
+                    "timed out" if result.timed_out else f"exit {result.returncode}"
+                )
+                if result.error:
+                    status = result.error
+                print(
+                    f"[{len(results)}/{len(jobs)}] {result.id}: {status}, {result.duration:.1f}s"
+                )
+        return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="aicode batch",
+        description="Run aider on many message files across many repos",
+    )
+    parser.add_argument("manifest", type=Path, help="JSONL file with one job per line")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="Jobs to run at once"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Default per job timeout in seconds",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        default=Path("aicode-batch-report.jsonl"),
+        help="JSONL report, appended to as jobs finish",
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as err:
+        print(f"Error reading {args.manifest}: {err}")
+        return 1
+    runner = BatchRunner(
+        args.report.absolute(), workers=args.workers, timeout=args.timeout
+    )
+    results = runner.run(jobs)
+    print(f"Report written to {args.report}")
+    ok = all(r.returncode == 0 for r in results)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,520 @@
+"""
+Latency and throughput benchmark of model endpoints.
+
+    aicode bench-models [--endpoint MODEL[=BASE_URL] ...] [--stub] [--runs N]
+
+For every endpoint it measures, over --runs streamed completions, the time
+to first token and the tokens per second after it, straight over HTTP. Then
+it runs aider on each task of EDIT_TASKS in a scratch directory and times
+the whole edit, a task counts as solved when its check passes afterwards.
+
+MODEL is a litellm model name as in models.py, "anthropic/..." endpoints
+speak the Anthropic API, all others the OpenAI one. BASE_URL overrides
+where the endpoint lives, for providers without a known one it's required.
+Keys come from the usual *_API_KEY variables, or from aicode's own config.
+Without --endpoint every model of models.MODELS that has a key is measured.
+
+--stub starts stub_llm.py in-process and adds openai/stub and
+anthropic/stub endpoints served by it, no network or keys needed. Its
+latency and token rate are set with --stub-latency and --stub-token-rate.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from aicode.metrics import percentile
+
+DEFAULT_RUNS = 3
+DEFAULT_TIMEOUT = 300  # seconds, per edit task
+
+STREAM_PROMPT = "Explain in about 150 words how a hash map handles collisions."
+_STREAM_MAX_TOKENS = 256
+
+_KEY_ENVS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+    "deepseek": "DEEPSEEK_API_KEY",
+}
+
+# OpenAI compatible bases, except for anthropic.
+_DEFAULT_BASES = {
+    "openai": "https://api.openai.com/v1",
+    "anthropic": "https://api.anthropic.com",
+    "gemini": "https://generativelanguage.googleapis.com/v1beta/openai",
+    "deepseek": "https://api.deepseek.com/v1",
+}
+
+# Bare model names that aider expands with its own aliases, see
+# aider/models.py. litellm would take any other bare name for OpenAI's.
+_ALIASES = {
+    "deepseek": "deepseek/deepseek-chat",
+}
+
+_CONFIG_KEYS = {
+    "openai": "openai_key",
+    "anthropic": "anthropic_key",
+    "gemini": "gemini_key",
+}
+
+
+@dataclass
+class EditTask:
+    id: str
+    files: dict[str, str]
+    prompt: str
+    # Python source that runs in the task directory, exit 0 means solved.
+    check: str
+    # What the stub server answers with.
+    solution: dict[str, str]
+
+
+EDIT_TASKS = [
+    EditTask(
+        id="fix-bug",
+        files={"calc.py": "def add(a, b):\n    return a - b\n"},
+        prompt="Fix the bug in add() in calc.py so that it returns the sum of a and b.",
+        check="from calc import add\nassert add(2, 3) == 5",
+        solution={"calc.py": "def add(a, b):\n    return a + b\n"},
+    ),
+    EditTask(
+        id="rename",
+        files={"greet.py": 'def hello(name):\n    return "Hello, " + name + "!"\n'},
+        prompt="In greet.py rename the function hello to greet, keep what it does.",
+        check="import greet\nassert greet.greet('Ann') == 'Hello, Ann!'\nassert not hasattr(greet, 'hello')",
+        solution={"greet.py": 'def greet(name):\n    return "Hello, " + name + "!"\n'},
+    ),
+    EditTask(
+        id="add-function",
+        files={"mathutils.py": "def square(n):\n    return n * n\n"},
+        prompt="Add a function is_even(n) to mathutils.py that returns True for even integers and False otherwise.",
+        check="from mathutils import is_even, square\nassert is_even(4) and not is_even(7)\nassert square(3) == 9",
+        solution={
+            "mathutils.py": "def square(n):\n    return n * n\n\n\ndef is_even(n):\n    return n % 2 == 0\n"
+        },
+    ),
+]
+
+
+@dataclass
+class Endpoint:
+    model: str
+    base_url: str | None = None
+    # Stub endpoints answer in the "whole" edit format only.
+    edit_format: str | None = None
+
+    @staticmethod
+    def parse(spec: str) -> "Endpoint":
+        model, _, base_url = spec.partition("=")
+        return Endpoint(model=_ALIASES.get(model, model), base_url=base_url or None)
+
+    @property
+    def provider(self) -> str:
+        return self.model.split("/", 1)[0] if "/" in self.model else "openai"
+
+    @property
+    def is_anthropic(self) -> bool:
+        return self.provider == "anthropic"
+
+    @property
+    def api_model(self) -> str:
+        return self.model.split("/", 1)[1] if "/" in self.model else self.model
+
+    def api_base(self) -> str | None:
+        return self.base_url or _DEFAULT_BASES.get(self.provider)
+
+    def env(self, key: str | None) -> dict[str, str]:
+        """The variables that point aider (litellm) at this endpoint."""
+        env: dict[str, str] = {}
+        if key is not None:
+            env[_KEY_ENVS.get(self.provider, "OPENAI_API_KEY")] = key
+        if self.base_url is not None:
+            env["ANTHROPIC_API_BASE" if self.is_anthropic else "OPENAI_API_BASE"] = (
+                self.base_url
+            )
+        return env
+
+
+def api_key(endpoint: Endpoint) -> str | None:
+    key = os.environ.get(_KEY_ENVS.get(endpoint.provider, "OPENAI_API_KEY"))
+    if key or endpoint.provider not in _CONFIG_KEYS:
+        return key or None
+    try:
+        from aicode.config import Config
+
+        return getattr(Config.load(), _CONFIG_KEYS[endpoint.provider])
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+@dataclass
+class StreamSample:
+    ttft: float
+    total: float
+    tokens: int
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        generating = self.total - self.ttft
+        return self.tokens / generating if generating > 0 and self.tokens > 1 else None
+
+
+def _stream_request(
+    endpoint: Endpoint, key: str | None, prompt: str, max_tokens: int
+) -> urllib.request.Request:
+    base = endpoint.api_base()
+    if base is None:
+        raise ValueError(
+            f"No known base URL for {endpoint.provider}, use --endpoint {endpoint.model}=URL"
+        )
+    messages = [{"role": "user", "content": prompt}]
+    if endpoint.is_anthropic:
+        url = base.rstrip("/") + "/v1/messages"
+        body = {
+            "model": endpoint.api_model,
+            "max_tokens": max_tokens,
+            "messages": messages,
+            "stream": True,
+        }
+        headers = {"x-api-key": key or "", "anthropic-version": "2023-06-01"}
+    else:
+        url = base.rstrip("/") + "/chat/completions"
+        # OpenAI's o-series reject max_tokens, the compatible APIs of the
+        # other providers don't all know its replacement.
+        limit = (
+            "max_completion_tokens" if endpoint.provider == "openai" else "max_tokens"
+        )
+        body = {
+            "model": endpoint.api_model,
+            limit: max_tokens,
+            "messages": messages,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        headers = {"Authorization": f"Bearer {key or ''}"}
+    headers["Content-Type"] = "application/json"
+    return urllib.request.Request(
+        url, data=json.dumps(body).encode("utf-8"), headers=headers, method="POST"
+    )
+
+
+def _delta_text(endpoint: Endpoint, data: dict) -> str:
+    if endpoint.is_anthropic:
+        if data.get("type") == "content_block_delta":
+            return data.get("delta", {}).get("text", "")
+        return ""
+    choices = data.get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or ""
+
+
+def _usage_tokens(endpoint: Endpoint, data: dict) -> int | None:
+    usage = data.get("usage") or {}
+    key = "output_tokens" if endpoint.is_anthropic else "completion_tokens"
+    return usage.get(key)
+
+
+def measure_stream(
+    endpoint: Endpoint,
+    key: str | None,
+    prompt: str = STREAM_PROMPT,
+    max_tokens: int = _STREAM_MAX_TOKENS,
+    timeout: float = 120,
+) -> StreamSample:
+    """One streamed completion, timed from sending the request."""
+    request = _stream_request(endpoint, key, prompt, max_tokens)
+    start = time.perf_counter()
+    ttft: float | None = None
+    chunks = 0
+    usage_tokens: int | None = None
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        for raw in response:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            payload = line[len("data:") :].strip()
+            if payload == "[DONE]":
+                break
+            data = json.loads(payload)
+            if _delta_text(endpoint, data):
+                chunks += 1
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+            usage_tokens = _usage_tokens(endpoint, data) or usage_tokens
+    total = time.perf_counter() - start
+    if ttft is None:
+        raise ValueError("The stream had no content")
+    # Chunks are a stand-in when the endpoint doesn't report usage.
+    return StreamSample(ttft=ttft, total=total, tokens=usage_tokens or chunks)
+
+
+@dataclass
+class EditSample:
+    task: str
+    seconds: float
+    success: bool
+    error: str | None = None
+
+
+def _aider_args(endpoint: Endpoint, task: EditTask) -> list[str]:
+    args = [
+        "--model",
+        endpoint.model,
+        "--message",
+        f"[bench-task:{task.id}] {task.prompt}",
+        "--yes-always",
+        "--no-git",
+        "--no-check-update",
+        "--no-analytics",
+        "--no-show-model-warnings",
+        "--no-pretty",
+        "--map-tokens",
+        "0",
+    ]
+    if endpoint.edit_format is not None:
+        args += ["--edit-format", endpoint.edit_format]
+    return args + list(task.files)
+
+
+def run_edit_task(
+    endpoint: Endpoint,
+    key: str | None,
+    task: EditTask,
+    aider_cmd: list[str] | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> EditSample:
+    """Times aider doing task, from launch to exit, then checks the result."""
+    from aicode.session_runner import _open_aider
+
+    work_dir = Path(tempfile.mkdtemp(prefix=f"aicode-bench-{task.id}-"))
+    try:
+        for name, content in task.files.items():
+            (work_dir / name).write_text(content, encoding="utf-8")
+        env = dict(os.environ)
+        env.update(endpoint.env(key))
+        # litellm would otherwise fetch its model price list on every start.
+        env.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+        cmd_list = (aider_cmd or ["aider"]) + _aider_args(endpoint, task)
+        # A given aider_cmd runs as is, "aider" from the install.
+        open_proc = subprocess.Popen if aider_cmd is not None else _open_aider
+        start = time.perf_counter()
+        proc = open_proc(  # pylint: disable=consider-using-with
+            cmd_list,
+            cwd=work_dir,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            output, _ = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            return EditSample(
+                task.id,
+                time.perf_counter() - start,
+                False,
+                f"timed out after {timeout}s",
+            )
+        seconds = time.perf_counter() - start
+        if proc.returncode != 0:
+            tail = output.decode("utf-8", errors="replace").strip().splitlines()[-1:]
+            return EditSample(
+                task.id,
+                seconds,
+                False,
+                f"aider exited with {proc.returncode}: {' '.join(tail)}",
+            )
+        check = subprocess.run(
+            [sys.executable, "-c", task.check],
+            cwd=work_dir,
+            capture_output=True,
+            text=True,
+            timeout=60,
+            check=False,
+        )
+        error = (
+            None
+            if check.returncode == 0
+            else "check failed: " + (check.stderr.strip().splitlines() or ["?"])[-1]
+        )
+        return EditSample(task.id, seconds, check.returncode == 0, error)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@dataclass
+class EndpointReport:
+    model: str
+    ttft_p50: float | None = None
+    ttft_p95: float | None = None
+    tokens_per_second_p50: float | None = None
+    edit_seconds_p50: float | None = None
+    edit_seconds_p95: float | None = None
+    success_rate: float | None = None
+    errors: list[str] = field(default_factory=list)
+
+
+def bench_endpoint(
+    endpoint: Endpoint,
+    runs: int = DEFAULT_RUNS,
+    tasks: list[EditTask] | None = None,
+    aider_cmd: list[str] | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> EndpointReport:
+    tasks = EDIT_TASKS if tasks is None else tasks
+    report = EndpointReport(model=endpoint.model)
+    key = api_key(endpoint)
+    samples: list[StreamSample] = []
+    for _ in range(runs):
+        try:
+            samples.append(measure_stream(endpoint, key))
+        except (OSError, ValueError, urllib.error.URLError) as err:
+            report.errors.append(f"stream: {err}")
+            break  # The same error every run, most likely.
+    report.ttft_p50 = percentile([s.ttft for s in samples], 50)
+    report.ttft_p95 = percentile([s.ttft for s in samples], 95)
+    report.tokens_per_second_p50 = percentile(
+        [tps for s in samples if (tps := s.tokens_per_second) is not None], 50
+    )
+    edits = [
+        run_edit_task(endpoint, key, task, aider_cmd=aider_cmd, timeout=timeout)
+        for task in tasks
+    ]
+    report.errors += [f"{e.task}: {e.error}" for e in edits if e.error]
+    if edits:
+        report.edit_seconds_p50 = percentile([e.seconds for e in edits], 50)
+        report.edit_seconds_p95 = percentile([e.seconds for e in edits], 95)
+        report.success_rate = sum(e.success for e in edits) / len(edits)
+    return report
+
+
+def default_endpoints() -> list[Endpoint]:
+    from aicode.models import MODELS
+
+    endpoints: list[Endpoint] = []
+    for model in MODELS.values():
+        model_str = _ALIASES.get(model.model_str, model.model_str)
+        if "/" not in model_str:
+            # No way to tell its provider, and so its key and base.
+            continue
+        endpoint = Endpoint(model_str)
+        if all(e.model != endpoint.model for e in endpoints) and api_key(endpoint):
+            endpoints.append(endpoint)
+    return endpoints
+
+
+def _fmt(value: float | None, unit: str = "s") -> str:
+    return "-" if value is None else f"{value:.2f}{unit}"
+
+
+def format_report(report: EndpointReport) -> str:
+    success = "-" if report.success_rate is None else f"{report.success_rate:.0%}"
+    line = (
+        f"{report.model}: ttft p50 {_fmt(report.ttft_p50)} p95 {_fmt(report.ttft_p95)}, "
+        f"{_fmt(report.tokens_per_second_p50, ' tok/s')}, "
+        f"edit p50 {_fmt(report.edit_seconds_p50)} p95 {_fmt(report.edit_seconds_p95)}, solved {success}"
+    )
+    return "\n".join([line] + [f"  error: {error}" for error in report.errors])
+
+
+def main(argv: list[str] | None = None) -> int:
+    from aicode.stub_llm import StubConfig, StubServer
+
+    parser = argparse.ArgumentParser(
+        prog="aicode bench-models",
+        description="Measure latency and throughput of model endpoints",
+    )
+    parser.add_argument(
+        "--endpoint",
+        action="append",
+        default=[],
+        metavar="MODEL[=BASE_URL]",
+        help="Endpoint to measure, repeatable",
+    )
+    parser.add_argument(
+        "--stub",
+        action="store_true",
+        help="Also measure a local stub server, no network needed",
+    )
+    parser.add_argument(
+        "--stub-latency",
+        type=float,
+        default=0.2,
+        help="Seconds before the stub's first token",
+    )
+    parser.add_argument(
+        "--stub-token-rate",
+        type=float,
+        default=100.0,
+        help="Tokens per second of the stub",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=DEFAULT_RUNS,
+        help="Streamed completions per endpoint",
+    )
+    parser.add_argument(
+        "--no-edits", action="store_true", help="Skip the aider edit tasks"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Per edit task timeout in seconds",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    args = parser.parse_args(argv)
+
+    endpoints = [Endpoint.parse(spec) for spec in args.endpoint]
+    if not endpoints and not args.stub:
+        endpoints = default_endpoints()
+        if not endpoints:
+            print("No endpoints with keys configured, use --endpoint or --stub")
+            return 1
+    server: StubServer | None = None
+    if args.stub:
+        config = StubConfig(
+            latency=args.stub_latency,
+            token_rate=args.stub_token_rate,
+            reply_tokens=_STREAM_MAX_TOKENS // 2,
+            solutions={task.id: task.solution for task in EDIT_TASKS},
+        )
+        server = StubServer(config).start()
+        endpoints += [
+            Endpoint("openai/stub", f"{server.url}/v1", edit_format="whole"),
+            Endpoint("anthropic/stub", server.url, edit_format="whole"),
+        ]
+    tasks = [] if args.no_edits else EDIT_TASKS
+    reports: list[EndpointReport] = []
+    try:
+        for endpoint in endpoints:
+            if not args.json:
+                print(f"Measuring {endpoint.model}...")
+            report = bench_endpoint(
+                endpoint, runs=args.runs, tasks=tasks, timeout=args.timeout
+            )
+            reports.append(report)
+            if not args.json:
+                print(format_report(report))
+    finally:
+        if server is not None:
+            server.stop()
+    if args.json:
+        print(json.dumps([asdict(report) for report in reports], indent=2))
+    return 0 if all(not report.errors for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,21 +4,23 @@ import os
 import sys
 import warnings
 from os.path import exists
+from pathlib import Path
 from typing import Optional
 
-from aicode.aider_control import (
-    aider_install,
-    aider_installed,
-    aider_purge,
-    aider_upgrade,
-)
+from aicode.aider_control import aider_installed, ensure_installed
 from aicode.aider_update_result import AiderUpdateResult
 from aicode.args import Args
-from aicode.background import background_update_task
 from aicode.config import Config
+from aicode.launch_plan import (
+    LaunchPlan,
+    compute_launch_key,
+    load_launch_plan,
+    save_launch_plan,
+)
 from aicode.models import get_model
-from aicode.paths import AIDER_INSTALL_PATH
-from aicode.util import check_gitdirectory, open_folder
+from aicode.prewarm import maybe_prewarm
+from aicode.startup_trace import span, traced
+from aicode.util import check_gitdirectory
 
 # This will be at the root of the project, side to the .git directory
 _AIDER_HISTORY = ".aider.chat.history.md"
@@ -26,19 +28,25 @@ _AIDER_HISTORY = ".aider.chat.history.md"
 _ENABLE_HISTORY_ASK = False
 
 
+@traced("aider_install_if_missing")
 def aider_install_if_missing() -> None:
     # Set the custom bin path where you want aider to be installed
     # Check if aider is already installed
     if aider_installed():
         return
-    aider_install()
+    ensure_installed()
+
+
+def _is_interactive(args: Args) -> bool:
+    """A run with a message file or --yes-always must never prompt."""
+    return not args.yes_always and args.message_file is None
 
 
 def _get_interface_mode(args: Args) -> bool:
     """Returns True for GUI mode, False for CLI mode"""
     if args.gui:
         return True
-    if args.cli:
+    if args.cli or not _is_interactive(args):
         return False
 
     while True:
@@ -56,7 +64,9 @@ def _get_interface_mode(args: Args) -> bool:
             print("Please enter a valid number (0 or 1)")
 
 
-def _check_gitignore() -> None:
+@traced("_check_gitignore")
+def _check_gitignore(assume_yes: bool = False) -> bool:
+    """Returns True if the .gitignore exists and has all the needles."""
     needles: dict[str, bool] = {
         ".aider*": False,
         "!.aider.conf.yml": False,
@@ -74,14 +84,16 @@ def _check_gitignore() -> None:
                     any_missing = True
                     print(f".gitignore file does not contain {needle}")
         if any_missing:
-            resp = input("Add them? [y/N] ")
+            resp = "y" if assume_yes else input("Add them? [y/N] ")
             if resp.lower() == "y":
                 with open(".gitignore", encoding="utf-8", mode="a") as file:
                     for needle, found in needles.items():
                         if not found:
                             file.write("\n" + needle)
-    else:
-        print(".gitignore file does not exist.")
+                return True
+        return not any_missing
+    print(".gitignore file does not exist.")
+    return False
 
 
 def _get_lint_command() -> str | None:
@@ -90,11 +102,13 @@ def _get_lint_command() -> str | None:
     return None
 
 
+@traced("_check_aiderignore")
 def _check_aiderignore() -> None:
     """Adds the .aiderignore file if it doesn't exist."""
     if not os.path.exists(".aiderignore"):
         file_content = (
-            "# Add files or directories to ignore here\n"
+            "# Add files or directories to ignore here, or run aicode analyze\n"
+            "# to find the binary, generated and vendored ones\n"
             "\n"
             "run\n"
             "lint\n"
@@ -106,52 +120,55 @@ def _check_aiderignore() -> None:
             file.write(file_content)
 
 
-def build_cmd_list_or_die(args: Args) -> tuple[list[str], Config]:
+def _cmd_list_from_plan(args: Args, plan: LaunchPlan) -> list[str]:
+    if plan.git_root is not None:
+        print("Found git directory at", plan.git_root)
+        os.chdir(plan.git_root)
+        if args.message_file is None:
+            maybe_prewarm(Path(plan.git_root), args.unknown_args)
+    os.environ.update(plan.env)
+    if plan.update_msg:
+        print(plan.update_msg)
+    print(f"Starting aider with model {os.environ['AIDER_MODEL']}")
+    use_gui = _get_interface_mode(args)
+    cmd_list = list(plan.cmd_list)
+    if use_gui:
+        cmd_list.insert(plan.gui_index, "--gui")
+    return cmd_list
+
+
+def build_cmd_list_or_die(args: Args) -> tuple[list[str], Config | None]:
+    """Returns the aider command list and the config, which is None when
+    the launch was served from a cached launch plan."""
+    cwd = Path.cwd()
+    with span("launch_plan.load"):
+        plan_key = compute_launch_key(args, cwd=cwd)
+        plan = load_launch_plan(plan_key, cwd=cwd) if plan_key else None
+    if plan is not None:
+        return _cmd_list_from_plan(args, plan), None
     unknown_args = args.unknown_args
-    # config = Config.load()
     config = Config.load()
-    if args.open_aider_path:
-        print("Opening the real path to aider.")
-        path = AIDER_INSTALL_PATH
-        if path is not None:
-            print(path)
-            open_folder(path)
-            sys.exit(0)
-        else:
-            warnings.warn("aider executable not found")
-            sys.exit(1)
-    if args.purge:
-        print("Purging aider installation")
-        aider_purge(path=None, config=config)
-        sys.exit(0)
-
-    if args.upgrade:
-        aider_upgrade()
-        # config["aider_update_info"] = {}  # Purge stale update info
-        config.aider_update_info = {}  # Purge stale update info
-        config.save()
-        sys.exit(0)
     if args.set_key:
         print("Setting openai key")
-        # config["openai_key"] = args.set_key
         config.openai_key = args.set_key
-        config.save()
-        config = Config.load()
     if args.set_anthropic_key:
         print("Setting anthropic key")
-        # config["anthropic_key"] = args.set_anthropic_key
         config.anthropic_key = args.set_anthropic_key
-        config.save()
-        # config = Config.load()
-        config = Config.load()
     if args.set_gemini_key:
         print("Setting gemini key")
         config.gemini_key = args.set_gemini_key
+    # All of the --set-* flags in one write.
+    if config.changes():
         config.save()
-        config = Config.load()
     has_git = check_gitdirectory()
+    if has_git and args.message_file is None:
+        # Warms aider's repo map while we are busy with checks and prompts.
+        # A --message-file run starts aider right away, with nothing to
+        # overlap, and batch and fanout jobs would leave a worker behind
+        # in a worktree that is about to go away.
+        maybe_prewarm(Path.cwd(), unknown_args)
 
-    _check_gitignore()
+    gitignore_ok = _check_gitignore(assume_yes=not _is_interactive(args))
     _check_aiderignore()
     # anthropic_key = config.get("anthropic_key")
     anthropic_key = config.anthropic_key
@@ -163,22 +180,23 @@ def build_cmd_list_or_die(args: Args) -> tuple[list[str], Config]:
     is_anthropic_model = "claude" in model
     is_gemini_model = "gemini" in model or args.gemini
 
+    env: dict[str, str] = {}
     if is_anthropic_model:
         if anthropic_key is None:
             print("Claude key not found, please set one with --set-anthropic-key")
             sys.exit(1)
-        os.environ["ANTHROPIC_API_KEY"] = anthropic_key
+        env["ANTHROPIC_API_KEY"] = anthropic_key
     elif is_gemini_model:
         if gemini_key is None:
             print("Gemini key not found, please set one with --set-gemini-key")
             sys.exit(1)
-        os.environ["GEMINI_API_KEY"] = gemini_key
+        env["GEMINI_API_KEY"] = gemini_key
     else:
         openai_key = config.openai_key
         if openai_key is None:
             print("OpenAI key not found, please set one with --set-key")
             sys.exit(1)
-        os.environ["OPENAI_API_KEY"] = openai_key
+        env["OPENAI_API_KEY"] = openai_key
 
     last_aider_update_info: dict[str, str | bool | None] = config.aider_update_info
     update_info: Optional[AiderUpdateResult] = None
@@ -192,16 +210,19 @@ def build_cmd_list_or_die(args: Args) -> tuple[list[str], Config]:
             warnings.warn(f"Failed to parse update info: {err}")
             update_info = None
 
+    update_msg: str | None = None
     if update_info is not None and update_info.has_update:
-        print(update_info.get_update_msg())
+        update_msg = update_info.get_update_msg()
+        print(update_msg)
 
     # Note: Aider no longer uses ChatGPT 3.5 turbo by default. Therefore
     # it may soon no longer be necessary to specify the model.
-    os.environ["AIDER_MODEL"] = model
+    env["AIDER_MODEL"] = model
+    os.environ.update(env)
     print(f"Starting aider with model {os.environ['AIDER_MODEL']}")
     use_gui = _get_interface_mode(args)
 
-    if os.path.exists(_AIDER_HISTORY) and _ENABLE_HISTORY_ASK:
+    if os.path.exists(_AIDER_HISTORY) and _ENABLE_HISTORY_ASK and _is_interactive(args):
         answer = (
             input("Chat history found. Would you like to restore it? [y/N]: ")
             .strip()
@@ -216,9 +237,10 @@ def build_cmd_list_or_die(args: Args) -> tuple[list[str], Config]:
 
     if args.message_file and args.message_file.exists():
         cmd_list.extend(["--message-file", str(args.message_file)])
+    if args.yes_always:
+        cmd_list.append("--yes-always")
 
-    if use_gui:
-        cmd_list.append("--gui")
+    gui_index = len(cmd_list)
     if is_anthropic_model:
         cmd_list.append("--model")
         cmd_list.append("sonnet")
@@ -240,13 +262,26 @@ def build_cmd_list_or_die(args: Args) -> tuple[list[str], Config]:
         cmd_list.append("--no-auto-lint")
     if not has_git:
         cmd_list.append("--no-git")
-    if not args.no_watch:
+    if not args.no_watch and args.message_file is None:
+        # aider exits after the message file, watching would only delay that.
         # update_info: AiderUpdateResult | None = config.aider_update_result
         # update_info = aider_fetch_update_status()
         cmd_list.append("--watch")
 
     cmd_list += args.prompt + unknown_args
-    print("\nLoading aider:\n  remember to use /help for a list of commands\n")
-    # Perform update in the background.
-    _ = background_update_task(config=config)
+    if gitignore_ok:
+        # Keyed after the preflight, which may have written ignore files.
+        plan_key = compute_launch_key(args, cwd=cwd)
+        if plan_key is not None:
+            plan = LaunchPlan(
+                key=plan_key,
+                git_root=str(Path.cwd()) if has_git else None,
+                cmd_list=list(cmd_list),
+                env=env,
+                gui_index=gui_index,
+                update_msg=update_msg,
+            )
+            save_launch_plan(plan, cwd=cwd)
+    if use_gui:
+        cmd_list.insert(gui_index, "--gui")
     return cmd_list, config
@@ -2,16 +2,32 @@
 
 import atexit
 import subprocess
+import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from aicode.aider_control import (
-    aider_install_path,
-)
 from aicode.args import Args
-from aicode.background import background_update_task
-from aicode.build_cmd_list import build_cmd_list_or_die
-from aicode.config import Config
-from aicode.run_process import run_process
+
+if TYPE_CHECKING:
+    from aicode.config import Config
+    from aicode.session_runner import SessionResult
+
+# Everything past argument parsing is imported lazily so that --help, bad
+# args and the maintenance flags don't pay for iso_env, semi_secret and the
+# rest of the launch machinery.
+
+
+def _enable_tracing_if_requested(args: Args | list[str] | None) -> None:
+    """Tracing starts before argument parsing so that parsing is traced too."""
+    from aicode import startup_trace
+    from aicode.args import pop_trace_startup
+
+    if isinstance(args, Args):
+        trace_file = args.trace_startup
+    else:
+        trace_file, _ = pop_trace_startup(sys.argv[1:] if args is None else args)
+    if trace_file is not None:
+        startup_trace.enable(trace_file)
 
 
 def _to_args(args: Args | list[str] | None = None) -> Args:
@@ -28,31 +44,238 @@ def _print_cmd_list(cmd_list: list[str]) -> None:
     print("=" * 80 + "\n")
 
 
+def _get_cleanup_files(args: Args) -> list[Path]:
+    from aicode.history import archive_enabled
+    from aicode.util import CHAT_HISTORY_FILES
+
+    if args.keep or archive_enabled():
+        return []
+    cwd_abs = Path.cwd().absolute()
+    return [cwd_abs / file for file in CHAT_HISTORY_FILES]
+
+
+def _can_exec(args: Args) -> bool:
+    """The direct-exec path replaces this process, so it is only taken when
+    nothing has to happen in aicode after aider exits."""
+    from aicode import direct_exec, startup_trace
+    from aicode.metrics import metrics_enabled
+
+    return (
+        direct_exec.is_supported()
+        and not args.warm
+        and args.session_log is None
+        and not metrics_enabled()
+        and startup_trace.get_tracer() is None
+    )
+
+
+def _get_after_exit(args: Args) -> list[str] | None:
+    """The chat history archiving, run by the direct-exec supervisor."""
+    from aicode.history import archive_command, archive_enabled
+
+    if not archive_enabled():
+        return None
+    return archive_command(Path.cwd().absolute(), keep=args.keep)
+
+
 def _register_cleanup_if_necessary(args: Args) -> None:
+    from aicode.history import archive_enabled, archive_on_exit
     from aicode.util import cleanup_chat_history
 
-    if not args.keep:
-        cwd_abs = Path.cwd().absolute()
+    cwd_abs = Path.cwd().absolute()
+    if archive_enabled():
+        atexit.register(lambda: archive_on_exit(cwd_abs, keep=args.keep))
+    elif not args.keep:
         atexit.register(lambda: cleanup_chat_history(cwd_abs))
 
 
+def _open_aider_path() -> int:
+    from aicode.paths import AIDER_INSTALL_PATH
+    from aicode.util import open_folder
+
+    print("Opening the real path to aider.")
+    print(AIDER_INSTALL_PATH)
+    open_folder(AIDER_INSTALL_PATH)
+    return 0
+
+
+def _purge() -> int:
+    from aicode.aider_control import aider_purge
+    from aicode.config import Config
+
+    print("Purging aider installation")
+    aider_purge(path=None, config=Config.load())
+    return 0
+
+
+def _upgrade() -> int:
+    from aicode.paths import AIDER_INSTALL_PATH
+    from aicode.staged_upgrade import STAGE_LOG, start_staged_upgrade
+
+    start_staged_upgrade()
+    print("Upgrading aider in the background, the next launch will use it.")
+    print(f"Progress is logged to {AIDER_INSTALL_PATH / STAGE_LOG}")
+    return 0
+
+
+def _gc(args: Args) -> int:
+    from aicode.install_gc import DEFAULT_KEEP, collect_garbage
+    from aicode.paths import AIDER_INSTALL_PATH
+
+    keep = DEFAULT_KEEP if args.gc_keep is None else args.gc_keep
+    if keep < 0:
+        print("--gc-keep must not be negative")
+        return 1
+    print(f"Collecting stale aider installs in {AIDER_INSTALL_PATH}")
+    report = collect_garbage(AIDER_INSTALL_PATH, keep=keep)
+    print(report.summary())
+    return 0
+
+
+def _export_wheelhouse(out_dir: Path) -> int:
+    from aicode.wheelhouse import WheelhouseError, export_wheelhouse
+
+    print(f"Exporting the aider wheelhouse to {out_dir}")
+    try:
+        wheelhouse = export_wheelhouse(out_dir)
+    except WheelhouseError as err:
+        print(f"Error exporting wheelhouse: {err}")
+        return 1
+    print(
+        f"Exported {len(wheelhouse.wheels)} wheels for aider {wheelhouse.aider_version}"
+    )
+    return 0
+
+
+def _install_from_wheelhouse(wheelhouse_dir: Path) -> int:
+    from aicode.wheelhouse import WheelhouseError, install_from_wheelhouse
+
+    try:
+        install_from_wheelhouse(wheelhouse_dir)
+    except WheelhouseError as err:
+        print(f"Error installing from wheelhouse: {err}")
+        return 1
+    return 0
+
+
+def _report_failure(cmd_list: list[str], result: "SessionResult") -> None:
+    from aicode.aider_control import _get_path
+    from aicode.direct_exec import resolve_aider
+    from aicode.session_runner import write_crash_log
+
+    print(f"aider exited with code {result.returncode}")
+    # Read from the cached resolution, no process is started for it.
+    resolution = resolve_aider(_get_path(None))
+    if resolution is not None:
+        print("aider executable found at", resolution.aider)
+    else:
+        print("aider executable not found")
+    if result.output_tail:
+        crash_log = write_crash_log(cmd_list, result)
+        if crash_log is not None:
+            print(f"The last output of aider is saved in {crash_log}")
+
+
+# "aicode <name> ..." runs main(argv) of the module instead of aider.
+_SUBCOMMANDS = {
+    "agent": "aicode.cred_agent",
+    "analyze": "aicode.analyze",
+    "batch": "aicode.batch",
+    "bench-models": "aicode.bench_models",
+    "fanout": "aicode.fanout",
+    "history": "aicode.history",
+    "markers": "aicode.markers",
+    "prewarm": "aicode.prewarm",
+    "stats": "aicode.metrics",
+}
+
+
+def _run_subcommand(argv: list[str]) -> int | None:
+    """Runs the subcommand named by argv[0], None if it doesn't name one."""
+    import importlib
+
+    if not argv or argv[0] not in _SUBCOMMANDS:
+        return None
+    module = importlib.import_module(_SUBCOMMANDS[argv[0]])
+    return module.main(argv[1:])
+
+
 def cli(args: Args | list[str] | None = None) -> int:
-    args = _to_args(args)
+    from aicode import startup_trace
+
+    if not isinstance(args, Args):
+        rtn = _run_subcommand(sys.argv[1:] if args is None else args)
+        if rtn is not None:
+            return rtn
+    _enable_tracing_if_requested(args)
+    try:
+        return _cli(_to_args(args))
+    finally:
+        startup_trace.finish()
+
+
+def _cli(args: Args) -> int:
+    # Maintenance flags exit before any of the launch machinery is imported.
+    if args.open_aider_path:
+        return _open_aider_path()
+    if args.purge:
+        return _purge()
+    if args.upgrade:
+        return _upgrade()
+    if args.gc:
+        return _gc(args)
+    if args.export_wheelhouse is not None:
+        return _export_wheelhouse(args.export_wheelhouse)
+    if args.install_from_wheelhouse is not None:
+        return _install_from_wheelhouse(args.install_from_wheelhouse)
+
+    from aicode.aider_control import _get_path
+    from aicode.background import background_update_process, background_update_task
+    from aicode.build_cmd_list import build_cmd_list_or_die
+    from aicode.install_gc import write_lease
+    from aicode.markers import use_marker_watch
+    from aicode.metrics import metrics_enabled
+    from aicode.run_process import run_process
+
+    cleanup_files = _get_cleanup_files(args)
+    after_exit = _get_after_exit(args)
     _register_cleanup_if_necessary(args)
     cmd_list: list[str]
-    config: Config
+    config: "Config | None"
     cmd_list, config = build_cmd_list_or_die(args)
+    watch_markers = not args.warm and use_marker_watch(cmd_list)
+    if watch_markers:
+        # Opted in with AICODE_MARKER_WATCH=1, aicode watches for AI
+        # comments itself, see markers.py
+        cmd_list = [arg for arg in cmd_list if arg != "--watch"]
     print("\nLoading aider:\n  remember to use /help for a list of commands\n")
-    # Perform update in the background.
-    _ = background_update_task(config=config)
     _print_cmd_list(cmd_list)
-    # rtn = subprocess.call(cmd_list)
-    rtn = run_process(cmd_list)
-    if rtn != 0:
-        # debug by showing where the aider executable is
-        aider_path = aider_install_path()
-        if aider_path is not None:
-            print("aider executable found at", aider_path)
-        else:
-            print("aider executable not found")
-    return rtn
+    # Keeps --gc away from the generation while this session runs. The pid
+    # is the same after the exec, so the lease holds either way.
+    write_lease(_get_path(None))
+    if not watch_markers and _can_exec(args):
+        from aicode.direct_exec import exec_aider
+        from aicode.prewarm import finish_prewarm
+
+        # The exec would take the prewarm thread down with it.
+        finish_prewarm()
+        # Perform update in the background, in a process that survives the exec.
+        background_update_process(config)
+        exec_aider(cmd_list, remove_on_exit=cleanup_files, after_exit=after_exit)
+        # Still here, so the exec wasn't possible. The update check already
+        # runs, fall through to the normal spawn path.
+    else:
+        # Perform update in the background.
+        _ = background_update_task(config=config)
+    result = run_process(
+        cmd_list,
+        warm=args.warm,
+        session_log=args.session_log,
+        metrics=metrics_enabled(),
+        watch_markers=watch_markers,
+    )
+    if result.log_path is not None:
+        print(f"Session log written to {result.log_path}")
+    if result.returncode != 0:
+        _report_failure(cmd_list, result)
+    return result.returncode
@@ -1,7 +1,11 @@
-from dataclasses import asdict, dataclass, field, fields
+import copy
+from dataclasses import dataclass, field, fields
 from typing import Dict, Optional, Union
 
 from aicode.aider_update_result import AiderUpdateResult
+from aicode.startup_trace import traced
+
+DEFAULT_UPDATE_CHECK_TTL = 12 * 60 * 60  # seconds
 
 
 @dataclass
@@ -10,6 +14,13 @@ class Config:
     anthropic_key: Optional[str] = None
     gemini_key: Optional[str] = None
     aider_update_info: Dict[str, Union[str, bool, None]] = field(default_factory=dict)
+    # When aider_update_info is refreshed, see background.py.
+    aider_update_ttl: float = DEFAULT_UPDATE_CHECK_TTL
+    aider_update_next_check: float = 0
+    aider_update_failures: int = 0
+
+    # The fields as loaded, save() writes only the ones that changed since.
+    _loaded: dict | None = field(default=None, init=False, repr=False, compare=False)
 
     @property
     def aider_update_result(self) -> AiderUpdateResult | None:
@@ -20,11 +31,14 @@ class Config:
     @staticmethod
     def from_dict(data: dict) -> "Config":
         # Only extract keys that match the dataclass fields
-        valid_keys = {f.name for f in fields(Config)}
+        valid_keys = {f.name for f in fields(Config) if f.init}
         filtered_data = {k: v for k, v in data.items() if k in valid_keys}
-        return Config(**filtered_data)
+        config = Config(**filtered_data)
+        config._loaded = config.to_dict()
+        return config
 
     @staticmethod
+    @traced("Config.load")
     def load() -> "Config":
         from aicode.openaicfg import load_from_storage
 
@@ -32,9 +46,25 @@ class Config:
         return Config.from_dict(data)
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        # Not asdict, which would deep copy the _loaded snapshot as well.
+        return {
+            f.name: copy.deepcopy(getattr(self, f.name)) for f in fields(self) if f.init
+        }
+
+    def changes(self) -> dict:
+        """The fields that differ from what was loaded, all of them for a
+        Config that wasn't loaded."""
+        data = self.to_dict()
+        if self._loaded is None:
+            return data
+        return {k: v for k, v in data.items() if self._loaded.get(k) != v}
 
     def save(self) -> None:
-        from aicode.openaicfg import save_config
+        """Merges the changed fields into the stored config, so that a stale
+        copy doesn't undo what other processes saved meanwhile."""
+        from aicode.openaicfg import update_config
 
-        save_config(self.to_dict())
+        changes = self.changes()
+        update_config(changes)
+        if self._loaded is not None:
+            self._loaded.update(copy.deepcopy(changes))
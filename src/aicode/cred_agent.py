@@ -0,0 +1,429 @@
+"""
+Credential agent, an optional per-user process that keeps the decrypted
+config in memory.
+
+Loading the config directly means importing cryptography, deriving the key
+and decrypting secrets.enc, on every launch. With the agent running,
+Config.load asks it over a unix socket instead and falls back to the direct
+load when it isn't up. The agent re-reads the file whenever it changes, so
+saves made by any process are seen right away, and exits after
+--idle-timeout seconds without requests so the keys don't sit in memory for
+longer than they are used.
+
+The socket is only accessible to the user, in a 0700 directory, and on
+linux the agent also checks that the peer runs as the same user.
+
+    aicode agent start [--idle-timeout 900]
+    aicode agent stop|status
+    aicode agent bench [--runs 20]
+
+status reports what the agent has saved: the time a direct load took when
+the agent started, against the time it takes to answer a request.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from aicode.paths import CRED_AGENT_PATH
+
+if TYPE_CHECKING:
+    import subprocess
+
+# Only the client side is imported at the module level, it is on the launch
+# path and has to stay cheaper than the load it replaces.
+
+DEFAULT_IDLE_TIMEOUT = 15 * 60  # seconds
+
+# A client waits at most this long for an answer before loading directly.
+_CLIENT_TIMEOUT = 1.0
+
+_MAX_REQUEST = 4096
+
+
+def is_supported() -> bool:
+    return sys.platform != "win32" and hasattr(socket, "AF_UNIX")
+
+
+def socket_path(storage_path: Path | None = None) -> Path:
+    """One agent per config store, so a patched STORAGE_PATH never talks to
+    the agent of the real one."""
+    from aicode import openaicfg
+
+    storage_path = Path(
+        openaicfg.STORAGE_PATH if storage_path is None else storage_path
+    )
+    # Unix socket paths are limited to ~100 bytes, keep the name short.
+    name = hashlib.sha256(str(storage_path.resolve()).encode("utf-8")).hexdigest()[:12]
+    return CRED_AGENT_PATH / f"{name}.sock"
+
+
+def _request(sock_path: Path, op: str, timeout: float = _CLIENT_TIMEOUT) -> dict | None:
+    """Sends one request, None when no agent answers."""
+    if not sock_path.exists():
+        return None  # The common case, skip the connect.
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(sock_path))
+        sock.sendall(json.dumps({"op": op}).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as replies:
+            line = replies.readline()
+    except OSError:
+        return None
+    finally:
+        sock.close()
+    try:
+        reply = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(reply, dict) or "error" in reply:
+        return None
+    return reply
+
+
+def fetch_config(storage_path: Path | None = None) -> dict | None:
+    """The config from the agent, None when it isn't running."""
+    reply = _request(socket_path(storage_path), "config")
+    if reply is None or not isinstance(reply.get("config"), dict):
+        return None
+    return reply["config"]
+
+
+def _peer_uid(conn: socket.socket) -> int | None:
+    import struct
+
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None  # Not on this platform, the socket permissions still hold.
+    creds = conn.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid
+
+
+class _Agent:
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.stopping = False
+        self.served = 0
+        self.serve_seconds = 0.0
+        # What a launch without the agent pays: the imports, key
+        # derivation and decryption of a cold load.
+        start = time.perf_counter()
+        self._load()
+        self.direct_seconds = time.perf_counter() - start
+
+    @staticmethod
+    def _load() -> dict:
+        from aicode.openaicfg import load_from_storage
+
+        # Cached until secrets.enc changes, so this is cheap when warm.
+        return load_from_storage(use_agent=False)
+
+    def status(self) -> dict:
+        serve_mean = self.serve_seconds / self.served if self.served else None
+        saved = (
+            self.served * (self.direct_seconds - serve_mean)
+            if serve_mean is not None
+            else 0.0
+        )
+        return {
+            "pid": os.getpid(),
+            "started": self.started,
+            "served": self.served,
+            "direct_seconds": self.direct_seconds,
+            "serve_seconds_mean": serve_mean,
+            "saved_seconds": max(saved, 0.0),
+        }
+
+    def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "config":
+            return {"config": self._load()}
+        if op == "status":
+            return self.status()
+        if op == "ping":
+            return {"ok": True}
+        if op == "stop":
+            self.stopping = True
+            return {"ok": True}
+        return {"error": f"unknown op {op!r}"}
+
+
+def _serve_one(agent: _Agent, conn: socket.socket) -> None:
+    start = time.perf_counter()
+    conn.settimeout(_CLIENT_TIMEOUT)
+    if _peer_uid(conn) not in (None, os.getuid()):
+        return
+    data = b""
+    while not data.endswith(b"\n") and len(data) < _MAX_REQUEST:
+        chunk = conn.recv(_MAX_REQUEST)
+        if not chunk:
+            return
+        data += chunk
+    try:
+        request = json.loads(data)
+    except ValueError:
+        request = None
+    if not isinstance(request, dict):
+        request = {}
+    conn.sendall(json.dumps(agent.handle(request)).encode("utf-8") + b"\n")
+    if request.get("op") == "config":
+        agent.served += 1
+        agent.serve_seconds += time.perf_counter() - start
+
+
+def serve(sock_path: Path, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> int:
+    import fcntl
+    import signal
+
+    sock_path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    os.chmod(sock_path.parent, 0o700)
+    # Held for the life of the agent, so only one agent serves a socket.
+    lock_file = open(  # pylint: disable=consider-using-with
+        str(sock_path) + ".lock", "a+", encoding="utf-8"
+    )
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print("agent: another agent owns this socket", flush=True)
+        return 0
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    # So a kill still removes the socket on the way out.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    agent = _Agent()
+    if sock_path.exists():
+        sock_path.unlink()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(str(sock_path))
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+    server.settimeout(0.5)
+    print(
+        f"agent: ready pid={os.getpid()} direct load {agent.direct_seconds * 1000:.1f}ms",
+        flush=True,
+    )
+    last_active = time.monotonic()
+    try:
+        while time.monotonic() - last_active < idle_timeout and not agent.stopping:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                try:
+                    _serve_one(agent, conn)
+                except OSError as err:
+                    print(f"agent: request failed: {err}", flush=True)
+            last_active = time.monotonic()
+        print(
+            "agent: stopped" if agent.stopping else "agent: idle timeout, exiting",
+            flush=True,
+        )
+        return 0
+    finally:
+        server.close()
+        if sock_path.exists():
+            sock_path.unlink()
+
+
+def start_agent(
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT, storage_path: Path | None = None
+) -> "subprocess.Popen":
+    """Starts a detached agent, it is ready once it has loaded the config."""
+    import subprocess
+
+    from aicode import openaicfg
+
+    storage_path = Path(
+        openaicfg.STORAGE_PATH if storage_path is None else storage_path
+    )
+    sock_path = socket_path(storage_path)
+    sock_path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    with open(sock_path.with_suffix(".log"), "ab") as log_file:
+        return subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "aicode.cred_agent",
+                "serve",
+                "--socket",
+                str(sock_path),
+                "--storage-path",
+                str(storage_path),
+                "--idle-timeout",
+                str(idle_timeout),
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+
+def stop_agent(storage_path: Path | None = None) -> bool:
+    """Asks the agent to exit, False if there is none. The pid in the lock
+    file may be stale and reused by now, so nothing is sent a signal: the
+    lock tells whether an agent is running, the socket reaches it."""
+    import fcntl
+
+    sock_path = socket_path(storage_path)
+    try:
+        lock_file = open(  # pylint: disable=consider-using-with
+            str(sock_path) + ".lock", "rb"
+        )
+    except OSError:
+        return False
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            pass  # Held, an agent is running.
+        else:
+            return False
+    return _request(sock_path, "stop") is not None
+
+
+def wait_for_agent(storage_path: Path | None = None, timeout: float = 30) -> bool:
+    sock_path = socket_path(storage_path)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if _request(sock_path, "ping") is not None:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def agent_status(storage_path: Path | None = None) -> dict | None:
+    return _request(socket_path(storage_path), "status")
+
+
+def benchmark(
+    runs: int = 20, storage_path: Path | None = None
+) -> dict[str, list[float]]:
+    """Seconds per config load in fresh processes, without and with the
+    agent, which must be running. Both start timing with openaicfg and
+    the tracer imported, as they are by the time a launch loads the config."""
+    import subprocess
+
+    from aicode import openaicfg
+
+    storage_path = Path(
+        openaicfg.STORAGE_PATH if storage_path is None else storage_path
+    )
+    script = (
+        "import sys, time\n"
+        "from pathlib import Path\n"
+        "from aicode import openaicfg, startup_trace\n"
+        "openaicfg.STORAGE_PATH = Path(sys.argv[1])\n"
+        "start = time.perf_counter()\n"
+        "openaicfg.load_from_storage(use_agent=sys.argv[2] == '1')\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    results: dict[str, list[float]] = {"direct": [], "agent": []}
+    for _ in range(runs):
+        for mode in results:
+            cp = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    script,
+                    str(storage_path),
+                    "1" if mode == "agent" else "0",
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            results[mode].append(float(cp.stdout.strip()))
+    return results
+
+
+def _print_status(status: dict) -> None:
+    serve_mean = status.get("serve_seconds_mean")
+    print(f"pid: {status['pid']}, up {time.time() - status['started']:.0f}s")
+    print(f"config requests served: {status['served']}")
+    print(f"direct load: {status['direct_seconds'] * 1000:.1f}ms")
+    if serve_mean is not None:
+        print(f"agent request: {serve_mean * 1000:.2f}ms")
+    print(f"launch time saved: {status['saved_seconds']:.2f}s")
+
+
+def main(argv: list[str] | None = None) -> int:
+    import argparse
+    import warnings
+
+    parser = argparse.ArgumentParser(
+        prog="aicode agent", description="Manage the credential agent"
+    )
+    parser.add_argument(
+        "command", choices=["start", "stop", "status", "bench", "serve"]
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT,
+        help="Seconds without requests before the agent exits",
+    )
+    parser.add_argument("--runs", type=int, default=20, help="Loads per mode for bench")
+    parser.add_argument("--storage-path", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--socket", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if not is_supported():
+        print("The credential agent is not supported on this platform.")
+        return 1
+    if args.command == "serve":
+        from aicode import openaicfg
+
+        if args.storage_path is not None:
+            openaicfg.STORAGE_PATH = args.storage_path
+        return serve(args.socket or socket_path(args.storage_path), args.idle_timeout)
+    if args.command == "start":
+        if agent_status(args.storage_path) is None:
+            start_agent(args.idle_timeout, args.storage_path)
+        ok = wait_for_agent(args.storage_path)
+        print(
+            "Credential agent is ready." if ok else "Credential agent failed to start."
+        )
+        return 0 if ok else 1
+    if args.command == "stop":
+        stopped = stop_agent(args.storage_path)
+        print(
+            "Stopped the credential agent."
+            if stopped
+            else "No credential agent running."
+        )
+        return 0
+    status = agent_status(args.storage_path)
+    if args.command == "status":
+        if status is None:
+            print("No credential agent running.")
+        else:
+            _print_status(status)
+        return 0
+    if status is None:
+        warnings.warn("No credential agent running, start it with: aicode agent start")
+        return 1
+    results = benchmark(args.runs, args.storage_path)
+    direct = min(results["direct"])
+    agent = min(results["agent"])
+    print(
+        f"direct load: {direct * 1000:.1f}ms, agent load: {agent * 1000:.1f}ms, saved {(direct - agent) * 1000:.1f}ms per launch"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
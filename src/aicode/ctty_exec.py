@@ -0,0 +1,29 @@
+"""
+Exec wrapper that gives a pty session its controlling terminal.
+
+session_runner.py starts aider in a new session on a pseudo-terminal, and
+ctrl-c only reaches aider once that pty is the session's controlling
+terminal. Taking it in a preexec_fn isn't safe while aicode has threads
+running (output taps, the update check), the forked child can deadlock on a
+lock one of them held. So the child starts this script instead, which takes
+the terminal on stdin and execs the command. It is run with "python -S -E"
+and must only use the standard library.
+
+    python -S -E ctty_exec.py CMD [ARGS...]
+"""
+
+import fcntl
+import os
+import sys
+import termios
+
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        raise SystemExit("usage: ctty_exec.py CMD [ARGS...]")
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+    os.execvp(sys.argv[1], sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Direct-exec launch path.
+
+Instead of keeping the aicode process alive around an IsoEnv "uv run" child,
+resolve the install generation's interpreter and aider console script once,
+cache that next to the generation, and os.execve straight into aider. When
+chat history has to be cleaned up afterwards we exec into supervisor.py, a
+stdlib-only script that runs aider and then removes the files.
+"""
+
+import json
+import os
+import sys
+import warnings
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+_RESOLVED_FILE = "resolved.json"
+
+_SUPERVISOR_SCRIPT = Path(__file__).with_name("supervisor.py")
+
+
+@dataclass
+class AiderResolution:
+    python: str
+    aider: str
+    venv: str
+
+    def exists(self) -> bool:
+        return os.path.exists(self.python) and os.path.exists(self.aider)
+
+
+def is_supported() -> bool:
+    # On Windows os.execve spawns a new process and exits, which detaches
+    # aider from the console.
+    return sys.platform != "win32"
+
+
+def _load_resolution(install_path: Path) -> Optional[AiderResolution]:
+    try:
+        data = json.loads((install_path / _RESOLVED_FILE).read_text(encoding="utf-8"))
+        resolution = AiderResolution(**data)
+    except (OSError, ValueError, TypeError):
+        return None
+    return resolution if resolution.exists() else None
+
+
+def resolve_aider(install_path: Path) -> Optional[AiderResolution]:
+    """Returns where aider lives in the install generation, cached per generation."""
+    from aicode.aider_control import (
+        aider_installed,
+        get_venv_bin,
+        get_venv_path,
+        get_venv_python,
+    )
+
+    resolution = _load_resolution(install_path)
+    if resolution is not None:
+        return resolution
+    if not aider_installed(install_path):
+        return None
+    aider = get_venv_bin(install_path) / "aider"
+    resolution = AiderResolution(
+        python=str(get_venv_python(install_path)),
+        aider=str(aider),
+        venv=str(get_venv_path(install_path)),
+    )
+    if not resolution.exists():
+        return None
+    try:
+        (install_path / _RESOLVED_FILE).write_text(
+            json.dumps(asdict(resolution)), encoding="utf-8"
+        )
+    except OSError as err:
+        warnings.warn(f"Failed to cache aider resolution: {err}")
+    return resolution
+
+
+def exec_aider(
+    cmd_list: list[str],
+    install_path: Path | None = None,
+    remove_on_exit: list[Path] | None = None,
+    after_exit: list[str] | None = None,
+) -> None:
+    """Replaces this process with aider. Only returns if that wasn't possible."""
+    from aicode.aider_control import _get_path, get_venv_env
+
+    if not is_supported():
+        return
+    install_path = _get_path(install_path)
+    resolution = resolve_aider(install_path)
+    if resolution is None:
+        return
+    env = get_venv_env(install_path)
+    aider_argv = [resolution.aider] + cmd_list[1:]
+    if remove_on_exit or after_exit:
+        argv = [sys.executable, "-S", "-E", str(_SUPERVISOR_SCRIPT)]
+        for path in remove_on_exit or []:
+            argv += ["--remove", str(path)]
+        if after_exit:
+            argv += ["--then", json.dumps(after_exit)]
+        argv += ["--"] + aider_argv
+    else:
+        argv = aider_argv
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        os.execve(argv[0], argv, env)
+    except OSError as err:
+        warnings.warn(f"Failed to exec aider, falling back: {err}")
@@ -0,0 +1,324 @@
+"""
+Parallel fan-out of one task across git worktrees.
+
+    aicode fanout MESSAGE_FILE [--glob PATTERN ...] [--depth N]
+                  [--workers N] [--model MODEL ...] [--timeout SECONDS]
+
+Splits the tracked files of the repo into groups, by directory (the default,
+--depth levels deep) or by one --glob per group. Every group gets its own
+branch and worktree made from HEAD, and its own headless aider session that
+is told to only touch the files of its group. The sessions run in parallel
+through the batch runner. Afterwards every branch with changes is merged
+back into the current branch, a merge that conflicts is aborted and
+reported, and its branch is kept for resolving by hand. Models given with
+--model are handed out to the groups round robin.
+
+The session logs are kept when a group doesn't merge, next to the --report
+or in the cache, see FANOUT_PATH.
+"""
+
+import argparse
+import fnmatch
+import json
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from aicode.batch import DEFAULT_TIMEOUT, DEFAULT_WORKERS, BatchJob, BatchRunner
+from aicode.paths import FANOUT_PATH
+
+# Above this the file list is left out of the message, the scope is enough.
+_MAX_LISTED_FILES = 50
+
+# What aicode itself edits in the repo it launches in, see build_cmd_list.py.
+# Never part of a group's changes.
+_AICODE_FILES = [".gitignore", ".aiderignore"]
+
+MERGED = "merged"
+NO_CHANGES = "no-changes"
+CONFLICT = "conflict"
+FAILED = "failed"
+
+
+class FanoutError(Exception):
+    pass
+
+
+@dataclass
+class FileGroup:
+    name: str
+    scope: str
+    files: list[str]
+
+
+@dataclass
+class GroupResult:
+    group: str
+    branch: str
+    status: str
+    returncode: int | None
+    changed_files: list[str] = field(default_factory=list)
+    conflicts: list[str] = field(default_factory=list)
+    log_file: str | None = None
+
+
+def _git(repo: Path, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+    cp = subprocess.run(
+        ["git", *args],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+        check=False,
+        stdin=subprocess.DEVNULL,
+    )
+    if check and cp.returncode != 0:
+        raise FanoutError(f"git {' '.join(args)} failed: {cp.stderr.strip()}")
+    return cp
+
+
+def _lines(cp: subprocess.CompletedProcess) -> list[str]:
+    return [line for line in cp.stdout.splitlines() if line.strip()]
+
+
+def group_by_directory(files: list[str], depth: int = 1) -> list[FileGroup]:
+    groups: dict[str, list[str]] = {}
+    for file in files:
+        parts = file.split("/")[:-1][:depth]
+        groups.setdefault("/".join(parts) or ".", []).append(file)
+    out = []
+    for name, group in sorted(groups.items()):
+        scope = f"files under {name}/" if name != "." else "files at the top level"
+        out.append(FileGroup(name=name, scope=scope, files=group))
+    return out
+
+
+def group_by_globs(files: list[str], globs: list[str]) -> list[FileGroup]:
+    groups = []
+    for pattern in globs:
+        matched = [file for file in files if fnmatch.fnmatch(file, pattern)]
+        if matched:
+            groups.append(
+                FileGroup(
+                    name=pattern, scope=f"files matching {pattern}", files=matched
+                )
+            )
+    return groups
+
+
+def group_message(task: str, group: FileGroup) -> str:
+    lines = [
+        task.rstrip(),
+        "",
+        f"This is one of several parallel sessions. Only edit the {group.scope}, other sessions take care of the rest.",
+    ]
+    if len(group.files) <= _MAX_LISTED_FILES:
+        lines += ["", "The files are:"] + [f"- {file}" for file in group.files]
+    return "\n".join(lines) + "\n"
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "-", name).strip("-.") or "root"
+
+
+def _commit_leftovers(worktree: Path, group: FileGroup) -> None:
+    """Commits what the session changed but didn't commit itself."""
+    if not _lines(_git(worktree, "status", "--porcelain")):
+        return
+    _git(worktree, "add", "-A")
+    _git(worktree, "reset", "-q", "--", *_AICODE_FILES)
+    if _git(worktree, "diff", "--cached", "--quiet", check=False).returncode == 0:
+        return
+    _git(
+        worktree,
+        "-c",
+        "user.name=aicode",
+        "-c",
+        "user.email=aicode@localhost",
+        "commit",
+        "--no-verify",
+        "-m",
+        f"aicode fanout: {group.name}",
+    )
+
+
+def _merge(repo: Path, branch: str) -> list[str]:
+    """Merges branch into the current branch, returns the conflicting files
+    after aborting the merge, or [] if it merged."""
+    cp = _git(repo, "merge", "--no-ff", "--no-edit", branch, check=False)
+    if cp.returncode == 0:
+        return []
+    conflicts = _lines(
+        _git(repo, "diff", "--name-only", "--diff-filter=U", check=False)
+    )
+    _git(repo, "merge", "--abort", check=False)
+    if conflicts:
+        return conflicts
+    # Failed without conflicts, e.g. no committer identity.
+    reason = (cp.stderr.strip().splitlines() or ["unknown error"])[-1]
+    return [f"<merge failed: {reason}>"]
+
+
+def run_fanout(
+    repo: Path,
+    task: str,
+    groups: list[FileGroup],
+    workers: int = DEFAULT_WORKERS,
+    models: list[str] | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    report_path: Path | None = None,
+    aicode_cmd: list[str] | None = None,
+) -> list[GroupResult]:
+    if _lines(_git(repo, "status", "--porcelain", "--untracked-files=no")):
+        raise FanoutError(
+            "The working tree has uncommitted changes, commit or stash them first"
+        )
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    work_dir = Path(tempfile.mkdtemp(prefix=f"aicode-fanout-{run_id}-"))
+    keep_report = report_path is not None
+    report_path = report_path or FANOUT_PATH / f"{run_id}.jsonl"
+    branches: list[str] = []
+    worktrees: list[Path] = []
+    jobs: list[BatchJob] = []
+    results: list[GroupResult] = []
+    try:
+        for index, group in enumerate(groups):
+            branch = f"aicode/fanout-{run_id}-{index}-{_slug(group.name)}"
+            worktree = work_dir / str(index)
+            _git(repo, "worktree", "add", "-b", branch, str(worktree), "HEAD")
+            branches.append(branch)
+            worktrees.append(worktree)
+            message_file = work_dir / f"{index}.md"
+            message_file.write_text(group_message(task, group), encoding="utf-8")
+            model = models[index % len(models)] if models else None
+            jobs.append(
+                BatchJob(
+                    id=str(index),
+                    repo=worktree,
+                    message_file=message_file,
+                    model=model,
+                    args=["--auto-commit"],
+                )
+            )
+        runner = BatchRunner(
+            report_path, workers=workers, timeout=timeout, aicode_cmd=aicode_cmd
+        )
+        job_results = {r.id: r for r in runner.run(jobs)}
+        for index, group in enumerate(groups):
+            job_result = job_results[str(index)]
+            result = GroupResult(
+                group=group.name,
+                branch=branches[index],
+                status=FAILED,
+                returncode=job_result.returncode,
+                log_file=job_result.log_file,
+            )
+            results.append(result)
+            if job_result.returncode != 0:
+                continue  # Keep the branch, the partial work may be useful.
+            _commit_leftovers(worktrees[index], group)
+            # Three dots, only what the branch changed since it forked.
+            diff = _git(repo, "diff", "--name-only", f"HEAD...{branches[index]}")
+            result.changed_files = _lines(diff)
+            if not result.changed_files:
+                result.status = NO_CHANGES
+                continue
+            result.conflicts = _merge(repo, branches[index])
+            result.status = CONFLICT if result.conflicts else MERGED
+    finally:
+        for worktree in worktrees:
+            _git(repo, "worktree", "remove", "--force", str(worktree), check=False)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    for result in results:
+        if result.status in (MERGED, NO_CHANGES):
+            _git(repo, "branch", "-D", result.branch, check=False)
+    if not keep_report and all(r.status in (MERGED, NO_CHANGES) for r in results):
+        # Nothing to look into, the logs only matter for failed groups.
+        shutil.rmtree(runner.logs_dir, ignore_errors=True)
+        report_path.unlink(missing_ok=True)
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    from aicode.util import _find_path_to_git_directory
+
+    parser = argparse.ArgumentParser(
+        prog="aicode fanout",
+        description="Split one task over groups of files and run them in parallel worktrees",
+    )
+    parser.add_argument("message_file", type=Path, help="The task for aider")
+    parser.add_argument(
+        "--glob",
+        action="append",
+        default=[],
+        help="One group per pattern, e.g. 'src/*.py' (default: group by directory)",
+    )
+    parser.add_argument(
+        "--depth", type=int, default=1, help="Directory depth of the groups"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="Sessions to run at once"
+    )
+    parser.add_argument(
+        "--model",
+        action="append",
+        default=[],
+        help="Model of the sessions, repeat to hand out several round robin",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Per session timeout in seconds",
+    )
+    parser.add_argument(
+        "--report", type=Path, help="Also write the session results to this JSONL file"
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        task = args.message_file.read_text(encoding="utf-8")
+        repo = _find_path_to_git_directory(Path.cwd())
+    except (OSError, FileNotFoundError) as err:
+        print(f"Error: {err}")
+        return 1
+    files = _lines(_git(repo, "ls-files"))
+    groups = (
+        group_by_globs(files, args.glob)
+        if args.glob
+        else group_by_directory(files, args.depth)
+    )
+    if not groups:
+        print("No files to work on")
+        return 1
+    print(f"Fanning out over {len(groups)} groups in {repo}")
+    try:
+        results = run_fanout(
+            repo,
+            task,
+            groups,
+            workers=args.workers,
+            models=args.model,
+            timeout=args.timeout,
+            report_path=args.report.absolute() if args.report else None,
+        )
+    except FanoutError as err:
+        print(f"Error: {err}")
+        return 1
+    for result in results:
+        print(json.dumps(asdict(result)))
+    ok = all(r.status in (MERGED, NO_CHANGES) for r in results)
+    if not ok:
+        print(
+            "Some groups did not merge, their branches are kept for resolving by hand."
+        )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,413 @@
+"""
+Chat history archive, "aicode history".
+
+aider appends every session to .aider.chat.history.md and every prompt to
+.aider.input.history in the repo root. aicode used to delete both at exit
+unless --keep was given, and with --keep they grew without bound. Now the
+sessions that ended are moved into a per-repo archive of gzipped JSON files
+first, which is capped in size and age; without --keep the live files are
+then removed as before, with --keep they are cut down to the last session.
+Set AICODE_NO_HISTORY_ARCHIVE=1 to go back to deleting.
+
+    aicode history list
+    aicode history restore [SESSION ...] [--last N]
+    aicode history search QUERY [--repo REPO] [--model MODEL] [--since DATE]
+
+restore merges archived sessions back into the live files, for aider's
+--restore-chat-history and the prompt's up-arrow. search looks through the
+sessions of every repo, see history_search.py.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import warnings
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from aicode.paths import HISTORY_DB_PATH, HISTORY_PATH
+
+CHAT_HISTORY = ".aider.chat.history.md"
+INPUT_HISTORY = ".aider.input.history"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 180
+
+# What --keep leaves of the input history, the prompt loads all of it.
+_KEEP_INPUTS = 1000
+
+_MANIFEST = "manifest.json"
+
+# Written by aider at the start of each session, see aider/io.py.
+_SESSION_HEADER = re.compile(
+    r"^# aider chat started at (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)$", re.MULTILINE
+)
+# Written by prompt_toolkit's FileHistory before each entry.
+_INPUT_ENTRY = re.compile(
+    r"^# (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(?:\.\d+)?)$", re.MULTILINE
+)
+
+
+@dataclass
+class ArchivedSession:
+    id: str
+    started: str
+    file: str
+    prompts: int
+    title: str
+    chat_bytes: int
+    stored_bytes: int
+    archived: float
+
+
+@dataclass
+class _LiveSession:
+    started: str
+    chat: str
+    inputs: list[tuple[str, str]]
+
+    @property
+    def prompts(self) -> list[str]:
+        return [line[5:] for line in self.chat.splitlines() if line.startswith("#### ")]
+
+
+def archive_enabled() -> bool:
+    return os.environ.get("AICODE_NO_HISTORY_ARCHIVE", "") in ("", "0")
+
+
+def history_root(cwd: Path) -> Path:
+    """Where aider writes the history files, the root of the repo."""
+    from aicode.util import _find_path_to_git_directory
+
+    try:
+        return _find_path_to_git_directory(cwd)
+    except FileNotFoundError:
+        return cwd.absolute()
+
+
+def archive_dir_for(root: Path) -> Path:
+    name = hashlib.sha256(str(root).encode("utf-8")).hexdigest()[:16]
+    return HISTORY_PATH / name
+
+
+def split_chat(text: str) -> list[tuple[str, str]]:
+    """(start time, text) of each session in a chat history file. Text
+    before the first header, if any, goes with the first session."""
+    headers = list(_SESSION_HEADER.finditer(text))
+    if not headers:
+        return [("", text)] if text.strip() else []
+    sessions = []
+    for i, header in enumerate(headers):
+        start = 0 if i == 0 else header.start()
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        sessions.append((header.group(1), text[start:end]))
+    return sessions
+
+
+def split_inputs(text: str) -> list[tuple[str, str]]:
+    """(time, raw entry) of each entry in an input history file."""
+    stamps = list(_INPUT_ENTRY.finditer(text))
+    entries = []
+    for i, stamp in enumerate(stamps):
+        end = stamps[i + 1].start() if i + 1 < len(stamps) else len(text)
+        entries.append((stamp.group(1), text[stamp.start() : end]))
+    return entries
+
+
+def _join_inputs(entries: list[tuple[str, str]]) -> str:
+    return "".join("\n" + entry.strip("\n") + "\n" for _, entry in entries)
+
+
+def _read(path: Path) -> str:
+    try:
+        return path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+def _live_sessions(root: Path) -> list[_LiveSession]:
+    chats = split_chat(_read(root / CHAT_HISTORY))
+    inputs = split_inputs(_read(root / INPUT_HISTORY))
+    sessions = []
+    for i, (started, chat) in enumerate(chats):
+        # The prompts of a session are those typed before the next started.
+        until = chats[i + 1][0] if i + 1 < len(chats) else None
+        own = [
+            e
+            for e in inputs
+            if (i == 0 or e[0] >= started) and (until is None or e[0] < until)
+        ]
+        sessions.append(_LiveSession(started, chat, own))
+    return sessions
+
+
+def _session_id(started: str, taken: set[str]) -> str:
+    base = re.sub(r"\D", "", started)[:14] or time.strftime("%Y%m%d%H%M%S")
+    base = f"{base[:8]}-{base[8:]}"
+    session_id = base
+    n = 1
+    while session_id in taken:
+        n += 1
+        session_id = f"{base}-{n}"
+    return session_id
+
+
+class HistoryArchive:
+    """The archived sessions of one repo."""
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+        archive_dir: Path | None = None,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.dir = archive_dir or archive_dir_for(root)
+
+    def _lock(self):
+        from filelock import FileLock
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        return FileLock(str(self.dir / f"{_MANIFEST}.lock"))
+
+    def sessions(self) -> list[ArchivedSession]:
+        try:
+            data = json.loads((self.dir / _MANIFEST).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return []
+        return [ArchivedSession(**s) for s in data.get("sessions", [])]
+
+    def _save(self, sessions: list[ArchivedSession]) -> None:
+        data = {"root": str(self.root), "sessions": [asdict(s) for s in sessions]}
+        tmp = self.dir / f"{_MANIFEST}.tmp"
+        tmp.write_text(json.dumps(data, indent=1), encoding="utf-8")
+        os.replace(tmp, self.dir / _MANIFEST)
+
+    def load(self, session: ArchivedSession) -> dict:
+        """{"started", "root", "chat", "inputs"} of an archived session."""
+        with gzip.open(self.dir / session.file, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _prune(self, sessions: list[ArchivedSession]) -> list[ArchivedSession]:
+        cutoff = time.time() - self.max_age_days * 24 * 60 * 60
+        kept = sorted(
+            (s for s in sessions if s.archived >= cutoff), key=lambda s: s.started
+        )
+        while kept and sum(s.stored_bytes for s in kept) > self.max_bytes:
+            kept.pop(0)
+        for session in sessions:
+            if session not in kept:
+                try:
+                    (self.dir / session.file).unlink()
+                except OSError:
+                    pass
+        return kept
+
+    def archive(self, keep: bool = False) -> list[ArchivedSession]:
+        """Archives the sessions of the live files that aren't archived yet,
+        then removes the live files, or with keep cuts them down to the last
+        session. Returns the newly archived sessions."""
+        with self._lock():
+            sessions = self.sessions()
+            known = {s.started for s in sessions}
+            taken = {s.id for s in sessions}
+            live = _live_sessions(self.root)
+            added = []
+            for session in live:
+                if session.started in known or not (session.prompts or session.inputs):
+                    continue
+                session_id = _session_id(session.started, taken)
+                taken.add(session_id)
+                data = {
+                    "started": session.started,
+                    "root": str(self.root),
+                    "chat": session.chat,
+                    "inputs": _join_inputs(session.inputs),
+                }
+                name = f"{session_id}.json.gz"
+                with gzip.open(
+                    self.dir / name, "wt", encoding="utf-8", compresslevel=6
+                ) as f:
+                    json.dump(data, f)
+                prompts = session.prompts
+                added.append(
+                    ArchivedSession(
+                        id=session_id,
+                        started=session.started,
+                        file=name,
+                        prompts=len(prompts),
+                        title=(prompts[0] if prompts else "").strip()[:80],
+                        chat_bytes=len(session.chat.encode("utf-8")),
+                        stored_bytes=(self.dir / name).stat().st_size,
+                        archived=time.time(),
+                    )
+                )
+            self._save(self._prune(sessions + added))
+            self._trim(live, keep)
+        return added
+
+    def _trim(self, live: list[_LiveSession], keep: bool) -> None:
+        chat_path = self.root / CHAT_HISTORY
+        input_path = self.root / INPUT_HISTORY
+        if not keep:
+            for path in (chat_path, input_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            return
+        if len(live) > 1:
+            chat_path.write_text(live[-1].chat, encoding="utf-8")
+        inputs = split_inputs(_read(input_path))
+        if len(inputs) > _KEEP_INPUTS:
+            input_path.write_text(
+                _join_inputs(inputs[-_KEEP_INPUTS:]), encoding="utf-8"
+            )
+
+    def restore(self, sessions: list[ArchivedSession]) -> int:
+        """Merges the sessions into the live files, in time order. Returns
+        how many weren't there already."""
+        live = _live_sessions(self.root)
+        chats = {s.started: s.chat for s in live}
+        inputs = dict(split_inputs(_read(self.root / INPUT_HISTORY)))
+        restored = 0
+        for session in sessions:
+            data = self.load(session)
+            if data["started"] not in chats:
+                restored += 1
+            chats[data["started"]] = data["chat"]
+            inputs.update(split_inputs(data["inputs"]))
+        (self.root / CHAT_HISTORY).write_text(
+            "".join(chats[k] for k in sorted(chats)), encoding="utf-8"
+        )
+        (self.root / INPUT_HISTORY).write_text(
+            _join_inputs(sorted(inputs.items())), encoding="utf-8"
+        )
+        return restored
+
+
+def archive_on_exit(cwd: Path, keep: bool) -> None:
+    """The exit hook, the live files stay where they are if anything fails.
+    The search index is brought up to date in the background."""
+    try:
+        added = HistoryArchive(history_root(cwd)).archive(keep=keep)
+    except Exception as err:  # pylint: disable=broad-except
+        warnings.warn(f"Failed to archive the chat history: {err}")
+        return
+    if added:
+        from aicode.history_search import start_indexing
+
+        start_indexing()
+
+
+def archive_command(cwd: Path, keep: bool) -> list[str]:
+    """archive_on_exit as a command, for the direct-exec supervisor."""
+    cmd = [sys.executable, "-m", "aicode.history", "archive", "--cwd", str(cwd)]
+    return cmd + (["--keep"] if keep else [])
+
+
+def _human(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="aicode history", description="Archived aider chat sessions of the repo"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List the archived sessions")
+    restore = sub.add_parser(
+        "restore", help="Put archived sessions back into the chat history"
+    )
+    restore.add_argument(
+        "ids", nargs="*", help="Session ids from list, the last one by default"
+    )
+    restore.add_argument("--last", type=int, help="Restore the last N sessions")
+    archive = sub.add_parser(
+        "archive", help="Archive the sessions of the live history files now"
+    )
+    archive.add_argument("--cwd", type=Path, default=None, help=argparse.SUPPRESS)
+    archive.add_argument(
+        "--keep", action="store_true", help="Keep the last session in the live files"
+    )
+    search = sub.add_parser("search", help="Search the archived sessions of all repos")
+    search.add_argument("query", nargs="+", help="Words that must all appear")
+    search.add_argument(
+        "--repo", help="Only repos whose path contains this, or this repo directory"
+    )
+    search.add_argument("--model", help="Only models whose name contains this")
+    search.add_argument("--since", help="Only sessions started on or after YYYY-MM-DD")
+    search.add_argument("--until", help="Only sessions started on or before YYYY-MM-DD")
+    search.add_argument(
+        "--limit", type=int, default=20, help="Number of hits (default: 20)"
+    )
+    search.add_argument("--raw", action="store_true", help="The query is FTS5 syntax")
+    search.add_argument("--json", action="store_true", help="Print JSON")
+    search.add_argument(
+        "--db", type=Path, default=HISTORY_DB_PATH, help=argparse.SUPPRESS
+    )
+    sub.add_parser("index", help="Bring the search index up to date")
+    args = parser.parse_args(argv)
+
+    if args.command in ("search", "index"):
+        from aicode import history_search
+
+        if args.command == "search":
+            return history_search.main(args)
+        conn = history_search.connect()
+        try:
+            history_search.index_pending(conn)
+        finally:
+            conn.close()
+        return 0
+
+    if args.command == "archive":
+        if args.cwd is not None:
+            archive_on_exit(args.cwd, args.keep)
+            return 0
+        added = HistoryArchive(history_root(Path.cwd())).archive(keep=args.keep)
+        print(f"Archived {len(added)} sessions")
+        return 0
+
+    history = HistoryArchive(history_root(Path.cwd()))
+    sessions = history.sessions()
+    if args.command == "list":
+        if not sessions:
+            print("No archived sessions")
+        for session in sessions:
+            print(
+                f"{session.id}  {session.started}  {session.prompts:>3} prompts  "
+                f"{_human(session.chat_bytes):>7}  {session.title}"
+            )
+        return 0
+
+    by_id = {s.id: s for s in sessions}
+    missing = [i for i in args.ids if i not in by_id]
+    if missing:
+        print(f"No archived session {', '.join(missing)}, see aicode history list")
+        return 1
+    chosen = [by_id[i] for i in args.ids] or sessions[-(args.last or 1) :]
+    if not chosen:
+        print("No archived sessions")
+        return 1
+    restored = history.restore(chosen)
+    print(
+        f"Restored {restored} sessions into {CHAT_HISTORY}, start aider with --restore-chat-history to load them"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Full-text search over the archived chat sessions of every repo.
+
+Each session that history.py archives is split into turns, a prompt with
+aider's response and the files it edited, and the turns go into a SQLite
+FTS5 table next to the archive. The indexing runs in a detached process that
+archive_on_exit starts, so the end of a session never waits for it; it picks
+up whatever archived sessions the index doesn't have yet and drops the ones
+the archive has pruned.
+
+    aicode history search QUERY [--repo REPO] [--model MODEL] [--since DATE] [--until DATE]
+
+The words of QUERY must all appear in a turn, --raw takes FTS5 query syntax
+instead. Hits are ranked with bm25, prompts weigh the most.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import warnings
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from aicode.paths import HISTORY_DB_PATH, HISTORY_PATH
+
+if TYPE_CHECKING:
+    import sqlite3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    session TEXT NOT NULL,
+    started TEXT NOT NULL,
+    model TEXT,
+    UNIQUE (repo, session)
+);
+CREATE INDEX IF NOT EXISTS sessions_started ON sessions (started);
+CREATE VIRTUAL TABLE IF NOT EXISTS turns USING fts5(
+    prompt, response, files, session_rowid UNINDEXED, turn UNINDEXED, tokenize = 'porter unicode61'
+);
+"""
+
+# bm25 weights of prompt, response and files.
+_WEIGHTS = (4.0, 1.0, 2.0)
+
+# aider's announcement and edit lines, quoted with "> " in the chat history.
+_MODEL = re.compile(r"^> (?:Main model|Model): (\S+) with ")
+_MODEL_ARG = re.compile(r"^> aider .*--model[ =](\S+)")
+_APPLIED = re.compile(r"^> Applied edit to (.+?)\s*$")
+
+
+@dataclass
+class ChatTurn:
+    prompt: str
+    response: str = ""
+    files: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Hit:
+    repo: str
+    session: str
+    started: str
+    model: str | None
+    turn: int
+    snippet: str
+    files: str
+
+
+def parse_chat(chat: str) -> tuple[str | None, list[ChatTurn]]:
+    """The model and the turns of one session of aider's chat history."""
+    model: str | None = None
+    turns: list[ChatTurn] = []
+    response: list[str] = []
+    in_prompt = False
+
+    def _end_response() -> None:
+        if turns:
+            turns[-1].response = "\n".join(response).strip()
+        response.clear()
+
+    for line in chat.splitlines():
+        if line.startswith("#### "):
+            text = line[5:].rstrip()
+            # A prompt of several lines is several #### lines in a row.
+            if in_prompt:
+                turns[-1].prompt += "\n" + text
+            else:
+                _end_response()
+                turns.append(ChatTurn(text))
+            in_prompt = True
+            continue
+        in_prompt = False
+        if line.startswith("> "):
+            match = _MODEL.match(line) or (None if model else _MODEL_ARG.match(line))
+            if match:
+                model = match.group(1)
+            match = _APPLIED.match(line)
+            if match and turns and match.group(1) not in turns[-1].files:
+                turns[-1].files.append(match.group(1))
+        elif turns:
+            response.append(line)
+    _end_response()
+    return model, turns
+
+
+def connect(db_path: Path = HISTORY_DB_PATH) -> "sqlite3.Connection":
+    import sqlite3
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    # WAL, so that searches don't wait for an indexer.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _archive_dirs(history_path: Path) -> list[Path]:
+    try:
+        return [d for d in history_path.iterdir() if (d / "manifest.json").exists()]
+    except OSError:
+        return []
+
+
+def _drop(conn: "sqlite3.Connection", rowids: list[int]) -> None:
+    for rowid in rowids:
+        conn.execute("DELETE FROM turns WHERE session_rowid = ?", (rowid,))
+        conn.execute("DELETE FROM sessions WHERE id = ?", (rowid,))
+
+
+def index_pending(conn: "sqlite3.Connection", history_path: Path = HISTORY_PATH) -> int:
+    """Indexes the archived sessions that aren't yet, drops the pruned ones.
+    Returns how many sessions were added."""
+    from aicode.history import HistoryArchive
+
+    added = 0
+    roots = set()
+    for archive_dir in _archive_dirs(history_path):
+        try:
+            root = json.loads(
+                (archive_dir / "manifest.json").read_text(encoding="utf-8")
+            )["root"]
+        except (OSError, ValueError, KeyError):
+            continue
+        roots.add(root)
+        archive = HistoryArchive(Path(root), archive_dir=archive_dir)
+        sessions = {s.id: s for s in archive.sessions()}
+        indexed = dict(
+            conn.execute(
+                "SELECT session, id FROM sessions WHERE repo = ?", (root,)
+            ).fetchall()
+        )
+        with conn:
+            _drop(
+                conn,
+                [
+                    rowid
+                    for session_id, rowid in indexed.items()
+                    if session_id not in sessions
+                ],
+            )
+            for session_id, session in sessions.items():
+                if session_id in indexed:
+                    continue
+                try:
+                    data = archive.load(session)
+                except (OSError, ValueError) as err:
+                    warnings.warn(
+                        f"Failed to read archived session {session.file}: {err}"
+                    )
+                    continue
+                model, turns = parse_chat(data["chat"])
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO sessions (repo, session, started, model) VALUES (?, ?, ?, ?)",
+                    (root, session_id, session.started, model),
+                )
+                if cur.rowcount != 1:
+                    continue  # another indexer got there first
+                conn.executemany(
+                    "INSERT INTO turns (prompt, response, files, session_rowid, turn) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (t.prompt, t.response, " ".join(t.files), cur.lastrowid, i)
+                        for i, t in enumerate(turns, 1)
+                    ],
+                )
+                added += 1
+    # Repos whose archive is gone altogether.
+    with conn:
+        _drop(
+            conn,
+            [
+                rowid
+                for rowid, repo in conn.execute(
+                    "SELECT id, repo FROM sessions"
+                ).fetchall()
+                if repo not in roots
+            ],
+        )
+    return added
+
+
+def start_indexing() -> subprocess.Popen | None:
+    """Runs index_pending in a detached process."""
+    try:
+        return subprocess.Popen(
+            [sys.executable, "-m", "aicode.history", "index"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError as err:
+        warnings.warn(f"Failed to start indexing the chat history: {err}")
+        return None
+
+
+def fts_query(text: str) -> str:
+    """Every word of text as an FTS5 string, so that punctuation in the
+    query can't be taken for FTS5 syntax."""
+    return " ".join(
+        '"' + word.replace('"', '""') + '"' for word in re.findall(r"\w+", text)
+    )
+
+
+def search(
+    conn: "sqlite3.Connection",
+    query: str,
+    repo: str | None = None,
+    model: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = 20,
+) -> list[Hit]:
+    """The best turns for an FTS5 query. repo and model match substrings,
+    since and until compare with the session start, "YYYY-MM-DD[ HH:MM:SS]"."""
+    sql = (
+        "SELECT s.repo, s.session, s.started, s.model, turns.turn,"
+        " snippet(turns, -1, '[', ']', '...', 16), turns.files"
+        " FROM turns JOIN sessions s ON s.id = turns.session_rowid"
+        " WHERE turns MATCH ?"
+    )
+    params: list = [query]
+    if repo:
+        sql += " AND s.repo LIKE ?"
+        params.append(f"%{repo}%")
+    if model:
+        sql += " AND s.model LIKE ?"
+        params.append(f"%{model}%")
+    if since:
+        sql += " AND s.started >= ?"
+        params.append(since)
+    if until:
+        # The whole of the last day.
+        sql += " AND s.started < ?"
+        params.append(until + ("\x7f" if len(until) <= 10 else ""))
+    sql += f" ORDER BY bm25(turns, {', '.join(str(w) for w in _WEIGHTS)}) LIMIT ?"
+    params.append(limit)
+    return [Hit(*row) for row in conn.execute(sql, params).fetchall()]
+
+
+def main(args) -> int:
+    """aicode history search, args from history.main."""
+    import sqlite3
+
+    conn = connect(args.db)
+    try:
+        # Whatever the background indexer hasn't done yet, usually nothing.
+        index_pending(conn)
+        query = " ".join(args.query) if args.raw else fts_query(" ".join(args.query))
+        if not query:
+            print("Nothing to search for")
+            return 1
+        repo = args.repo
+        if repo is not None and Path(repo).is_dir():
+            repo = str(Path(repo).resolve())
+        try:
+            hits = search(
+                conn,
+                query,
+                repo=repo,
+                model=args.model,
+                since=args.since,
+                until=args.until,
+                limit=args.limit,
+            )
+        except sqlite3.OperationalError as err:
+            print(f"Bad query: {err}")
+            return 1
+    finally:
+        conn.close()
+    if args.json:
+        print(json.dumps([asdict(hit) for hit in hits], indent=2))
+        return 0
+    if not hits:
+        print("No matches")
+    for hit in hits:
+        model = hit.model or "?"
+        print(
+            f"{hit.started[:16]}  {os.path.basename(hit.repo)}  {model}  {hit.session} turn {hit.turn}"
+        )
+        print("    " + " ".join(hit.snippet.split()))
+        if hit.files:
+            print(f"    edited: {hit.files}")
+    return 0
@@ -0,0 +1,261 @@
+"""
+gitignore style ignore rules, compiled once and walked with os.scandir.
+
+A repo's rules come from .git/info/exclude, every .gitignore in the tree and
+optionally files like .aiderignore, with git's semantics: the last matching
+rule wins, "!" re-includes, a trailing "/" matches only directories, a
+pattern with a "/" in it is anchored to its file's directory, and nothing
+below an ignored directory can be re-included. Consecutive rules of the same
+kind are merged into a single regex, so a match costs a few regex searches
+however many lines the files have.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+@dataclass
+class _Block:
+    negated: bool
+    dir_only: bool
+    regex: "re.Pattern[str]"
+
+
+def _translate(glob: str) -> str:
+    """The regex for a gitignore glob, without anchors."""
+    out = []
+    i = 0
+    n = len(glob)
+    while i < n:
+        c = glob[i]
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("**", i) and i + 2 == n:
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = glob.find(
+                "]",
+                (
+                    i + 2
+                    if glob.startswith("[!", i) or glob.startswith("[^", i)
+                    else i + 1
+                ),
+            )
+            if end < 0:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = glob[i + 1 : end]
+            if body[:1] in ("!", "^"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+def _parse_line(line: str) -> tuple[bool, bool, str] | None:
+    """(negated, dir_only, regex) for a line, None for blanks and comments."""
+    line = line.rstrip("\n").rstrip("\r")
+    # Trailing spaces are ignored unless escaped.
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\#") or line.startswith("\\!"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    line = line.lstrip("/")
+    body = _translate(line)
+    regex = f"^{body}$" if anchored else f"^(?:.*/)?{body}$"
+    return negated, dir_only, regex
+
+
+def compile_rules(lines: Iterable[str]) -> list[_Block]:
+    blocks: list[_Block] = []
+    pending: list[str] = []
+    kind: tuple[bool, bool] | None = None
+
+    def _flush() -> None:
+        if pending and kind is not None:
+            blocks.append(
+                _Block(
+                    kind[0], kind[1], re.compile("|".join(f"(?:{r})" for r in pending))
+                )
+            )
+
+    for line in lines:
+        parsed = _parse_line(line)
+        if parsed is None:
+            continue
+        negated, dir_only, regex = parsed
+        if kind != (negated, dir_only):
+            _flush()
+            pending = []
+            kind = (negated, dir_only)
+        pending.append(regex)
+    _flush()
+    return blocks
+
+
+def _match(blocks: list[_Block], rel: str, is_dir: bool) -> bool | None:
+    """True for ignored, False for re-included, None when no rule matches."""
+    for block in reversed(blocks):
+        if block.dir_only and not is_dir:
+            continue
+        if block.regex.match(rel):
+            return not block.negated
+    return None
+
+
+def _read_lines(path: Path) -> list[str]:
+    try:
+        return path.read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return []
+
+
+class IgnoreRules:
+    """The ignore rules of a tree rooted at root. Paths are relative to the
+    root, with "/" separators."""
+
+    def __init__(
+        self,
+        root: Path,
+        extra_files: Iterable[str] = (),
+        extra_patterns: Iterable[str] = (),
+        per_dir_file: str = ".gitignore",
+    ) -> None:
+        self.root = root
+        self.per_dir_file = per_dir_file
+        lines = [".git"] + list(extra_patterns)
+        lines += _read_lines(root / ".git" / "info" / "exclude")
+        # They apply to the whole tree, under the per-directory files.
+        self._root_blocks = compile_rules(lines)
+        # Separate rule sets like .aiderignore, anything one of them ignores
+        # is ignored whatever the git rules say.
+        self._extra_blocks = [
+            compile_rules(_read_lines(root / name)) for name in extra_files
+        ]
+        # Directory -> the blocks of its per-directory file, loaded on demand.
+        self._dir_blocks: dict[str, list[_Block]] = {}
+        self._dir_ignored: dict[str, bool] = {}
+
+    def add_extra(self, lines: Iterable[str]) -> None:
+        """Adds a rule set like extra_files, from lines."""
+        self._extra_blocks.append(compile_rules(lines))
+        self._dir_ignored.clear()
+
+    def _blocks_of(self, rel_dir: str) -> list[_Block]:
+        blocks = self._dir_blocks.get(rel_dir)
+        if blocks is None:
+            path = (
+                self.root / rel_dir / self.per_dir_file
+                if rel_dir
+                else self.root / self.per_dir_file
+            )
+            blocks = compile_rules(_read_lines(path))
+            self._dir_blocks[rel_dir] = blocks
+        return blocks
+
+    def forget(self, rel_dir: str = "") -> None:
+        """Drops the cached rules at and below rel_dir, after an ignore file
+        there changed."""
+        prefix = rel_dir + "/" if rel_dir else ""
+        for cache in (self._dir_blocks, self._dir_ignored):
+            for key in [k for k in cache if k == rel_dir or k.startswith(prefix)]:
+                del cache[key]
+
+    def _own_match(self, rel: str, is_dir: bool) -> bool:
+        """Whether rel itself matches, not looking at its parents."""
+        if any(_match(blocks, rel, is_dir) for blocks in self._extra_blocks):
+            return True
+        result = _match(self._root_blocks, rel, is_dir)
+        # Deeper .gitignore files override shallower ones.
+        parts = rel.split("/")
+        for depth in range(len(parts)):
+            base = "/".join(parts[:depth])
+            blocks = self._blocks_of(base)
+            if blocks:
+                matched = _match(blocks, "/".join(parts[depth:]), is_dir)
+                if matched is not None:
+                    result = matched
+        return bool(result)
+
+    def _dir_is_ignored(self, rel_dir: str) -> bool:
+        ignored = self._dir_ignored.get(rel_dir)
+        if ignored is None:
+            parent = rel_dir.rpartition("/")[0]
+            ignored = (
+                bool(parent) and self._dir_is_ignored(parent)
+            ) or self._own_match(rel_dir, True)
+            self._dir_ignored[rel_dir] = ignored
+        return ignored
+
+    def is_ignored(self, rel: str, is_dir: bool = False) -> bool:
+        if is_dir:
+            return self._dir_is_ignored(rel)
+        parent = rel.rpartition("/")[0]
+        if parent and self._dir_is_ignored(parent):
+            return True
+        return self._own_match(rel, False)
+
+    def walk_dirs(self, rel_dir: str = "") -> Iterator[tuple[str, list[os.DirEntry]]]:
+        """Yields each directory that isn't ignored with its entries that
+        aren't, top down."""
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            path = self.root / current if current else self.root
+            entries: list[os.DirEntry] = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        rel = f"{current}/{entry.name}" if current else entry.name
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if self.is_ignored(rel, is_dir):
+                            continue
+                        entries.append(entry)
+                        if is_dir:
+                            stack.append(rel)
+            except OSError:
+                continue
+            yield current, entries
+
+    def walk_files(self) -> Iterator[tuple[str, os.DirEntry]]:
+        """Yields (relative path, entry) for every file that isn't ignored."""
+        for current, entries in self.walk_dirs():
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        yield (
+                            f"{current}/{entry.name}" if current else entry.name
+                        ), entry
+                except OSError:
+                    continue
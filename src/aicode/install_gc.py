@@ -0,0 +1,231 @@
+"""
+Garbage collection for stale aider install generations.
+
+Every upgrade builds a new generation under the install root and each one is
+hundreds of MB. collect_garbage keeps the newest `keep` installed generations
+plus the active one, deletes the rest and, with dedup=True, hardlinks
+identical files across the generations that remain.
+
+A generation in use by a running session is never deleted. Launches take a
+lease on their generation, a file named after their pid in <generation>/leases.
+The pid survives the exec into aider, so the lease stays valid for the whole
+session, and leases of dead pids are ignored and pruned.
+"""
+
+import hashlib
+import os
+import shutil
+import time
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from aicode.install_manifest import (
+    STATUS_INSTALLED,
+    STATUS_INSTALLING,
+    InstallManifest,
+    load_manifest,
+    update_manifest,
+)
+from aicode.util import pid_alive
+
+DEFAULT_KEEP = 2
+
+_LEASES_DIR = "leases"
+
+# An install that hasn't finished after this long is assumed to be dead.
+_STALE_INSTALL_SECONDS = 24 * 60 * 60
+
+_HASH_CHUNK = 1024 * 1024
+
+
+@dataclass
+class GcReport:
+    deleted: list[str] = field(default_factory=list)
+    skipped_in_use: list[str] = field(default_factory=list)
+    deleted_bytes: int = 0
+    deduped_files: int = 0
+    deduped_bytes: int = 0
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.deleted_bytes + self.deduped_bytes
+
+    def summary(self) -> str:
+        lines = []
+        if self.deleted:
+            lines.append(f"Deleted generations: {', '.join(self.deleted)}")
+        if self.skipped_in_use:
+            lines.append(f"Kept, in use: {', '.join(self.skipped_in_use)}")
+        lines.append(f"Deleted {_format_bytes(self.deleted_bytes)}")
+        lines.append(
+            f"Deduplicated {self.deduped_files} files, {_format_bytes(self.deduped_bytes)}"
+        )
+        lines.append(f"Reclaimed {_format_bytes(self.reclaimed_bytes)} in total")
+        return "\n".join(lines)
+
+
+def _format_bytes(size: int) -> str:
+    value = float(size)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+
+def write_lease(generation_path: Path, pid: int | None = None) -> None:
+    """Marks the generation as used by pid, the current process by default."""
+    leases = generation_path / _LEASES_DIR
+    try:
+        leases.mkdir(exist_ok=True)
+        (leases / str(pid or os.getpid())).touch()
+    except OSError as err:
+        warnings.warn(f"Failed to lease {generation_path}: {err}")
+
+
+def active_leases(generation_path: Path) -> list[int]:
+    """Returns the pids using the generation, pruning the dead ones."""
+    leases = generation_path / _LEASES_DIR
+    try:
+        entries = list(leases.iterdir())
+    except OSError:
+        return []
+    out: list[int] = []
+    for entry in entries:
+        if entry.name.isdigit() and pid_alive(int(entry.name)):
+            out.append(int(entry.name))
+            continue
+        try:
+            entry.unlink()
+        except OSError:
+            pass
+    return out
+
+
+def _select_victims(manifest: InstallManifest, keep: int) -> list[str]:
+    """Returns the generations that the retention policy drops."""
+    now = time.time()
+    installed = sorted(
+        (g for g in manifest.generations.values() if g.status == STATUS_INSTALLED),
+        key=lambda g: int(g.name),
+        reverse=True,
+    )
+    retained = {g.name for g in installed[:keep]}
+    if manifest.active is not None:
+        retained.add(manifest.active)
+    victims: list[str] = []
+    for gen in manifest.generations.values():
+        if gen.name in retained:
+            continue
+        if (
+            gen.status == STATUS_INSTALLING
+            and now - gen.created < _STALE_INSTALL_SECONDS
+        ):
+            continue  # probably still being built by another process
+        victims.append(gen.name)
+    return sorted(victims, key=int)
+
+
+def _delete_generation(root: Path, name: str) -> int:
+    """Moves the generation out of the way, then deletes it. Returns bytes freed."""
+    from aicode.install_manifest import dir_size
+
+    path = root / name
+    if not path.exists():
+        return 0
+    size = dir_size(path)
+    # The rename is atomic, so nobody ever sees a half deleted generation.
+    trash = root / f".trash-{name}-{os.getpid()}"
+    os.replace(path, trash)
+    shutil.rmtree(trash, ignore_errors=True)
+    return size
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dedup_files(paths: list[Path]) -> tuple[int, int]:
+    """Hardlinks identical files under paths together. Returns (files, bytes)."""
+    by_size: dict[tuple[int, int, int], list[os.stat_result]] = {}
+    names: dict[tuple[int, int], str] = {}
+    for base in paths:
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                full = os.path.join(dirpath, filename)
+                try:
+                    st = os.lstat(full)
+                except OSError:
+                    continue
+                if not os.path.isfile(full) or os.path.islink(full) or st.st_size == 0:
+                    continue
+                if (st.st_dev, st.st_ino) in names:
+                    continue  # already a hardlink of something we've seen
+                names[(st.st_dev, st.st_ino)] = full
+                key = (st.st_dev, st.st_size, st.st_mode)
+                by_size.setdefault(key, []).append(st)
+    files = 0
+    saved = 0
+    for candidates in by_size.values():
+        if len(candidates) < 2:
+            continue
+        by_hash: dict[str, str] = {}
+        for st in candidates:
+            full = names[(st.st_dev, st.st_ino)]
+            try:
+                digest = _hash_file(full)
+            except OSError:
+                continue
+            canonical = by_hash.setdefault(digest, full)
+            if canonical == full:
+                continue
+            tmp = f"{full}.aicode-dedup"
+            try:
+                os.link(canonical, tmp)
+                os.replace(tmp, full)
+            except OSError:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                continue
+            files += 1
+            saved += st.st_size
+    return files, saved
+
+
+def collect_garbage(
+    root: Path, keep: int = DEFAULT_KEEP, dedup: bool = True
+) -> GcReport:
+    report = GcReport()
+    if not root.exists():
+        return report
+    manifest = load_manifest(root)
+    deleted: list[str] = []
+    for name in _select_victims(manifest, keep):
+        if active_leases(root / name):
+            report.skipped_in_use.append(name)
+            continue
+        try:
+            report.deleted_bytes += _delete_generation(root, name)
+        except OSError as err:
+            warnings.warn(f"Failed to delete generation {name}: {err}")
+            continue
+        deleted.append(name)
+    report.deleted = deleted
+
+    def _drop(manifest: InstallManifest) -> None:
+        for name in deleted:
+            manifest.generations.pop(name, None)
+
+    if deleted:
+        manifest = update_manifest(root, _drop)
+    if dedup:
+        remaining = [
+            root / name for name in manifest.generations if (root / name).exists()
+        ]
+        report.deduped_files, report.deduped_bytes = dedup_files(remaining)
+    return report
@@ -0,0 +1,134 @@
+"""
+Single-flight lock for aider installs.
+
+Installing builds a multi-hundred-MB venv. Without a lock, two terminals
+starting aicode on a fresh machine, or a batch job starting N workers, each
+built a generation of their own. Now every install into a root holds
+<root>/.install.lock, a FileLock that the OS drops when its holder dies. The
+holder writes <root>/.install.owner with its pid and the generation it
+builds; the others wait, saying whom for, and then look again, usually to
+find the install they waited for and use it.
+
+An owner file that the next holder finds is what a crashed install left
+behind. The generation it was building is marked failed, so that --gc
+removes it, and the install starts over.
+"""
+
+import json
+import os
+import socket
+import time
+import warnings
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator
+
+from aicode.util import pid_alive
+
+LOCK_FILE = ".install.lock"
+OWNER_FILE = ".install.owner"
+
+# A fresh install takes a few minutes, a slow network can make it much more.
+DEFAULT_TIMEOUT = 30 * 60  # seconds
+
+# How often a waiting process says it is still waiting.
+_PROGRESS_SECONDS = 15.0
+
+
+@dataclass
+class InstallOwner:
+    pid: int
+    host: str
+    started: float
+    generation: str | None = None
+
+    def is_dead(self) -> bool:
+        """True if the owner is known to be gone, only knowable on its host."""
+        return self.host == socket.gethostname() and not pid_alive(self.pid)
+
+    def describe(self) -> str:
+        where = "" if self.host == socket.gethostname() else f" on {self.host}"
+        return f"pid {self.pid}{where}"
+
+
+def read_owner(root: Path) -> InstallOwner | None:
+    try:
+        return InstallOwner(
+            **json.loads((root / OWNER_FILE).read_text(encoding="utf-8"))
+        )
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def write_owner(root: Path, owner: InstallOwner) -> None:
+    tmp = root / f"{OWNER_FILE}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(asdict(owner)), encoding="utf-8")
+    os.replace(tmp, root / OWNER_FILE)
+
+
+def _reclaim(root: Path, stale: InstallOwner) -> None:
+    from aicode.aider_control import mark_generation_failed
+    from aicode.install_manifest import STATUS_INSTALLING, load_manifest
+
+    print(
+        f"A previous aider install ({stale.describe()}) did not finish, starting over."
+    )
+    generation = load_manifest(root).generations.get(stale.generation or "")
+    if generation is not None and generation.status == STATUS_INSTALLING:
+        mark_generation_failed(root, generation.name)
+
+
+@contextmanager
+def install_lock(
+    root: Path, timeout: float = DEFAULT_TIMEOUT
+) -> Iterator[InstallOwner]:
+    """Holds the install lock of root. Set generation on the owner it yields
+    and call write_owner once the install has a generation."""
+    from filelock import FileLock, Timeout
+
+    root.mkdir(parents=True, exist_ok=True)
+    lock = FileLock(str(root / LOCK_FILE))
+    start = time.monotonic()
+    while True:
+        waited = time.monotonic() - start
+        try:
+            lock.acquire(timeout=max(0.0, min(_PROGRESS_SECONDS, timeout - waited)))
+            break
+        except Timeout:
+            waited = time.monotonic() - start
+            owner = read_owner(root)
+            who = owner.describe() if owner is not None else "another process"
+            if waited >= timeout:
+                raise TimeoutError(
+                    f"Gave up after {waited:.0f}s waiting for the aider install by {who}"
+                ) from None
+            if owner is not None and owner.is_dead():
+                # A dead process can't hold a lock, unless the file system
+                # doesn't do locking. Keep waiting, but say so.
+                warnings.warn(
+                    f"The install lock is held although {who} is gone, is {root} on a network drive?"
+                )
+            print(
+                f"Waiting for {who} to finish installing aider ({waited:.0f}s)...",
+                flush=True,
+            )
+    try:
+        stale = read_owner(root)
+        if stale is not None:
+            _reclaim(root, stale)
+        owner = InstallOwner(
+            pid=os.getpid(), host=socket.gethostname(), started=time.time()
+        )
+        write_owner(root, owner)
+        try:
+            yield owner
+        finally:
+            # Failures that get this far are handled by the installer, only
+            # a crash leaves the owner file.
+            try:
+                (root / OWNER_FILE).unlink()
+            except FileNotFoundError:
+                pass
+    finally:
+        lock.release()
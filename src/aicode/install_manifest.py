@@ -0,0 +1,211 @@
+"""
+Manifest of the aider install generations under an install root.
+
+Every aider_install builds a new numbered generation directory. Instead of
+listing the root and parsing directory names on every lookup, the generations
+are recorded in <root>/manifest.json along with their status, versions, size,
+creation time and which one is active. The file is replaced atomically and
+cached in-process by mtime, so a lookup is at most one stat and one small
+read. A missing or corrupt manifest is rebuilt from a directory scan.
+"""
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+MANIFEST_FILE = "manifest.json"
+_MANIFEST_VERSION = 1
+
+STATUS_INSTALLING = "installing"
+STATUS_INSTALLED = "installed"
+STATUS_FAILED = "failed"
+
+# Written by aider_control when a generation finished installing.
+_BREADCRUMB = "installed"
+
+
+@dataclass
+class Generation:
+    name: str
+    status: str
+    created: float
+    aider_version: Optional[str] = None
+    python_version: Optional[str] = None
+    size: Optional[int] = None
+
+
+@dataclass
+class InstallManifest:
+    active: Optional[str] = None
+    generations: dict[str, Generation] = field(default_factory=dict)
+
+    def next_name(self) -> str:
+        names = [int(name) for name in self.generations if name.isdigit()]
+        return str(max(names) + 1) if names else "0"
+
+    def to_json_data(self) -> dict:
+        return {
+            "version": _MANIFEST_VERSION,
+            "active": self.active,
+            "generations": {k: asdict(v) for k, v in self.generations.items()},
+        }
+
+    @classmethod
+    def from_json(cls, json_data: dict) -> "InstallManifest":
+        if json_data.get("version") != _MANIFEST_VERSION:
+            raise ValueError(f"Unknown manifest version {json_data.get('version')}")
+        generations = {
+            str(name): Generation(**gen)
+            for name, gen in json_data["generations"].items()
+        }
+        active = json_data["active"]
+        if active is not None and active not in generations:
+            raise ValueError(f"Active generation {active} is not in the manifest")
+        return InstallManifest(active=active, generations=generations)
+
+
+# root -> ((inode, mtime_ns, size), manifest)
+_cache: dict[str, tuple[tuple[int, int, int], InstallManifest]] = {}
+
+
+def get_site_packages(venv_path: Path) -> Path | None:
+    lib = venv_path / "Lib" if os.name == "nt" else venv_path / "lib"
+    if os.name == "nt":
+        return lib / "site-packages"
+    for child in lib.glob("python*"):
+        return child / "site-packages"
+    return None
+
+
+def read_aider_version(venv_path: Path) -> str | None:
+    """Reads the installed aider-chat version from its dist-info directory."""
+    site_packages = get_site_packages(venv_path)
+    if site_packages is None:
+        return None
+    for dist_info in site_packages.glob("aider_chat-*.dist-info"):
+        return dist_info.name[len("aider_chat-") : -len(".dist-info")]
+    return None
+
+
+def read_python_version(venv_path: Path) -> str | None:
+    try:
+        lines = (venv_path / "pyvenv.cfg").read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        key, _, value = line.partition("=")
+        if key.strip() in ("version_info", "version"):
+            return value.strip()
+    return None
+
+
+def dir_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def describe_generation(path: Path, status: str) -> Generation:
+    """Collects the manifest entry of a generation directory."""
+    from aicode.aider_control import get_venv_path
+
+    venv_path = get_venv_path(path)
+    try:
+        created = path.stat().st_mtime
+    except OSError:
+        created = time.time()
+    return Generation(
+        name=path.name,
+        status=status,
+        created=created,
+        aider_version=read_aider_version(venv_path),
+        python_version=read_python_version(venv_path),
+        size=dir_size(path),
+    )
+
+
+def rebuild_manifest(root: Path) -> InstallManifest:
+    """Recovers the manifest by scanning the generation directories."""
+    manifest = InstallManifest()
+    if not root.exists():
+        return manifest
+    names = sorted(
+        (p.name for p in root.iterdir() if p.is_dir() and p.name.isdigit()), key=int
+    )
+    for name in names:
+        installed = (root / name / _BREADCRUMB).exists()
+        status = STATUS_INSTALLED if installed else STATUS_FAILED
+        manifest.generations[name] = describe_generation(root / name, status)
+        if installed:
+            manifest.active = name
+    return manifest
+
+
+def _stat_key(path: Path) -> tuple[int, int, int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def save_manifest(root: Path, manifest: InstallManifest) -> None:
+    root.mkdir(parents=True, exist_ok=True)
+    manifest_path = root / MANIFEST_FILE
+    tmp_path = root / f".{MANIFEST_FILE}.{os.getpid()}.tmp"
+    tmp_path.write_text(json.dumps(manifest.to_json_data(), indent=2), encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+    key = _stat_key(manifest_path)
+    if key is not None:
+        _cache[str(root)] = (key, manifest)
+
+
+def load_manifest(root: Path) -> InstallManifest:
+    """Returns the manifest of root, rebuilding it when missing or corrupt."""
+    manifest_path = root / MANIFEST_FILE
+    key = _stat_key(manifest_path)
+    if key is not None:
+        cached = _cache.get(str(root))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        try:
+            data = json.loads(manifest_path.read_text(encoding="utf-8"))
+            manifest = InstallManifest.from_json(data)
+            _cache[str(root)] = (key, manifest)
+            return manifest
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # corrupt, rebuild below
+    manifest = rebuild_manifest(root)
+    if root.exists():
+        try:
+            save_manifest(root, manifest)
+        except OSError:
+            pass  # read-only install root, the scan result is still valid
+    return manifest
+
+
+def update_manifest(
+    root: Path, update: Callable[[InstallManifest], None]
+) -> InstallManifest:
+    """Read-modify-write of the manifest under an inter-process lock."""
+    from filelock import FileLock
+
+    root.mkdir(parents=True, exist_ok=True)
+    with FileLock(str(root / f".{MANIFEST_FILE}.lock")):
+        _cache.pop(str(root), None)
+        manifest = load_manifest(root)
+        update(manifest)
+        save_manifest(root, manifest)
+    return manifest
+
+
+def is_install_root(path: Path) -> bool:
+    return (path / MANIFEST_FILE).exists()
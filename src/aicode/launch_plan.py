@@ -0,0 +1,186 @@
+"""
+Persisted launch plans.
+
+A launch plan is the command list and environment that build_cmd_list_or_die
+resolves. It is keyed on every input the preflight looks at, so an unchanged
+launch can skip the config decryption, install checks and ignore file checks
+and go straight to spawning aider. Any change to an input changes the key,
+which invalidates the plan.
+
+Plans hold the resolved API keys. Once secrets.enc changes, no plan made
+with the old config can match again, so the next plan that is saved drops
+all of them rather than leaving old keys behind in every launch directory.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import warnings
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from aicode.args import Args
+from aicode.paths import AIDER_INSTALL_PATH, CONFIG_STORAGE_PATH, LAUNCH_PLAN_PATH
+
+# Bump this when the plan format or the preflight logic changes.
+_PLAN_VERSION = 1
+
+# The plan holds resolved API keys. It gets the same obfuscation level as the
+# semi-secret config store, minus the slow key derivation.
+_PLAN_KEY = b"aicode_launch_plan"
+
+# The secrets.enc the stored plans were made with, see _drop_superseded_plans.
+_CONFIG_STAMP = "config.stat"
+
+# Files in the repo root that the preflight reads.
+_INSPECTED_FILES = [".gitignore", ".aiderignore", "lint"]
+
+
+@dataclass
+class LaunchPlan:
+    key: str
+    git_root: Optional[str]
+    cmd_list: list[str]
+    env: dict[str, str]
+    # Where "--gui" goes in cmd_list, the interface choice is asked every launch.
+    gui_index: int
+    update_msg: Optional[str] = None
+
+    def to_json_data(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_json(cls, json_data: dict) -> "LaunchPlan":
+        return LaunchPlan(
+            key=str(json_data["key"]),
+            git_root=json_data["git_root"],
+            cmd_list=[str(c) for c in json_data["cmd_list"]],
+            env={str(k): str(v) for k, v in json_data["env"].items()},
+            gui_index=int(json_data["gui_index"]),
+            update_msg=json_data.get("update_msg"),
+        )
+
+
+def _is_cacheable(args: Args) -> bool:
+    """Launches that change state or exit early never use a plan."""
+    return not (
+        args.open_aider_path
+        or args.purge
+        or args.upgrade
+        or args.set_key
+        or args.set_anthropic_key
+        or args.set_gemini_key
+    )
+
+
+def _stat_token(path: Path) -> list[int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _find_git_root(cwd: Path) -> Path | None:
+    from aicode.util import _find_path_to_git_directory
+
+    try:
+        return _find_path_to_git_directory(cwd)
+    except FileNotFoundError:
+        return None
+
+
+def compute_launch_key(args: Args, cwd: Path | None = None) -> str | None:
+    """Returns the key for this launch, or None if it can't be cached."""
+    from aicode.aider_control import _get_highest_version_path
+
+    if not _is_cacheable(args):
+        return None
+    if not AIDER_INSTALL_PATH.exists():
+        return None
+    cwd = (cwd or Path.cwd()).absolute()
+    git_root = _find_git_root(cwd)
+    root = git_root or cwd
+    install_path = _get_highest_version_path(AIDER_INSTALL_PATH)
+    args_data = asdict(args)
+    # Tracing a launch must not change which plan it uses.
+    args_data.pop("trace_startup", None)
+    inputs = {
+        "version": _PLAN_VERSION,
+        "cwd": str(cwd),
+        "git_root": str(git_root) if git_root else None,
+        "args": args_data,
+        "config": _stat_token(CONFIG_STORAGE_PATH / "secrets.enc"),
+        "install": str(install_path),
+        "installed": _stat_token(install_path / "installed"),
+        "files": {name: _stat_token(root / name) for name in _INSPECTED_FILES},
+        "message_file": (
+            _stat_token(root / args.message_file) if args.message_file else None
+        ),
+    }
+    blob = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _get_plan_path(cwd: Path) -> Path:
+    # One plan per launch directory keeps the cache bounded.
+    name = hashlib.sha256(str(cwd.absolute()).encode("utf-8")).hexdigest()[:16]
+    return LAUNCH_PLAN_PATH / f"{name}.plan"
+
+
+def _fernet():
+    from cryptography.fernet import Fernet
+
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(_PLAN_KEY).digest()))
+
+
+def load_launch_plan(key: str, cwd: Path | None = None) -> LaunchPlan | None:
+    """Returns the stored plan if it matches the key, else None."""
+    plan_path = _get_plan_path(cwd or Path.cwd())
+    try:
+        encrypted = plan_path.read_bytes()
+    except OSError:
+        return None
+    try:
+        data = json.loads(_fernet().decrypt(encrypted))
+        plan = LaunchPlan.from_json(data)
+    except Exception:  # pylint: disable=broad-except
+        # Corrupt or from an older format, it will be overwritten.
+        return None
+    if plan.key != key:
+        return None
+    return plan
+
+
+def _drop_superseded_plans() -> None:
+    """Removes the plans made with another secrets.enc than the current."""
+    token = json.dumps(_stat_token(CONFIG_STORAGE_PATH / "secrets.enc"))
+    stamp = LAUNCH_PLAN_PATH / _CONFIG_STAMP
+    try:
+        if stamp.read_text(encoding="utf-8") == token:
+            return
+    except OSError:
+        pass
+    for path in LAUNCH_PLAN_PATH.glob("*.plan"):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+    stamp.write_text(token, encoding="utf-8")
+
+
+def save_launch_plan(plan: LaunchPlan, cwd: Path | None = None) -> None:
+    plan_path = _get_plan_path(cwd or Path.cwd())
+    try:
+        plan_path.parent.mkdir(parents=True, exist_ok=True)
+        _drop_superseded_plans()
+        encrypted = _fernet().encrypt(json.dumps(plan.to_json_data()).encode("utf-8"))
+        tmp_path = plan_path.with_suffix(f".{os.getpid()}.tmp")
+        fd = os.open(str(tmp_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as file:
+            file.write(encrypted)
+        os.replace(tmp_path, plan_path)
+    except OSError as err:
+        warnings.warn(f"Failed to save launch plan: {err}")
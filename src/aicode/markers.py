@@ -0,0 +1,662 @@
+"""
+Index and watcher for "AI" comments, aider's watch mode done from aicode.
+
+aider's --watch scans and watches the whole repo itself, and every save of a
+file with an AI! or AI? comment starts a turn, so a burst of saves fires
+several. With AICODE_MARKER_WATCH=1 set, aicode hosts aider in a
+pseudo-terminal on linux and runs the watcher instead of --watch:
+
+- The ignore rules (.gitignore files, .aiderignore and aider's own list) are
+  compiled once, see ignore_rules.py.
+- A persistent index of the files with AI comments is kept per repo, only
+  files whose mtime or size changed are read again.
+- Changes come from inotify. Marker edits within DEFAULT_DEBOUNCE seconds of
+  each other are coalesced into a single request, which is typed into
+  aider's prompt: an /add of the files and one message about all of the
+  comments. It waits until aider has sat at its input prompt for
+  _PROMPT_SETTLE seconds, not busy with a turn or asking a question, and the
+  user has no half-typed line.
+
+Hosting the session costs the direct exec of aider, so aider's own --watch
+stays the default.
+
+    aicode markers [--refresh] [--all] [--json]
+
+lists the pending AI! and AI? comments from the index without scanning.
+"""
+
+import argparse
+import errno
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from stat import S_ISREG
+from typing import Callable, Iterable
+
+from aicode.ignore_rules import IgnoreRules
+from aicode.paths import MARKERS_PATH
+from aicode.session_runner import OutputTap
+from aicode.util import strip_ansi
+
+DEFAULT_DEBOUNCE = 1.0  # seconds
+
+# How often the tree is walked instead when inotify runs out of watches.
+_POLL_INTERVAL = 5.0  # seconds
+
+_INDEX_VERSION = 1
+
+# aider skips bigger files too.
+_MAX_FILE_BYTES = 1024 * 1024
+
+# The same comments that aider's watch mode acts on, see aider/watch.py.
+_AI_COMMENT = re.compile(
+    r"(?:#|//|--|;+) *(ai\b.*|ai\b.*|.*\bai[?!]?) *$", re.IGNORECASE
+)
+_MAYBE_AI = re.compile(rb"[aA][iI]")
+
+# aider's input prompt, "> " after the edit format and "multi" if shown, see
+# aider/io.py. Questions like "Add file to the chat? (Y)es/(N)o [Yes]: " and
+# tool output that happens to end in "> " don't match.
+_EDIT_FORMATS = (
+    "architect|ask|code|context|help|diff|diff-fenced|editor-diff"
+    "|editor-diff-fenced|editor-whole|patch|udiff|udiff-simple|whole"
+)
+_INPUT_PROMPT = re.compile(rf"(?:(?:{_EDIT_FORMATS})(?: multi)?|multi)?> ")
+
+# How long aider's prompt has to stay the last output before a request is
+# typed, output that only passes through a prompt-like line moves on.
+_PROMPT_SETTLE = 0.3  # seconds
+
+# What aider's watcher always ignores.
+ALWAYS_IGNORE = [
+    ".aider*",
+    ".git",
+    "*~",
+    "*.bak",
+    "*.swp",
+    "*.swo",
+    "\\#*\\#",
+    ".#*",
+    "*.tmp",
+    "*.temp",
+    "*.orig",
+    "*.pyc",
+    "__pycache__/",
+    ".DS_Store",
+    "Thumbs.db",
+    "*.svg",
+    "*.pdf",
+    ".idea/",
+    ".vscode/",
+    "*.sublime-*",
+    ".project",
+    ".settings/",
+    "*.code-workspace",
+    ".env",
+    ".venv/",
+    "node_modules/",
+    "vendor/",
+    "*.log",
+    ".cache/",
+    ".pytest_cache/",
+    "coverage/",
+]
+
+
+@dataclass(frozen=True)
+class Marker:
+    path: str  # relative to the repo root, "/" separated
+    line: int
+    text: str
+    action: str | None  # "!" for a change, "?" for a question, None for context
+
+
+def marker_watch_enabled() -> bool:
+    return os.environ.get("AICODE_MARKER_WATCH", "") not in ("", "0")
+
+
+def watch_supported() -> bool:
+    return sys.platform.startswith("linux")
+
+
+def use_marker_watch(cmd_list: list[str]) -> bool:
+    """True if aicode should watch for AI comments instead of aider's
+    --watch, which needs the session in a pseudo-terminal of aicode's. Off
+    unless AICODE_MARKER_WATCH is set."""
+    from aicode.session_runner import _can_use_pty
+
+    return (
+        "--watch" in cmd_list
+        and marker_watch_enabled()
+        and watch_supported()
+        and _can_use_pty()
+    )
+
+
+def _action(comment: str) -> str | None:
+    comment = comment.lower().lstrip("/#-;").strip()
+    if comment.startswith("ai!") or comment.endswith("ai!"):
+        return "!"
+    if comment.startswith("ai?") or comment.endswith("ai?"):
+        return "?"
+    return None
+
+
+def scan_text(text: str) -> list[tuple[int, str, str | None]]:
+    """(line number, comment, action) of each AI comment in text."""
+    found = []
+    for number, line in enumerate(text.splitlines(), 1):
+        match = _AI_COMMENT.search(line)
+        if match:
+            comment = match.group(0).strip()
+            if comment:
+                found.append((number, comment, _action(comment)))
+    return found
+
+
+def scan_file(path: Path) -> list[tuple[int, str, str | None]]:
+    try:
+        if path.stat().st_size > _MAX_FILE_BYTES:
+            return []
+        data = path.read_bytes()
+    except OSError:
+        return []
+    # Most files have no "ai" at all, skip decoding them.
+    if not _MAYBE_AI.search(data):
+        return []
+    return scan_text(data.decode("utf-8", errors="replace"))
+
+
+def repo_root(path: Path) -> Path:
+    from aicode.util import _find_path_to_git_directory
+
+    try:
+        return _find_path_to_git_directory(path)
+    except FileNotFoundError:
+        return path
+
+
+def index_path_for(root: Path) -> Path:
+    name = hashlib.sha256(str(root).encode("utf-8")).hexdigest()[:16]
+    return MARKERS_PATH / f"{name}.json"
+
+
+def make_rules(root: Path) -> IgnoreRules:
+    return IgnoreRules(root, extra_files=[".aiderignore"], extra_patterns=ALWAYS_IGNORE)
+
+
+class MarkerIndex:
+    """rel path -> [mtime_ns, size, markers] for every file of the repo that
+    isn't ignored, kept in a JSON file between runs."""
+
+    def __init__(
+        self,
+        root: Path,
+        index_path: Path | None = None,
+        rules: IgnoreRules | None = None,
+    ) -> None:
+        self.root = root.resolve()
+        self.index_path = index_path or index_path_for(self.root)
+        self.rules = rules or make_rules(self.root)
+        self.files: dict[str, list] = {}
+        self.updated = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def exists(self) -> bool:
+        return self.updated > 0
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != _INDEX_VERSION or data.get("root") != str(self.root):
+            return
+        self.files = data.get("files", {})
+        self.updated = data.get("updated", 0.0)
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "version": _INDEX_VERSION,
+                "root": str(self.root),
+                "updated": self.updated,
+                "files": self.files,
+            }
+            self._dirty = False
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(
+            dir=self.index_path.parent, prefix=self.index_path.name, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.index_path)
+        except OSError as err:
+            warnings.warn(f"Failed to save the marker index {self.index_path}: {err}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _check(self, rel: str, st: os.stat_result | None) -> bool:
+        """Brings rel's entry up to date, True if its markers changed."""
+        old = self.files.get(rel)
+        if st is None:
+            if old is None:
+                return False
+            del self.files[rel]
+            self._dirty = True
+            return bool(old[2])
+        if old is not None and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+            return False
+        markers = [list(m) for m in scan_file(self.root / rel)]
+        self.files[rel] = [st.st_mtime_ns, st.st_size, markers]
+        self._dirty = True
+        return (old[2] if old is not None else []) != markers
+
+    def refresh(self) -> set[str]:
+        """Walks the repo, returns the files whose markers changed."""
+        changed: set[str] = set()
+        seen: set[str] = set()
+        with self._lock:
+            for rel, entry in self.rules.walk_files():
+                seen.add(rel)
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    st = None
+                if self._check(rel, st):
+                    changed.add(rel)
+            for rel in [rel for rel in self.files if rel not in seen]:
+                if self._check(rel, None):
+                    changed.add(rel)
+            self.updated = time.time()
+            self._dirty = True
+        return changed
+
+    def update(self, rels: Iterable[str]) -> set[str]:
+        """Checks just these files, returns those whose markers changed."""
+        changed: set[str] = set()
+        with self._lock:
+            for rel in rels:
+                st: os.stat_result | None = None
+                if not self.rules.is_ignored(rel):
+                    try:
+                        st = os.stat(self.root / rel, follow_symlinks=False)
+                    except OSError:
+                        pass
+                if st is not None and not S_ISREG(st.st_mode):
+                    st = None
+                if self._check(rel, st):
+                    changed.add(rel)
+            self.updated = time.time()
+            self._dirty = True
+        return changed
+
+    def markers(self, rels: Iterable[str] | None = None) -> list[Marker]:
+        with self._lock:
+            names = sorted(
+                self.files if rels is None else [r for r in rels if r in self.files]
+            )
+            return [
+                Marker(rel, line, text, action)
+                for rel in names
+                for line, text, action in self.files[rel][2]
+            ]
+
+
+# inotify(7)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (
+    _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+)
+
+
+class _Inotify:
+    def __init__(self) -> None:
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add(self, path: Path) -> int:
+        import ctypes
+
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(str(path)), ctypes.c_uint32(_WATCH_MASK)
+        )
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, f"inotify_add_watch {path}: {os.strerror(code)}")
+        return wd
+
+    def read(self) -> list[tuple[int, int, str]]:
+        """(watch, mask, name) of the pending events."""
+        import struct
+
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + 16 <= len(data):
+            wd, mask, _cookie, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16 : offset + 16 + length].rstrip(b"\0")
+            events.append((wd, mask, os.fsdecode(name)))
+            offset += 16 + length
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class MarkerWatcher:
+    """Keeps the index current from inotify and calls on_request with the
+    AI comments of each burst of edits that asks for something."""
+
+    def __init__(
+        self,
+        index: MarkerIndex,
+        on_request: Callable[[list[Marker]], None],
+        debounce: float = DEFAULT_DEBOUNCE,
+    ) -> None:
+        self.index = index
+        self.on_request = on_request
+        self.debounce = debounce
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="MarkerWatcher", daemon=True
+        )
+        self._inotify: _Inotify | None = None
+        self._dirs: dict[int, str] = {}
+        self._poll = False
+        # Comments that a request was made for already.
+        self._requested: set[Marker] = set()
+
+    def start(self) -> "MarkerWatcher":
+        self._thread.start()
+        return self
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _watch_tree(self, rel_dir: str) -> list[str]:
+        """Watches rel_dir and the directories below it, returns their files."""
+        assert self._inotify is not None
+        files = []
+        for current, entries in self.index.rules.walk_dirs(rel_dir):
+            if not self._poll:
+                try:
+                    wd = self._inotify.add(
+                        self.index.root / current if current else self.index.root
+                    )
+                    self._dirs[wd] = current
+                except OSError as err:
+                    if err.errno != errno.ENOSPC:
+                        warnings.warn(
+                            f"Not watching {current or '.'} for AI comments: {err}"
+                        )
+                    else:
+                        warnings.warn(
+                            "Out of inotify watches (fs.inotify.max_user_watches), "
+                            f"looking for AI comments every {_POLL_INTERVAL:.0f}s instead"
+                        )
+                        self._poll = True
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    files.append(f"{current}/{entry.name}" if current else entry.name)
+        return files
+
+    def _handle_events(
+        self, events: list[tuple[int, int, str]], pending: set[str]
+    ) -> bool:
+        """Adds the changed files to pending, True if everything has to be
+        rescanned."""
+        rescan = False
+        for wd, mask, name in events:
+            if mask & _IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            current = self._dirs.get(wd)
+            if current is None:
+                continue
+            if mask & (_IN_IGNORED | _IN_DELETE_SELF):
+                self._dirs.pop(wd, None)
+                continue
+            rel = f"{current}/{name}" if current else name
+            if name in (".gitignore", ".aiderignore"):
+                self.index.rules = make_rules(self.index.root)
+                rescan = True
+            elif mask & _IN_ISDIR:
+                if mask & (
+                    _IN_CREATE | _IN_MOVED_TO
+                ) and not self.index.rules.is_ignored(rel, True):
+                    pending.update(self._watch_tree(rel))
+                elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    prefix = rel + "/"
+                    pending.update(r for r in self.index.files if r.startswith(prefix))
+            else:
+                pending.add(rel)
+        return rescan
+
+    def _flush(self, pending: set[str], rescan: bool) -> None:
+        changed = self.index.refresh() if rescan else self.index.update(pending)
+        self.index.save()
+        markers = self.index.markers(changed)
+        new = [m for m in markers if m not in self._requested]
+        if any(m.action for m in new):
+            self._requested.update(markers)
+            self.on_request(markers)
+
+    def _run(self) -> None:
+        import select
+
+        try:
+            self._inotify = _Inotify()
+        except OSError as err:
+            warnings.warn(f"Watching for AI comments is not available: {err}")
+            self._ready.set()
+            return
+        try:
+            self._watch_tree("")
+            self.index.refresh()
+            self.index.save()
+            # What is already there was either handled or left for later.
+            self._requested.update(self.index.markers())
+            self._ready.set()
+            pending: set[str] = set()
+            rescan = False
+            last_event = 0.0
+            last_poll = time.monotonic()
+            while not self._stop.is_set():
+                if self._poll and time.monotonic() - last_poll >= _POLL_INTERVAL:
+                    rescan = True
+                    last_poll = time.monotonic()
+                timeout = (
+                    0.2
+                    if not (pending or rescan)
+                    else max(0.0, last_event + self.debounce - time.monotonic())
+                )
+                readable, _, _ = select.select(
+                    [self._inotify.fd], [], [], min(timeout, 0.2)
+                )
+                if readable:
+                    events = self._inotify.read()
+                    if events:
+                        rescan = self._handle_events(events, pending) or rescan
+                        last_event = time.monotonic()
+                    continue
+                if (
+                    pending or rescan
+                ) and time.monotonic() - last_event >= self.debounce:
+                    self._flush(pending, rescan)
+                    pending = set()
+                    rescan = False
+        except Exception as err:  # pylint: disable=broad-except
+            warnings.warn(f"Watching for AI comments failed: {err}")
+        finally:
+            self._ready.set()
+            self._inotify.close()
+
+
+def _quote(path: str) -> str:
+    return f'"{path}"' if " " in path else path
+
+
+def format_request(markers: list[Marker]) -> str:
+    """What gets typed into aider for the comments: an /add of their files
+    and one message, like aider's own watch mode sends."""
+    files = sorted({m.path for m in markers})
+    locations = ", ".join(f"{m.path}:{m.line}" for m in markers)
+    lines = ["/add " + " ".join(_quote(f) for f in files)]
+    if any(m.action == "!" for m in markers):
+        lines.append(
+            f'Follow the instructions in the "AI" comments at {locations}, '
+            'then remove all of those "AI" comments from the code.'
+        )
+    else:
+        lines.append(f'/ask Answer the questions in the "AI" comments at {locations}.')
+    return "".join(line + "\r" for line in lines)
+
+
+class MarkerRequests(OutputTap):
+    """Types the watcher's requests into the session, see input_fd."""
+
+    def __init__(self, root: Path, debounce: float = DEFAULT_DEBOUNCE) -> None:
+        self._read_fd, self._write_fd = os.pipe()
+        self.input_fd = self._read_fd
+        self._lock = threading.Lock()
+        self._line_dirty = False
+        # The output since its last line break, to spot aider's prompt.
+        self._output_line = ""
+        self._at_prompt = False
+        self._prompt_since = 0.0
+        # Bumped by every event, a settle timer from before is stale then.
+        self._events = 0
+        self._pending: list[Marker] | None = None
+        super().__init__()
+        self.watcher = MarkerWatcher(
+            MarkerIndex(root), self._on_request, debounce
+        ).start()
+
+    def _send(self) -> None:
+        """Called with the lock held."""
+        if self._pending is None or self._line_dirty or not self._at_prompt:
+            return
+        wait = self._prompt_since + _PROMPT_SETTLE - time.monotonic()
+        if wait > 0:
+            timer = threading.Timer(wait, self._settled, (self._events,))
+            timer.daemon = True
+            timer.start()
+            return
+        os.write(self._write_fd, format_request(self._pending).encode("utf-8"))
+        self._pending = None
+        self._at_prompt = False
+
+    def _settled(self, events: int) -> None:
+        with self._lock:
+            if events == self._events:
+                self._send()
+
+    def _on_request(self, markers: list[Marker]) -> None:
+        with self._lock:
+            self._pending = markers
+            self._send()
+
+    def handle(self, when: float, kind: str, data: bytes) -> None:
+        with self._lock:
+            self._events += 1
+            if kind == "o":
+                text = strip_ansi(data.decode("utf-8", errors="replace"))
+                line = re.split(r"[\r\n]", self._output_line + text)[-1]
+                self._output_line = line[-200:]
+                self._at_prompt = _INPUT_PROMPT.fullmatch(line) is not None
+                self._prompt_since = when
+            elif kind == "i":
+                # Anything after the last Enter is a line being typed.
+                tail = data.replace(b"\n", b"\r").rsplit(b"\r", 1)
+                if len(tail) == 2:
+                    self._line_dirty = bool(tail[1])
+                    # aider is busy with the line until it prompts again.
+                    self._at_prompt = False
+                elif data:
+                    self._line_dirty = True
+            self._send()
+
+    def finish(self) -> None:
+        self.watcher.stop()
+        os.close(self._write_fd)
+        os.close(self._read_fd)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="aicode markers", description="List the pending AI comments of the repo"
+    )
+    parser.add_argument(
+        "--refresh", action="store_true", help="Rescan the changed files first"
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="Also list AI comments without ! or ?"
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON")
+    parser.add_argument(
+        "--root", type=Path, help="Repo root, the current repo by default"
+    )
+    args = parser.parse_args(argv)
+    index = MarkerIndex(args.root or repo_root(Path.cwd()))
+    if args.refresh or not index.exists:
+        index.refresh()
+        index.save()
+    markers = [m for m in index.markers() if args.all or m.action]
+    if args.json:
+        print(json.dumps([asdict(m) for m in markers], indent=2))
+        return 0
+    for marker in markers:
+        print(f"{marker.path}:{marker.line}: {marker.text}")
+    if not markers:
+        print("No pending AI comments.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
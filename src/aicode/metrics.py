@@ -0,0 +1,400 @@
+"""
+Per-session performance and token metrics, kept in a local SQLite database.
+
+    aicode stats [--days N] [--json]
+
+With AICODE_METRICS=1 set, aicode hosts every session in its pty runner,
+see session_runner.py, and records its model, repo, duration and startup
+latency, the time from spawning aider to its first output. The turns come
+from aider's output:
+
+    Tokens: 2.4k sent, 1.1k cache write, 156 received. Cost: $0.01 message, $0.05 session.
+    Applied edit to src/app.py
+    Commit 1a2b3c4 fix: ...
+
+A turn starts when Enter is pressed, or at launch for --message-file runs.
+Its LLM time runs up to its last Tokens line and its edit time up to the last
+"Applied edit"/"Commit" line after that. Whatever output follows until the
+next turn is lint and test time. Enter that doesn't lead to a Tokens line,
+like a /add, only moves the start of the turn.
+
+The parsing and the database writes happen in the tap's thread, turns are
+written in batches of _FLUSH_TURNS or every _FLUSH_SECONDS, whichever comes
+first, and once more when the session ends. Metrics are opt-in because
+hosting costs the direct-exec launch, where aider owns the terminal and
+aicode sees none of its output.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+import uuid
+import warnings
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from aicode.paths import METRICS_DB_PATH
+from aicode.session_runner import OutputTap
+from aicode.util import strip_ansi
+
+if TYPE_CHECKING:
+    import sqlite3
+
+METRICS_ENV = "AICODE_METRICS"
+
+_FLUSH_TURNS = 10
+_FLUSH_SECONDS = 60.0
+
+# Output this soon after a keystroke is taken for its echo, which shouldn't
+# make the previous turn look longer.
+_ECHO_SECONDS = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    model TEXT,
+    repo TEXT,
+    duration REAL,
+    startup_seconds REAL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    started REAL NOT NULL,
+    llm_seconds REAL,
+    tokens_sent INTEGER NOT NULL,
+    tokens_received INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    edit_seconds REAL,
+    lint_test_seconds REAL,
+    PRIMARY KEY (session_id, turn)
+);
+CREATE INDEX IF NOT EXISTS turns_started ON turns (started);
+"""
+
+_TOKENS = re.compile(
+    r"\bTokens: (?P<sent>[\d.]+[kM]?) sent,.*?(?P<received>[\d.]+[kM]?) received\."
+)
+_COST = re.compile(r"Cost: \$(?P<cost>[\d.]+) message")
+_EDIT = re.compile(r"^(Applied edit to |Commit [0-9a-f]{7,} )")
+
+
+def metrics_enabled() -> bool:
+    return os.environ.get(METRICS_ENV, "") in ("1", "true", "yes")
+
+
+def parse_token_count(text: str) -> int:
+    """Undoes aider's format_tokens, "2.4k" -> 2400."""
+    scale = {"k": 1_000, "M": 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if scale != 1 else text
+    return round(float(number) * scale)
+
+
+def connect(db_path: Path = METRICS_DB_PATH) -> "sqlite3.Connection":
+    import sqlite3
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=5)
+    # WAL, so that concurrent sessions and "aicode stats" don't block
+    # each other. NORMAL is durable enough for metrics.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+@dataclass
+class Turn:
+    turn: int
+    start: float
+    llm_end: float | None = None
+    edit_end: float | None = None
+    last_output: float | None = None
+    tokens_sent: int = 0
+    tokens_received: int = 0
+    cost: float = 0.0
+
+
+class SessionMetrics(OutputTap):
+    """Follows a session and records it, see the module docstring."""
+
+    def __init__(
+        self, model: str | None, repo: Path, db_path: Path = METRICS_DB_PATH
+    ) -> None:
+        self.db_path = db_path
+        self.session_id = uuid.uuid4().hex
+        self.model = model
+        self.repo = str(repo)
+        self._wall_start = time.time()
+        self._start = time.monotonic()
+        self._first_output: float | None = None
+        self._last_input = 0.0
+        self._line = ""
+        self._turn = Turn(turn=0, start=self._start)
+        self._pending: list[Turn] = []
+        self._turn_count = 0
+        self._last_flush = self._start
+        self._conn: "sqlite3.Connection | None" = None
+        super().__init__()
+
+    def _wall(self, when: float) -> float:
+        return self._wall_start + (when - self._start)
+
+    def handle(self, when: float, kind: str, data: bytes) -> None:
+        if kind == "i":
+            self._last_input = when
+            if b"\r" in data or b"\n" in data:
+                self._on_enter(when)
+        elif kind == "o":
+            if self._first_output is None:
+                self._first_output = when
+            if when - self._last_input > _ECHO_SECONDS:
+                self._turn.last_output = when
+            text = strip_ansi(data.decode("utf-8", errors="replace"))
+            *lines, self._line = re.split(r"[\r\n]", self._line + text)
+            for line in lines:
+                self._on_line(when, line.strip())
+        if len(self._pending) >= _FLUSH_TURNS or (
+            self._pending and when - self._last_flush >= _FLUSH_SECONDS
+        ):
+            self._flush(when)
+
+    def _on_enter(self, when: float) -> None:
+        if self._turn.llm_end is None:
+            self._turn.start = when
+            return
+        self._pending.append(self._turn)
+        self._turn_count += 1
+        self._turn = Turn(turn=self._turn_count, start=when)
+
+    def _on_line(self, when: float, line: str) -> None:
+        match = _TOKENS.search(line)
+        if match:
+            self._turn.llm_end = when
+            self._turn.edit_end = None
+            self._turn.tokens_sent += parse_token_count(match["sent"])
+            self._turn.tokens_received += parse_token_count(match["received"])
+            cost = _COST.search(line)
+            if cost:
+                self._turn.cost += float(cost["cost"])
+        elif self._turn.llm_end is not None and _EDIT.search(line):
+            self._turn.edit_end = when
+
+    def _turn_row(self, turn: Turn) -> tuple:
+        assert turn.llm_end is not None
+        end = turn.last_output or turn.llm_end
+        edit_seconds = (
+            turn.edit_end - turn.llm_end if turn.edit_end is not None else None
+        )
+        lint_test_seconds = (
+            max(end - turn.edit_end, 0.0) if turn.edit_end is not None else None
+        )
+        return (
+            self.session_id,
+            turn.turn,
+            self._wall(turn.start),
+            turn.llm_end - turn.start,
+            turn.tokens_sent,
+            turn.tokens_received,
+            turn.cost,
+            edit_seconds,
+            lint_test_seconds,
+        )
+
+    def _flush(self, when: float) -> None:
+        startup = (
+            self._first_output - self._start if self._first_output is not None else None
+        )
+        try:
+            if self._conn is None:
+                self._conn = connect(self.db_path)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO sessions (id, started, model, repo, duration, startup_seconds) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET duration = excluded.duration, startup_seconds = excluded.startup_seconds",
+                    (
+                        self.session_id,
+                        self._wall_start,
+                        self.model,
+                        self.repo,
+                        when - self._start,
+                        startup,
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._turn_row(turn) for turn in self._pending],
+                )
+        except Exception as err:  # pylint: disable=broad-except
+            warnings.warn(f"Failed to record session metrics: {err}")
+        # Dropped on failure too, metrics aren't worth piling up for.
+        self._pending = []
+        self._last_flush = when
+
+    def finish(self) -> None:
+        if self._turn.llm_end is not None:
+            self._pending.append(self._turn)
+        self._flush(time.monotonic())
+        if self._conn is not None:
+            self._conn.close()
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile, None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+@dataclass
+class ModelStats:
+    model: str
+    turns: int
+    p50_llm_seconds: float | None
+    p95_llm_seconds: float | None
+    tokens_sent: int
+    tokens_received: int
+    cost: float
+
+
+@dataclass
+class DayStats:
+    day: str
+    sessions: int
+    tokens_sent: int
+    tokens_received: int
+    cost: float
+
+
+@dataclass
+class RepoStats:
+    repo: str
+    sessions: int
+    turns: int
+    avg_turn_seconds: float | None
+    avg_startup_seconds: float | None
+
+
+@dataclass
+class Stats:
+    models: list[ModelStats]
+    days: list[DayStats]
+    slowest_repos: list[RepoStats]
+
+
+def query_stats(conn: "sqlite3.Connection", since: float, top_repos: int = 10) -> Stats:
+    latencies: dict[str, list[float]] = {}
+    totals: dict[str, list] = {}
+    rows = conn.execute(
+        "SELECT COALESCE(s.model, '?'), t.llm_seconds, t.tokens_sent, t.tokens_received, t.cost "
+        "FROM turns t JOIN sessions s ON s.id = t.session_id WHERE t.started >= ?",
+        (since,),
+    )
+    for model, llm_seconds, sent, received, cost in rows:
+        latencies.setdefault(model, []).append(llm_seconds)
+        total = totals.setdefault(model, [0, 0, 0.0])
+        total[0] += sent
+        total[1] += received
+        total[2] += cost
+    models = [
+        ModelStats(
+            model=model,
+            turns=len(values),
+            p50_llm_seconds=percentile(values, 50),
+            p95_llm_seconds=percentile(values, 95),
+            tokens_sent=totals[model][0],
+            tokens_received=totals[model][1],
+            cost=totals[model][2],
+        )
+        for model, values in sorted(latencies.items())
+    ]
+    days = [
+        DayStats(*row)
+        for row in conn.execute(
+            "SELECT date(started, 'unixepoch', 'localtime') AS day, COUNT(DISTINCT session_id), "
+            "SUM(tokens_sent), SUM(tokens_received), SUM(cost) "
+            "FROM turns WHERE started >= ? GROUP BY day ORDER BY day",
+            (since,),
+        )
+    ]
+    slowest_repos = [
+        RepoStats(*row)
+        for row in conn.execute(
+            "SELECT s.repo, COUNT(DISTINCT s.id), COUNT(t.turn), "
+            "AVG(t.llm_seconds + COALESCE(t.edit_seconds, 0) + COALESCE(t.lint_test_seconds, 0)) AS avg_turn, "
+            "AVG(s.startup_seconds) "
+            "FROM sessions s LEFT JOIN turns t ON t.session_id = s.id "
+            "WHERE s.started >= ? GROUP BY s.repo ORDER BY avg_turn IS NULL, avg_turn DESC LIMIT ?",
+            (since, top_repos),
+        )
+    ]
+    return Stats(models=models, days=days, slowest_repos=slowest_repos)
+
+
+def _fmt(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds:.1f}s"
+
+
+def format_stats(stats: Stats) -> str:
+    lines = ["LLM latency per model:"]
+    for m in stats.models:
+        lines.append(
+            f"  {m.model}: {m.turns} turns, p50 {_fmt(m.p50_llm_seconds)}, p95 {_fmt(m.p95_llm_seconds)}, "
+            f"{m.tokens_sent} sent, {m.tokens_received} received, ${m.cost:.2f}"
+        )
+    lines.append("Tokens per day:")
+    for d in stats.days:
+        lines.append(
+            f"  {d.day}: {d.sessions} sessions, {d.tokens_sent} sent, {d.tokens_received} received, ${d.cost:.2f}"
+        )
+    lines.append("Slowest repos, by average turn time:")
+    for r in stats.slowest_repos:
+        lines.append(
+            f"  {r.repo}: {_fmt(r.avg_turn_seconds)} per turn over {r.turns} turns, startup {_fmt(r.avg_startup_seconds)}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="aicode stats",
+        description="Show where time and tokens went in past sessions",
+    )
+    parser.add_argument(
+        "--days",
+        type=float,
+        default=30,
+        help="Only look at the last N days (default: 30)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the stats as JSON")
+    parser.add_argument(
+        "--db", type=Path, default=METRICS_DB_PATH, help=argparse.SUPPRESS
+    )
+    args = parser.parse_args(argv)
+    if not args.db.exists():
+        print(f"No sessions recorded yet, the database will be at {args.db}")
+        if not metrics_enabled():
+            print(f"Set {METRICS_ENV}=1 to record them.")
+        return 0
+    conn = connect(args.db)
+    try:
+        stats = query_stats(conn, since=time.time() - args.days * 24 * 60 * 60)
+    finally:
+        conn.close()
+    if args.json:
+        print(json.dumps(asdict(stats), indent=2))
+    else:
+        print(format_stats(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,205 @@
+"""
+The config store, an encrypted JSON dict in STORAGE_PATH/secrets.enc.
+
+Many aicode processes share it, so the decrypted config is cached per
+process and re-read only when the file changes, and every write happens
+under an inter-process lock: re-read, merge the changed fields, write a
+temp file and rename it over the old one. A process that saves only ever
+overwrites the fields it changed, and readers never see a partial file.
+"""
+
+import contextlib
 import json
 import os
+import tempfile
+import threading
+import warnings
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator
 
 from appdirs import user_config_dir  # type: ignore
-from semi_secret import SecretStorage  # type: ignore
+
+from aicode.paths import CONFIG_STORAGE_PATH, CRED_AGENT_PATH
+
+if TYPE_CHECKING:
+    from semi_secret import SecretStorage  # type: ignore
 
 # Create SHA1 hash of the storage key
 STORAGE_KEY = "aicode_openai_config"
 SALT = "aicode_salt"  # We should use a consistent salt for the storage
 
-STORAGE_PATH = Path(user_config_dir("advanced-aicode", roaming=True))
+STORAGE_PATH = CONFIG_STORAGE_PATH
 
-# Initialize storage once
-_storage = SecretStorage(STORAGE_KEY, SALT, storage_path=STORAGE_PATH)
+# The file that SecretStorage reads and writes, and its "config" key.
+_SECRETS_FILE = "secrets.enc"
+_CONFIG_KEY = "config"
+_LOCK_FILE = "config.lock"
 
+# Initialized once, on first use. Key derivation is expensive so commands
+# that never touch the config should never pay for it.
+_storage: "SecretStorage | None" = None
+_storage_lock = threading.Lock()
 
-def _get_config_path_legacy() -> str:
-    env_path = user_config_dir("zcmds", "zcmds", roaming=True)
-    config_file = os.path.join(env_path, "openai.json")
-    return config_file
+# (path, (inode, mtime, size), decrypted contents) of the last read or write.
+_cache: tuple[Path, tuple[int, int, int], dict[str, Any]] | None = None
+_cache_lock = threading.Lock()
+# Per thread, the pending fields of batch_updates(), if batching.
+_batch = threading.local()
 
 
-def save_config(config: dict) -> None:
-    """Save the config using semi-secret storage."""
-    _storage.set("config", json.dumps(config))
+def _get_storage() -> "SecretStorage":
+    global _storage  # pylint: disable=global-statement
+    with _storage_lock:
+        if _storage is None:
+            from semi_secret import SecretStorage  # type: ignore
+
+            _storage = SecretStorage(STORAGE_KEY, SALT, storage_path=STORAGE_PATH)
+        return _storage
+
+
+def reload_storage() -> None:
+    """Makes the next access re-read the storage file. Not needed to see
+    other processes' writes, those change the file's stat."""
+    global _cache  # pylint: disable=global-statement
+    with _cache_lock:
+        _cache = None
 
 
-def load_from_storage() -> dict:
-    """Load the config from semi-secret storage."""
-    config_str = _storage.get("config")
+def _secrets_file() -> Path:
+    return Path(STORAGE_PATH) / _SECRETS_FILE
+
+
+def _stat_key(path: Path) -> tuple[int, int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    # The inode changes on every rename, even within the mtime granularity.
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _read_secrets(path: Path) -> dict[str, Any]:
+    """The whole decrypted file, cached until the file changes."""
+    global _cache  # pylint: disable=global-statement
+    key = _stat_key(path)
+    if key is None:
+        return {}
+    with _cache_lock:
+        if _cache is not None and _cache[0] == path and _cache[1] == key:
+            return _cache[2]
+    try:
+        data = json.loads(_get_storage().fernet.decrypt(path.read_bytes()))
+    except FileNotFoundError:
+        return {}
+    except Exception as e:  # pylint: disable=broad-except
+        warnings.warn(f"Could not decrypt {path}, ignoring it: {e}")
+        data = {}
+    with _cache_lock:
+        _cache = (path, key, data)
+    return data
+
+
+def _write_secrets(path: Path, data: dict[str, Any]) -> None:
+    """Atomically replaces the file, the caller holds the lock."""
+    global _cache  # pylint: disable=global-statement
+    encrypted = _get_storage().fernet.encrypt(json.dumps(data).encode())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(encrypted)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+    key = _stat_key(path)
+    with _cache_lock:
+        _cache = (path, key, data) if key is not None else None
+
+
+def _config_lock():
+    from filelock import FileLock
+
+    path = Path(STORAGE_PATH) / _LOCK_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return FileLock(str(path))
+
+
+def _modify_config(modify) -> None:
+    """Re-reads the config under the lock and writes back modify(config)."""
+    path = _secrets_file()
+    with _config_lock():
+        secrets = dict(_read_secrets(path))
+        config = _decode_config(secrets.get(_CONFIG_KEY))
+        secrets[_CONFIG_KEY] = json.dumps(modify(config))
+        _write_secrets(path, secrets)
+
+
+def _decode_config(config_str: Any) -> dict:
     if config_str:
         return json.loads(config_str)
     return {}
 
 
+def _get_config_path_legacy() -> str:
+    env_path = user_config_dir("zcmds", "zcmds", roaming=True)
+    config_file = os.path.join(env_path, "openai.json")
+    return config_file
+
+
+def save_config(config: dict) -> None:
+    """Replaces the whole config. Prefer update_config, which leaves the
+    fields that other processes wrote alone."""
+    _modify_config(lambda _: dict(config))
+
+
+def update_config(changes: dict) -> None:
+    """Merges the changed fields into the latest config on disk, in one
+    write. Inside batch_updates() they are written when the batch ends."""
+    pending = getattr(_batch, "changes", None)
+    if pending is not None:
+        pending.update(changes)
+        return
+    if changes:
+        _modify_config(lambda config: {**config, **changes})
+
+
+@contextlib.contextmanager
+def batch_updates() -> Iterator[None]:
+    """Collects this thread's update_config calls in the block into a
+    single write when the block ends."""
+    if getattr(_batch, "changes", None) is not None:
+        yield  # Nested, the outer batch writes.
+        return
+    _batch.changes = {}
+    try:
+        yield
+        changes = _batch.changes
+    finally:
+        _batch.changes = None
+    update_config(changes)
+
+
+def load_from_storage(use_agent: bool = True) -> dict:
+    """Load the config, from the credential agent when it runs, otherwise
+    from the cache unless the file changed."""
+    # The directory only exists once an agent was started, so without one
+    # this costs a stat and not the client's imports.
+    if use_agent and _cache is None and CRED_AGENT_PATH.exists():
+        from aicode import cred_agent
+        from aicode.startup_trace import span
+
+        if cred_agent.is_supported():
+            with span("config.agent"):
+                config = cred_agent.fetch_config()
+            if config is not None:
+                return config
+    return _decode_config(_read_secrets(_secrets_file()).get(_CONFIG_KEY))
+
+
 def _create_or_load_config_legacy() -> dict:
     config_file = _get_config_path_legacy()
     try:
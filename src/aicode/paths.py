@@ -1,6 +1,6 @@
 from pathlib import Path
 
-from appdirs import user_config_dir  # type: ignore
+from appdirs import user_cache_dir, user_config_dir, user_data_dir  # type: ignore
 
 
 def _get_aider_install_path(path: Path | None = None) -> Path:
@@ -11,3 +11,40 @@ def _get_aider_install_path(path: Path | None = None) -> Path:
 
 
 AIDER_INSTALL_PATH = _get_aider_install_path()
+
+# Where the semi-secret config store keeps its encrypted blob.
+CONFIG_STORAGE_PATH = Path(user_config_dir("advanced-aicode", roaming=True))
+
+_CACHE_PATH = Path(user_cache_dir("advanced-aicode"))
+
+# Per-directory cache of resolved launches, see launch_plan.py
+LAUNCH_PLAN_PATH = _CACHE_PATH / "launch_plans"
+
+# Sockets and logs of the warm aider workers, see zygote.py
+ZYGOTE_PATH = _CACHE_PATH / "zygote"
+
+# Socket of the credential agent, see cred_agent.py
+CRED_AGENT_PATH = _CACHE_PATH / "agent"
+
+# Logs and locks of the repo map prewarm workers, see prewarm.py
+PREWARM_PATH = _CACHE_PATH / "prewarm"
+
+# Per-repo indexes of AI comments, see markers.py
+MARKERS_PATH = _CACHE_PATH / "markers"
+
+# Reports and session logs of fanout runs that failed, see fanout.py
+FANOUT_PATH = _CACHE_PATH / "fanout"
+
+# Output tails of failed aider sessions, see session_runner.py
+CRASH_LOG_PATH = _CACHE_PATH / "crash"
+
+_DATA_PATH = Path(user_data_dir("advanced-aicode"))
+
+# Session and turn metrics, see metrics.py
+METRICS_DB_PATH = _DATA_PATH / "metrics.sqlite3"
+
+# Archived chat sessions, see history.py
+HISTORY_PATH = _DATA_PATH / "history"
+
+# Full-text index of the archived sessions, see history_search.py
+HISTORY_DB_PATH = _DATA_PATH / "history.sqlite3"
@@ -0,0 +1,244 @@
+"""
+Repo-map prewarming.
+
+aider builds its repo map on the first turn, parsing every file of the repo
+with tree-sitter unless its tags cache already has it. On a large repo that
+is a long pause, while aicode itself spends the launch at prompts and
+checks. So as soon as an interactive launch finds the repo, it starts
+prewarm_worker.py in the aider venv, detached and at the lowest priority, to
+fill the cache; the session then starts with a hot cache. The launch itself
+only checks when the repo was last warmed, finding the venv and spawning the
+worker happen in a thread. Set AICODE_NO_PREWARM=1 to turn it off.
+
+For cron or CI, "aicode prewarm" warms a list of repos in the foreground:
+
+    aicode prewarm [REPO ...] [--repos-file FILE] [--timeout SECONDS]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+
+from aicode.paths import PREWARM_PATH
+
+_WORKER_SCRIPT = Path(__file__).with_name("prewarm_worker.py")
+
+# A launch doesn't start another worker for a repo warmed this recently.
+_MIN_INTERVAL = 60  # seconds
+
+DEFAULT_TIMEOUT = 60 * 60  # seconds
+
+# The thread of maybe_prewarm, see finish_prewarm.
+_starter: threading.Thread | None = None
+
+
+@dataclass
+class PrewarmResult:
+    root: str
+    files: int = 0
+    parsed: int = 0
+    seconds: float = 0.0
+    busy: bool = False
+    error: str | None = None
+
+
+def prewarm_enabled() -> bool:
+    return os.environ.get("AICODE_NO_PREWARM", "") in ("", "0")
+
+
+def repo_map_disabled(aider_args: list[str]) -> bool:
+    """True if the aider args turn the repo map off, --map-tokens 0."""
+    for i, arg in enumerate(aider_args):
+        if arg == "--map-tokens" and i + 1 < len(aider_args):
+            value = aider_args[i + 1]
+        elif arg.startswith("--map-tokens="):
+            value = arg.split("=", 1)[1]
+        else:
+            continue
+        if value.strip() in ("0", "0.0"):
+            return True
+    return False
+
+
+def _state_path(root: Path) -> Path:
+    name = hashlib.sha256(str(root).encode("utf-8")).hexdigest()[:16]
+    return PREWARM_PATH / name
+
+
+def _worker_cmd(python: str, root: Path) -> list[str]:
+    return [
+        python,
+        str(_WORKER_SCRIPT),
+        "--root",
+        str(root),
+        "--lock",
+        str(_state_path(root).with_suffix(".lock")),
+    ]
+
+
+def _venv_python(install_path: Path | None) -> str | None:
+    from aicode.aider_control import _get_path
+    from aicode.direct_exec import resolve_aider
+
+    resolution = resolve_aider(_get_path(install_path))
+    return resolution.python if resolution is not None else None
+
+
+def _recently_warmed(root: Path) -> bool:
+    try:
+        mtime = _state_path(root).with_suffix(".log").stat().st_mtime
+    except OSError:
+        return False
+    return time.time() - mtime < _MIN_INTERVAL
+
+
+def start_prewarm(
+    root: Path, install_path: Path | None = None
+) -> subprocess.Popen | None:
+    """Starts a detached worker for the repo, None if there is nothing to
+    do or no aider install to do it with."""
+    from aicode.aider_control import _get_path
+    from aicode.install_gc import write_lease
+
+    root = root.resolve()
+    if _recently_warmed(root):
+        return None
+    PREWARM_PATH.mkdir(parents=True, exist_ok=True)
+    log_path = _state_path(root).with_suffix(".log")
+    # Counts as warmed from now on, also without an install to do it, so
+    # that the next launches don't try again right away.
+    log_path.touch()
+    python = _venv_python(install_path)
+    if python is None:
+        return None
+    with open(log_path, "ab") as log_file:
+        proc = subprocess.Popen(
+            _worker_cmd(python, root),
+            cwd=str(root),
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    # The worker runs out of the generation, so --gc must leave it alone.
+    write_lease(_get_path(install_path), proc.pid)
+    return proc
+
+
+def _start_quietly(root: Path) -> None:
+    try:
+        start_prewarm(root)
+    except Exception as err:  # pylint: disable=broad-except
+        warnings.warn(f"Failed to start repo map prewarm: {err}")
+
+
+def maybe_prewarm(root: Path, aider_args: list[str]) -> None:
+    """The launch hook, never lets a prewarm problem get in the way. Costs
+    the launch a stat, the worker is started in a thread."""
+    global _starter  # pylint: disable=global-statement
+    if not prewarm_enabled() or repo_map_disabled(aider_args):
+        return
+    if _recently_warmed(root):
+        return
+    _starter = threading.Thread(target=_start_quietly, args=(root,), daemon=True)
+    _starter.start()
+
+
+def finish_prewarm(timeout: float = 2.0) -> None:
+    """Waits for the thread of maybe_prewarm, which an exec would kill."""
+    if _starter is not None:
+        _starter.join(timeout)
+
+
+def prewarm_repo(
+    root: Path,
+    install_path: Path | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> PrewarmResult:
+    """Warms the repo's tags cache in the foreground."""
+    root = root.resolve()
+    python = _venv_python(install_path)
+    if python is None:
+        return PrewarmResult(str(root), error="aider is not installed")
+    PREWARM_PATH.mkdir(parents=True, exist_ok=True)
+    try:
+        cp = subprocess.run(
+            _worker_cmd(python, root),
+            cwd=str(root),
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            check=False,
+        )
+    except subprocess.TimeoutExpired:
+        return PrewarmResult(str(root), error=f"timed out after {timeout:.0f}s")
+    lines = cp.stdout.strip().splitlines()
+    try:
+        return PrewarmResult(**json.loads(lines[-1]))
+    except (IndexError, ValueError, TypeError):
+        tail = (cp.stderr.strip().splitlines() or ["no output"])[-1]
+        return PrewarmResult(
+            str(root), error=f"worker failed with code {cp.returncode}: {tail}"
+        )
+
+
+def _read_repos_file(path: Path) -> list[Path]:
+    repos = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            repos.append(Path(line).expanduser())
+    return repos
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="aicode prewarm", description="Fill aider's repo map cache for repos"
+    )
+    parser.add_argument(
+        "repos", nargs="*", type=Path, help="Repo roots, the current repo by default"
+    )
+    parser.add_argument(
+        "--repos-file", type=Path, help="File with one repo root per line"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds per repo"
+    )
+    args = parser.parse_args(argv)
+    repos: list[Path] = list(args.repos)
+    if args.repos_file is not None:
+        repos += _read_repos_file(args.repos_file)
+    if not repos:
+        from aicode.util import _find_path_to_git_directory
+
+        try:
+            repos = [_find_path_to_git_directory(Path.cwd())]
+        except FileNotFoundError:
+            print("Not in a git repo, give the repos to prewarm")
+            return 1
+    failed = 0
+    for repo in repos:
+        result = prewarm_repo(repo, timeout=args.timeout)
+        if result.error is not None:
+            failed += 1
+            print(f"{result.root}: {result.error}")
+        elif result.busy:
+            print(f"{result.root}: already being warmed by another worker")
+        else:
+            print(
+                f"{result.root}: {result.files} files, {result.parsed} parsed, {result.seconds:.1f}s"
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Repo-map prewarm worker.
+
+This script runs inside the aider venv with the venv's interpreter, so it must
+only use the standard library and aider itself, never aicode. It fills aider's
+tags cache (.aider.tags.cache.v* in the repo root) for every file that aider
+would put in the repo map, the same way aider does on its first turn, so that
+the session starts with a hot cache. Files whose cache entry is current cost
+a stat and a lookup.
+
+It runs at the lowest CPU priority, and at most one worker per repo holds the
+--lock file; a second one exits right away. The last line of output is a JSON
+summary.
+
+See aicode/prewarm.py for the client side.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+
+class _QuietIO:
+    """The parts of aider's InputOutput that GitRepo and RepoMap use."""
+
+    encoding = "utf-8"
+
+    def read_text(self, filename, silent=False):  # pylint: disable=unused-argument
+        try:
+            with open(str(filename), "r", encoding=self.encoding) as f:
+                return f.read()
+        except (OSError, UnicodeError):
+            return None
+
+    def tool_output(self, *_args, **_kwargs) -> None:
+        pass
+
+    def tool_warning(self, *_args, **_kwargs) -> None:
+        pass
+
+    def tool_error(self, *_args, **_kwargs) -> None:
+        pass
+
+
+def _lower_priority() -> None:
+    try:
+        os.nice(19)
+    except OSError:
+        pass
+    if hasattr(os, "sched_setscheduler") and hasattr(os, "SCHED_IDLE"):
+        try:
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+        except OSError:
+            pass
+
+
+def prewarm(root: Path) -> dict:
+    from aider.repo import GitRepo  # type: ignore
+    from aider.repomap import RepoMap  # type: ignore
+    from aider.utils import safe_abs_path  # type: ignore
+
+    start = time.monotonic()
+    io = _QuietIO()
+    repo = GitRepo(io, [], str(root), aider_ignore_file=str(root / ".aiderignore"))
+    files = [
+        fname for fname in repo.get_tracked_files() if not repo.ignored_file(fname)
+    ]
+    repo_map = RepoMap(root=repo.root, io=io)
+    get_tags_raw = repo_map.get_tags_raw
+    misses = 0
+
+    def _counting_get_tags_raw(fname, rel_fname):
+        nonlocal misses
+        misses += 1
+        return get_tags_raw(fname, rel_fname)
+
+    repo_map.get_tags_raw = _counting_get_tags_raw
+    for rel_fname in files:
+        # The same absolute names that aider uses as cache keys.
+        fname = safe_abs_path(os.path.join(repo.root, rel_fname))
+        if os.path.isfile(fname):
+            repo_map.get_tags(fname, rel_fname)
+    return {
+        "root": str(repo.root),
+        "files": len(files),
+        "parsed": misses,
+        "seconds": round(time.monotonic() - start, 3),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fill aider's repo map tags cache")
+    parser.add_argument("--root", required=True, type=Path)
+    parser.add_argument("--lock", required=True)
+    args = parser.parse_args()
+    # Held for the life of the worker, so only one worker warms a repo.
+    lock_file = open(
+        args.lock, "a+", encoding="utf-8"
+    )  # pylint: disable=consider-using-with
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print(json.dumps({"root": str(args.root), "busy": True}), flush=True)
+        return 0
+    _lower_priority()
+    try:
+        summary = prewarm(args.root.resolve())
+    except Exception as err:  # pylint: disable=broad-except
+        # aider raises FileNotFoundError for a directory it can't open as a
+        # repo, among others.
+        error = f"{type(err).__name__}: {err}".rstrip(": ")
+        print(json.dumps({"root": str(args.root), "error": error}), flush=True)
+        return 1
+    print(json.dumps(summary), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,34 @@
-def run_process(cmd_list: list[str]) -> int:
-    """Todo this will be replaced with something more interactive."""
-    from aicode.aider_control import aider_run
+import os
+from pathlib import Path
 
-    rtn = aider_run(cmd_list).returncode
-    return rtn
+from aicode.session_runner import OutputTap, SessionResult, run_session
+
+
+def run_process(
+    cmd_list: list[str],
+    warm: bool = False,
+    session_log: Path | None = None,
+    metrics: bool = False,
+    watch_markers: bool = False,
+) -> SessionResult:
+    """Runs aider, from a warm worker if asked for and one is up."""
+    if warm and session_log is None:
+        from aicode.zygote import run_warm
+
+        # The worker gets the terminal itself, so there is no output to keep.
+        rtn = run_warm(cmd_list)
+        if rtn is not None:
+            return SessionResult(returncode=rtn)
+    taps: list[OutputTap] = []
+    if metrics:
+        from aicode.metrics import SessionMetrics
+
+        # The model get_model chose, aider gets it from the environment. The
+        # --model in cmd_list is only an alias for anthropic models.
+        model = os.environ.get("AIDER_MODEL")
+        taps.append(SessionMetrics(model, repo=Path.cwd()))
+    if watch_markers:
+        from aicode.markers import MarkerRequests, repo_root
+
+        taps.append(MarkerRequests(repo_root(Path.cwd())))
+    return run_session(cmd_list, session_log=session_log, taps=taps)
@@ -0,0 +1,401 @@
+"""
+Runs an aider session and keeps the tail of its output.
+
+On a terminal aider is hosted in a pseudo-terminal and the loop copies bytes
+between the two, stdin first so that typing is never held up by output.
+Without a terminal aider's output comes through a pipe instead. Either way
+the last DEFAULT_RING_BYTES of output stay in a ring buffer, which is what
+gets saved when aider fails.
+
+Anything else that wants to follow the session, like the metrics in
+metrics.py, is an OutputTap.
+
+With --session-log FILE the whole session is also written to FILE as an
+asciicast v2 recording (one JSON line per chunk with its time offset, which
+"asciinema play" can replay). A FILE ending in .zst is zstd compressed, when
+a zstd module is available, anything else is gzip compressed. Compressing
+and writing happens in the tap's thread. Input is never logged, it would contain whatever was typed.
+"""
+
+import codecs
+import gzip
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, cast
+
+from aicode import startup_trace
+from aicode.paths import CRASH_LOG_PATH
+
+DEFAULT_RING_BYTES = 64 * 1024
+
+# Crash logs that are kept, the oldest are deleted first.
+_MAX_CRASH_LOGS = 10
+
+_READ_SIZE = 65536
+
+_CTTY_SCRIPT = Path(__file__).with_name("ctty_exec.py")
+
+
+class RingBuffer:
+    """Keeps the last capacity bytes written to it."""
+
+    def __init__(self, capacity: int = DEFAULT_RING_BYTES) -> None:
+        self.capacity = capacity
+        self._buf = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self._buf += data
+        # Trimmed only once it holds twice the capacity, so that the cost of
+        # the trim is spread over many writes.
+        if len(self._buf) > 2 * self.capacity:
+            del self._buf[: -self.capacity]
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buf[-self.capacity :])
+
+
+def _open_zstd(path: Path) -> IO[bytes] | None:
+    try:
+        from compression import zstd  # type: ignore  # Python 3.14+
+
+        return zstd.open(path, "wb")
+    except ImportError:
+        pass
+    try:
+        import zstandard  # type: ignore
+    except ImportError:
+        return None
+    return zstandard.ZstdCompressor().stream_writer(
+        open(path, "wb"), closefd=True
+    )  # pylint: disable=consider-using-with
+
+
+def open_compressed(path: Path) -> tuple[IO[bytes], Path]:
+    """Opens path for writing, compressed by its suffix, returns the file and
+    the path actually written, which differs when zstd isn't available."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".zst":
+        file = _open_zstd(path)
+        if file is not None:
+            return file, path
+        path = path.with_suffix(".gz")
+        warnings.warn(f"No zstd module available, writing a gzip session log to {path}")
+    return cast(IO[bytes], gzip.open(path, "wb")), path
+
+
+class OutputTap(ABC):
+    """Gets the output, input and resizes of a session in a thread of its
+    own, so that the terminal loop only has to queue them."""
+
+    # A tap can also type into the session: whatever arrives on this fd is
+    # written to aider like keystrokes, in a pty session only.
+    input_fd: int | None = None
+
+    def __init__(self) -> None:
+        self._queue: "queue.SimpleQueue[tuple[float, str, bytes] | None]" = (
+            queue.SimpleQueue()
+        )
+        self._thread = threading.Thread(
+            target=self._loop, name=type(self).__name__, daemon=True
+        )
+        self._thread.start()
+
+    def output(self, data: bytes) -> None:
+        self._queue.put((time.monotonic(), "o", data))
+
+    def input(self, data: bytes) -> None:
+        self._queue.put((time.monotonic(), "i", data))
+
+    def resize(self, cols: int, rows: int) -> None:
+        self._queue.put((time.monotonic(), "r", f"{cols}x{rows}".encode("ascii")))
+
+    @abstractmethod
+    def handle(self, when: float, kind: str, data: bytes) -> None:
+        """Handles one event in the tap's thread: kind is "o" for output,
+        "i" for input and "r" for a resize."""
+
+    def finish(self) -> None:
+        """Runs in the tap's thread after the last event."""
+
+    def _loop(self) -> None:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                self.handle(*item)
+        except Exception as err:  # pylint: disable=broad-except
+            # A broken tap must not take the session down, drain and drop.
+            warnings.warn(f"{type(self).__name__} failed: {err}")
+            while self._queue.get() is not None:
+                pass
+        finally:
+            self.finish()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+
+class SessionLog(OutputTap):
+    """Writes an asciicast v2 recording of the output."""
+
+    def __init__(
+        self, path: Path, cmd_list: list[str], size: tuple[int, int] = (80, 24)
+    ) -> None:
+        self.file, self.path = open_compressed(path)
+        self._start = time.monotonic()
+        # Output can split a utf-8 sequence over two reads.
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        header = {
+            "version": 2,
+            "width": size[0],
+            "height": size[1],
+            "timestamp": int(time.time()),
+            "command": subprocess.list2cmdline(cmd_list),
+        }
+        self.file.write((json.dumps(header) + "\n").encode("utf-8"))
+        super().__init__()
+
+    def handle(self, when: float, kind: str, data: bytes) -> None:
+        if kind == "i":
+            return
+        text = self._decoder.decode(data) if kind == "o" else data.decode("ascii")
+        if text:
+            event = json.dumps([round(when - self._start, 6), kind, text])
+            self.file.write((event + "\n").encode("utf-8"))
+
+    def finish(self) -> None:
+        self.file.close()
+
+
+@dataclass
+class SessionResult:
+    returncode: int
+    output_tail: bytes = b""
+    log_path: Path | None = None
+
+
+def _can_use_pty() -> bool:
+    return sys.platform != "win32" and sys.stdin.isatty() and sys.stdout.isatty()
+
+
+def _open_aider(
+    cmd_list: list[str], wrapper: list[str] | None = None, **process_args
+) -> subprocess.Popen:
+    """Starts aider straight from its venv when it has been resolved before,
+    which saves the "uv run" that IsoEnv would put in between. The wrapper
+    command, if any, gets aider's command line and has to exec it."""
+    from aicode.aider_control import _get_path, aider_open_proc, get_venv_env
+    from aicode.direct_exec import _load_resolution
+
+    wrapper = wrapper or []
+    install_path = _get_path(None)
+    resolution = _load_resolution(install_path)
+    if resolution is None or cmd_list[0] != "aider":
+        return aider_open_proc(wrapper + cmd_list, **process_args)
+    env = get_venv_env(install_path, process_args.pop("env", None))
+    return subprocess.Popen(  # pylint: disable=consider-using-with
+        wrapper + [resolution.aider] + cmd_list[1:],
+        env=env,
+        **process_args,
+    )
+
+
+def _run_in_pty(
+    cmd_list: list[str],
+    ring: RingBuffer,
+    taps: list[OutputTap],
+    stdin_fd: int,
+    stdout_fd: int,
+) -> int:
+    import fcntl
+    import pty
+    import select
+    import signal
+    import struct
+    import termios
+    import tty
+
+    master_fd, slave_fd = pty.openpty()
+
+    def _copy_winsize(*_) -> None:
+        winsize = fcntl.ioctl(stdin_fd, termios.TIOCGWINSZ, b"\0" * 8)
+        fcntl.ioctl(master_fd, termios.TIOCSWINSZ, winsize)
+        rows, cols, _, _ = struct.unpack("HHHH", winsize)
+        for tap in taps:
+            tap.resize(cols, rows)
+
+    _copy_winsize()
+    with startup_trace.span("run_process.spawn"):
+        proc = _open_aider(
+            cmd_list,
+            stdin=slave_fd,
+            stdout=slave_fd,
+            stderr=slave_fd,
+            start_new_session=True,
+            # Makes the pty aider's controlling terminal, so that ctrl-c
+            # reaches it. Not a preexec_fn, the taps' threads are running.
+            wrapper=[sys.executable, "-S", "-E", str(_CTTY_SCRIPT)],
+        )
+    os.close(slave_fd)
+    old_winch = signal.signal(signal.SIGWINCH, _copy_winsize)
+    old_mode = termios.tcgetattr(stdin_fd)
+    # TCSANOW, the default would throw away what was typed during startup.
+    tty.setraw(stdin_fd, termios.TCSANOW)
+    got_output = False
+    read_fds = [master_fd, stdin_fd]
+    tap_fds = [tap.input_fd for tap in taps if tap.input_fd is not None]
+    read_fds += tap_fds
+    try:
+        while True:
+            try:
+                readable, _, _ = select.select(read_fds, [], [])
+            except InterruptedError:
+                continue
+            # Keystrokes go first, output can wait the few microseconds.
+            if stdin_fd in readable:
+                data = os.read(stdin_fd, 4096)
+                if data:
+                    os.write(master_fd, data)
+                    for tap in taps:
+                        tap.input(data)
+                else:
+                    read_fds.remove(stdin_fd)
+            for fd in tap_fds:
+                if fd in readable:
+                    data = os.read(fd, 4096)
+                    if data:
+                        os.write(master_fd, data)
+                        for tap in taps:
+                            tap.input(data)
+                    else:
+                        read_fds.remove(fd)
+            if master_fd in readable:
+                try:
+                    data = os.read(master_fd, _READ_SIZE)
+                except OSError:
+                    data = b""  # EIO once aider has closed the pty
+                if not data:
+                    break
+                if not got_output:
+                    startup_trace.mark("aider.first_output_byte")
+                    got_output = True
+                os.write(stdout_fd, data)
+                ring.write(data)
+                for tap in taps:
+                    tap.output(data)
+    finally:
+        termios.tcsetattr(stdin_fd, termios.TCSADRAIN, old_mode)
+        signal.signal(signal.SIGWINCH, old_winch)
+        os.close(master_fd)
+    return proc.wait()
+
+
+def _run_with_pipe(
+    cmd_list: list[str], ring: RingBuffer, taps: list[OutputTap], stdout_fd: int
+) -> int:
+    with startup_trace.span("run_process.spawn"):
+        proc = _open_aider(cmd_list, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    assert proc.stdout is not None
+    pipe_fd = proc.stdout.fileno()
+    got_output = False
+    while True:
+        data = os.read(pipe_fd, _READ_SIZE)
+        if not data:
+            break
+        if not got_output:
+            startup_trace.mark("aider.first_output_byte")
+            got_output = True
+        os.write(stdout_fd, data)
+        ring.write(data)
+        for tap in taps:
+            tap.output(data)
+    proc.stdout.close()
+    return proc.wait()
+
+
+def _terminal_size() -> tuple[int, int]:
+    size = (
+        os.get_terminal_size(sys.stdout.fileno())
+        if sys.stdout.isatty()
+        else os.terminal_size((80, 24))
+    )
+    return size.columns, size.lines
+
+
+def run_session(
+    cmd_list: list[str],
+    session_log: Path | None = None,
+    ring_bytes: int = DEFAULT_RING_BYTES,
+    taps: list[OutputTap] | None = None,
+) -> SessionResult:
+    ring = RingBuffer(ring_bytes)
+    taps = list(taps or [])
+    log: SessionLog | None = None
+    if session_log is not None:
+        try:
+            log = SessionLog(session_log, cmd_list, _terminal_size())
+            taps.append(log)
+        except OSError as err:
+            warnings.warn(f"Failed to open the session log {session_log}: {err}")
+    sys.stdout.flush()
+    try:
+        if _can_use_pty():
+            returncode = _run_in_pty(
+                cmd_list, ring, taps, sys.stdin.fileno(), sys.stdout.fileno()
+            )
+        elif sys.platform == "win32" and sys.stdout.isatty():
+            # No pty on Windows and aider needs the console for its prompt,
+            # so it gets the console and there is no tail to keep.
+            from aicode.aider_control import aider_run
+
+            returncode = aider_run(cmd_list).returncode
+        else:
+            returncode = _run_with_pipe(cmd_list, ring, taps, sys.stdout.fileno())
+    finally:
+        for tap in taps:
+            tap.close()
+    return SessionResult(
+        returncode=returncode,
+        output_tail=ring.getvalue(),
+        log_path=log.path if log is not None else None,
+    )
+
+
+def _prune_crash_logs() -> None:
+    logs = sorted(CRASH_LOG_PATH.glob("aider-*.log"))
+    for old in logs[:-_MAX_CRASH_LOGS]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def write_crash_log(cmd_list: list[str], result: SessionResult) -> Path | None:
+    """Saves the tail of a failed session's output, returns where."""
+    path = CRASH_LOG_PATH / time.strftime(f"aider-%Y%m%d-%H%M%S-{os.getpid()}.log")
+    lines = [
+        f"command: {subprocess.list2cmdline(cmd_list)}",
+        f"exit code: {result.returncode}",
+        f"cwd: {os.getcwd()}",
+        f"last {len(result.output_tail)} bytes of output:",
+        "",
+    ]
+    try:
+        CRASH_LOG_PATH.mkdir(parents=True, exist_ok=True)
+        path.write_bytes("\n".join(lines).encode("utf-8") + result.output_tail)
+        _prune_crash_logs()
+    except OSError as err:
+        warnings.warn(f"Failed to write crash log: {err}")
+        return None
+    return path
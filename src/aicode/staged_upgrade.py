@@ -0,0 +1,175 @@
+"""
+Staged background upgrades of aider.
+
+Instead of blocking the terminal while a whole new venv is built, an upgrade
+builds the next generation in a detached, low priority process. The new
+generation is smoke tested and only then made active by an atomic manifest
+update, so the next launch picks it up while sessions that are already
+running keep the generation they started with (see install_gc leases).
+
+The background update check starts a staged upgrade on its own when it finds
+a newer aider, set AICODE_NO_AUTO_UPGRADE=1 to turn that off.
+
+    python -m aicode.staged_upgrade [--version X.Y.Z]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import warnings
+from pathlib import Path
+
+from aicode.aider_update_result import AiderUpdateResult, Version
+from aicode.install_manifest import STATUS_INSTALLED, STATUS_INSTALLING, load_manifest
+from aicode.paths import AIDER_INSTALL_PATH
+
+STAGE_LOG = "upgrade.log"
+_STAGE_LOCK = ".stage.lock"
+
+NO_AUTO_UPGRADE_ENV = "AICODE_NO_AUTO_UPGRADE"
+
+# A staged install that hasn't finished after this long is assumed to be dead.
+_STALE_STAGE_SECONDS = 2 * 60 * 60
+
+_SMOKE_TEST_TIMEOUT = 120
+
+
+def auto_upgrade_enabled() -> bool:
+    return os.environ.get(NO_AUTO_UPGRADE_ENV, "") in ("", "0")
+
+
+def is_staged(root: Path, aider_version: str) -> bool:
+    """True if aider_version is installed or currently being staged."""
+    now = time.time()
+    for gen in load_manifest(root).generations.values():
+        if gen.aider_version != aider_version:
+            continue
+        if gen.status == STATUS_INSTALLED:
+            return True
+        if gen.status == STATUS_INSTALLING and now - gen.created < _STALE_STAGE_SECONDS:
+            return True
+    return False
+
+
+def smoke_test(path: Path, aider_version: str | None = None) -> None:
+    """Runs the generation's aider --version the way a launch would, raises on failure."""
+    from aicode.aider_control import get_venv_bin, get_venv_env
+
+    cp = subprocess.run(
+        [str(get_venv_bin(path) / "aider"), "--version"],
+        env=get_venv_env(path),
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=_SMOKE_TEST_TIMEOUT,
+    )
+    if aider_version is not None and aider_version not in cp.stdout:
+        raise RuntimeError(f"Expected aider {aider_version}, got {cp.stdout.strip()!r}")
+
+
+def stage_upgrade(
+    root: Path = AIDER_INSTALL_PATH, aider_version: str | None = None
+) -> Path | None:
+    """Builds, tests and activates a new generation. Returns it, or None if
+    another process is already staging one or aider_version is already there."""
+    from filelock import FileLock, Timeout
+
+    from aicode.aider_control import (
+        activate_generation,
+        aider_install,
+        mark_generation_failed,
+    )
+    from aicode.install_gc import collect_garbage
+
+    root.mkdir(parents=True, exist_ok=True)
+    lock = FileLock(str(root / _STAGE_LOCK))
+    try:
+        lock.acquire(timeout=0)
+    except Timeout:
+        print("Another upgrade is already being staged.")
+        return None
+    try:
+        if aider_version is not None and is_staged(root, aider_version):
+            print(f"aider {aider_version} is already installed.")
+            return None
+        path = aider_install(root, aider_version=aider_version, activate=False)
+        try:
+            smoke_test(path, aider_version)
+        except (OSError, subprocess.SubprocessError, RuntimeError) as err:
+            mark_generation_failed(root, path.name)
+            raise RuntimeError(f"Smoke test of {path} failed: {err}") from err
+        activate_generation(root, path.name)
+        print(f"Activated {path}, new launches will use it.")
+    finally:
+        lock.release()
+    _clear_update_info()
+    collect_garbage(root, dedup=False)
+    return path
+
+
+def _clear_update_info() -> None:
+    from aicode.background import clear_update_info
+
+    clear_update_info()
+
+
+def start_staged_upgrade(
+    aider_version: str | None = None, root: Path = AIDER_INSTALL_PATH
+) -> subprocess.Popen:
+    """Runs stage_upgrade in a detached low priority process."""
+    cmd = [sys.executable, "-m", "aicode.staged_upgrade", "--root", str(root)]
+    if aider_version is not None:
+        cmd += ["--version", aider_version]
+    process_args: dict = {}
+    if sys.platform == "win32":
+        process_args["creationflags"] = (
+            subprocess.BELOW_NORMAL_PRIORITY_CLASS | subprocess.CREATE_NEW_PROCESS_GROUP
+        )
+    else:
+        process_args["start_new_session"] = True
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / STAGE_LOG, "ab") as log_file:
+        return subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            **process_args,
+        )
+
+
+def maybe_stage_update(
+    update_info: AiderUpdateResult, root: Path = AIDER_INSTALL_PATH
+) -> subprocess.Popen | None:
+    """Pre-stages the update that the background update check found."""
+    if not update_info.has_update or not auto_upgrade_enabled():
+        return None
+    try:
+        Version(update_info.latest_version)
+    except ValueError:
+        return None  # "Unknown", nothing to pin
+    if is_staged(root, update_info.latest_version):
+        return None
+    return start_staged_upgrade(update_info.latest_version, root)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stage an aider upgrade")
+    parser.add_argument("--version", help="aider-chat version to install")
+    parser.add_argument("--root", type=Path, default=AIDER_INSTALL_PATH)
+    args = parser.parse_args()
+    if hasattr(os, "nice"):
+        os.nice(10)
+    print(f"[{time.ctime()}] Staging aider {args.version or 'latest'}", flush=True)
+    try:
+        stage_upgrade(args.root, args.version)
+    except Exception as err:  # pylint: disable=broad-except
+        warnings.warn(f"Staged upgrade failed: {err}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
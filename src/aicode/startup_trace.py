@@ -0,0 +1,160 @@
+"""
+Startup phase tracer.
+
+Enabled with --trace-startup[=FILE]. Records timed spans for the phases of a
+launch and writes them as a Chrome trace-event file, which can be opened in
+chrome://tracing or https://ui.perfetto.dev. When tracing is off every hook
+here is a cheap no-op.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+DEFAULT_TRACE_FILE = "aicode-trace.json"
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+@dataclass
+class Span:
+    name: str
+    start_us: float
+    dur_us: Optional[float]  # None for instant events
+    tid: int
+
+
+class Tracer:
+    def __init__(self, out_path: Path) -> None:
+        self.out_path = out_path
+        self.spans: list[Span] = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._t0) * 1e6
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            dur = self._now_us() - start
+            with self._lock:
+                self.spans.append(Span(name, start, dur, threading.get_ident()))
+
+    def mark(self, name: str) -> None:
+        with self._lock:
+            self.spans.append(Span(name, self._now_us(), None, threading.get_ident()))
+
+    def to_chrome_trace(self) -> dict:
+        pid = os.getpid()
+        events: list[dict] = []
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            event: dict[str, Any] = {
+                "name": span.name,
+                "cat": "startup",
+                "pid": pid,
+                "tid": span.tid,
+                "ts": round(span.start_us, 3),
+            }
+            if span.dur_us is None:
+                event.update({"ph": "i", "s": "p"})
+            else:
+                event.update({"ph": "X", "dur": round(span.dur_us, 3)})
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def summary(self) -> str:
+        with self._lock:
+            spans = list(self.spans)
+        lines = ["", "#" * 20 + " aicode startup trace " + "#" * 20]
+        timed = sorted(
+            (s for s in spans if s.dur_us is not None),
+            key=lambda s: s.dur_us or 0.0,
+            reverse=True,
+        )
+        for span in timed:
+            assert span.dur_us is not None
+            lines.append(f"  {span.dur_us / 1000:10.2f} ms  {span.name}")
+        for span in spans:
+            if span.dur_us is None:
+                lines.append(f"  {span.start_us / 1000:10.2f} ms  @ {span.name}")
+        lines.append(f"Trace written to {self.out_path}")
+        return "\n".join(lines)
+
+    def write(self) -> None:
+        self.out_path.write_text(
+            json.dumps(self.to_chrome_trace(), indent=1), encoding="utf-8"
+        )
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def enable(out_path: str | Path | None = None) -> Tracer:
+    """Starts tracing, the output path is resolved against the current cwd."""
+    global _tracer  # pylint: disable=global-statement
+    if _tracer is None:
+        _tracer = Tracer(Path(out_path or DEFAULT_TRACE_FILE).absolute())
+    return _tracer
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name):
+        yield
+
+
+def mark(name: str) -> None:
+    tracer = _tracer
+    if tracer is not None:
+        tracer.mark(name)
+
+
+def traced(name: str) -> Callable[[_F], _F]:
+    """Decorator that records a span around every call of the function."""
+
+    def decorator(func: _F) -> _F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def finish() -> None:
+    """Writes the trace file and prints the summary, if tracing is on."""
+    global _tracer  # pylint: disable=global-statement
+    tracer = _tracer
+    if tracer is None:
+        return
+    _tracer = None
+    try:
+        tracer.write()
+    except OSError as err:
+        print(f"Failed to write startup trace to {tracer.out_path}: {err}")
+    print(tracer.summary())
@@ -0,0 +1,372 @@
+"""
+A local stand-in for the OpenAI and Anthropic chat APIs, for benchmarks and
+tests that shouldn't need the network or cost money.
+
+    python -m aicode.stub_llm [--port 8765] [--latency 0.5] [--token-rate 50]
+
+Serves POST .../chat/completions (OpenAI) and POST .../messages (Anthropic),
+streaming or not, and GET .../models. Every reply waits --latency seconds
+before its first token, then produces --token-rate tokens per second, one
+word per token. So aider can be pointed at it with
+
+    OPENAI_API_BASE=http://127.0.0.1:8765/v1 aider --model openai/stub
+    ANTHROPIC_API_BASE=http://127.0.0.1:8765 aider --model anthropic/stub
+
+The reply is filler text, unless a message contains a [bench-task:ID]
+marker for a task that the server was given answers for. Then the reply is
+the task's solution in aider's "whole" edit format, which is how the
+edit-task benchmarks of bench_models.py run offline.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+
+_FILLER = (
+    "The quick brown fox jumps over the lazy dog while the benchmark keeps "
+    "counting every token that goes by on the wire. "
+).split()
+
+_TASK_MARKER = "[bench-task:"
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.0
+    token_rate: float = 0.0  # tokens per second, 0 for as fast as possible
+    reply_tokens: int = 64
+    # Task id -> {file name: content}, see bench_models.EDIT_TASKS
+    solutions: dict[str, dict[str, str]] = field(default_factory=dict)
+
+
+def _content_text(content) -> str:
+    """Message content is a string or a list of parts, in both APIs."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(
+            part.get("text", "") for part in content if isinstance(part, dict)
+        )
+    return ""
+
+
+def _find_task(messages: list[dict], system: str = "") -> str | None:
+    texts = [system] + [_content_text(message.get("content")) for message in messages]
+    # The last marker wins, earlier ones may be from chat history.
+    for text in reversed(texts):
+        start = text.rfind(_TASK_MARKER)
+        if start >= 0:
+            end = text.find("]", start)
+            if end > start:
+                return text[start + len(_TASK_MARKER) : end]
+    return None
+
+
+def whole_format_reply(files: dict[str, str]) -> str:
+    """The files as aider's "whole" edit format expects them."""
+    parts = []
+    for name, content in files.items():
+        parts.append(f"{name}\n```\n{content.rstrip()}\n```\n")
+    return "\n".join(parts)
+
+
+def _split_tokens(text: str) -> list[str]:
+    """Words with their trailing whitespace, so they join back up exactly."""
+    tokens: list[str] = []
+    word = ""
+    for char in text:
+        if char.isspace():
+            word += char
+        elif word and word[-1].isspace():
+            tokens.append(word)
+            word = char
+        else:
+            word += char
+    if word:
+        tokens.append(word)
+    return tokens
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StubServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+        pass
+
+    def _send_json(self, data: dict, status: int = 200) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(
+                {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+            )
+        else:
+            self._send_json({"error": {"message": "not found"}}, 404)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": {"message": "bad json"}}, 400)
+            return
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            self._reply(request, anthropic=False)
+        elif path.endswith("/messages"):
+            self._reply(request, anthropic=True)
+        else:
+            self._send_json({"error": {"message": "not found"}}, 404)
+
+    def _reply(self, request: dict, anthropic: bool) -> None:
+        config = self.server.config
+        self.server.count_request()
+        system = _content_text(request.get("system", "")) if anthropic else ""
+        task = _find_task(request.get("messages", []), system)
+        if task is not None and task in config.solutions:
+            text = whole_format_reply(config.solutions[task])
+        else:
+            text = "".join(
+                _FILLER[i % len(_FILLER)] + " " for i in range(config.reply_tokens)
+            ).rstrip()
+        tokens = _split_tokens(text)
+        prompt_tokens = sum(
+            len(_content_text(m.get("content")).split())
+            for m in request.get("messages", [])
+        )
+        time.sleep(config.latency)
+        if not request.get("stream"):
+            time.sleep(len(tokens) / config.token_rate if config.token_rate > 0 else 0)
+            if anthropic:
+                self._send_json(_anthropic_message(text, prompt_tokens, len(tokens)))
+            else:
+                self._send_json(_openai_completion(text, prompt_tokens, len(tokens)))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        events = _anthropic_events if anthropic else _openai_events
+        interval = 1 / config.token_rate if config.token_rate > 0 else 0
+        include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+        first_token = True
+        for event, is_token in events(tokens, prompt_tokens, include_usage):
+            # The first token goes out right after the latency, the rest are
+            # paced by the token rate.
+            if is_token and not first_token and interval:
+                time.sleep(interval)
+            first_token = first_token and not is_token
+            self.wfile.write(event.encode("utf-8"))
+            self.wfile.flush()
+
+
+def _openai_completion(text: str, prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _openai_events(tokens: list[str], prompt_tokens: int, include_usage: bool):
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    def _chunk(delta: dict, finish_reason: str | None = None) -> str:
+        data = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    yield _chunk({"role": "assistant", "content": ""}), False
+    for token in tokens:
+        yield _chunk({"content": token}), True
+    yield _chunk({}, "stop"), False
+    if include_usage:
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        data = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "model": "stub",
+            "choices": [],
+            "usage": usage,
+        }
+        yield f"data: {json.dumps(data)}\n\n", False
+    yield "data: [DONE]\n\n", False
+
+
+def _anthropic_message(text: str, prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "id": f"msg_{uuid.uuid4().hex}",
+        "type": "message",
+        "role": "assistant",
+        "model": "stub",
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+    }
+
+
+def _anthropic_events(tokens: list[str], prompt_tokens: int, _include_usage: bool):
+    def _event(name: str, data: dict) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    message = _anthropic_message("", prompt_tokens, 0)
+    message["content"] = []
+    yield _event("message_start", {"type": "message_start", "message": message}), False
+    for i, token in enumerate(tokens):
+        if i == 0:
+            yield _event(
+                "content_block_start",
+                {
+                    "type": "content_block_start",
+                    "index": 0,
+                    "content_block": {"type": "text", "text": ""},
+                },
+            ), False
+        yield _event(
+            "content_block_delta",
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": token},
+            },
+        ), True
+    yield _event(
+        "content_block_stop", {"type": "content_block_stop", "index": 0}
+    ), False
+    yield _event(
+        "message_delta",
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": len(tokens)},
+        },
+    ), False
+    yield _event("message_stop", {"type": "message_stop"}), False
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, config: StubConfig | None = None, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        super().__init__((host, port), _Handler)
+        self.config = config or StubConfig()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode()
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        """Serves from a thread, for use in-process."""
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="stub-llm", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m aicode.stub_llm",
+        description="Local OpenAI/Anthropic compatible stub server",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds before the first token"
+    )
+    parser.add_argument(
+        "--token-rate",
+        type=float,
+        default=0.0,
+        help="Tokens per second, 0 for unlimited",
+    )
+    parser.add_argument(
+        "--reply-tokens", type=int, default=64, help="Length of the filler replies"
+    )
+    args = parser.parse_args(argv)
+    from aicode.bench_models import EDIT_TASKS
+
+    config = StubConfig(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        reply_tokens=args.reply_tokens,
+        solutions={task.id: task.solution for task in EDIT_TASKS},
+    )
+    server = StubServer(config, host=args.host, port=args.port)
+    print(
+        f"Stub LLM server on {server.url}, OpenAI base {server.url}/v1, Anthropic base {server.url}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Tiny post-exit supervisor for the direct-exec launch path.
+
+When chat history has to be archived or cleaned up after the session, aicode
+execs into this script instead of straight into aider. It is run with
+"python -S -E" and must only use the standard library, so it costs a few MB
+instead of the whole aicode process. It runs aider as its child, then the
+--then command (a JSON argv), removes the given files and exits with
+aider's return code.
+
+    python -S -E supervisor.py [--remove FILE ...] [--then JSON] -- aider [args...]
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+
+
+def _parse(argv: list[str]) -> tuple[list[str], list[list[str]], list[str]]:
+    if "--" not in argv:
+        raise SystemExit(
+            "usage: supervisor.py [--remove FILE ...] [--then JSON] -- CMD [ARGS...]"
+        )
+    split = argv.index("--")
+    opts, cmd = argv[:split], argv[split + 1 :]
+    remove: list[str] = []
+    then: list[list[str]] = []
+    while opts:
+        flag = opts.pop(0)
+        if flag not in ("--remove", "--then") or not opts:
+            raise SystemExit(f"supervisor.py: bad option {flag}")
+        if flag == "--remove":
+            remove.append(opts.pop(0))
+        else:
+            then.append(json.loads(opts.pop(0)))
+    return remove, then, cmd
+
+
+def main() -> int:
+    remove, then, cmd = _parse(sys.argv[1:])
+    try:
+        proc = subprocess.Popen(cmd)  # pylint: disable=consider-using-with
+        # Like a shell, leave ctrl-c to the foreground job. Set after the
+        # spawn so that aider doesn't inherit the ignored disposition.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        rtn = proc.wait()
+    except OSError as err:
+        print(f"Failed to start {cmd[0]}: {err}", file=sys.stderr)
+        rtn = 127
+    for after in then:
+        try:
+            subprocess.run(after, check=False)
+        except OSError as err:
+            print(f"Failed to run {after[0]}: {err}", file=sys.stderr)
+    for path in remove:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            print(f"Failed to remove {path}: {err}", file=sys.stderr)
+    return rtn
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,18 @@ import sys
 import warnings
 from pathlib import Path
 
+from aicode.startup_trace import traced
+
+# CSI and OSC sequences, aider's output is full of them on a terminal.
+_ANSI_ESCAPE = re.compile(
+    r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(\x07|\x1b\\)|\x1b[@-Z\\-_]"
+)
+
+
+def strip_ansi(text: str) -> str:
+    """Removes the terminal escape sequences from text."""
+    return _ANSI_ESCAPE.sub("", text)
+
 
 def extract_version_string(version_string: str) -> str:
     """
@@ -25,6 +37,36 @@ def open_folder(path: Path) -> None:
         subprocess.Popen(["xdg-open", path])
 
 
+def pid_alive(pid: int) -> bool:
+    """Returns True if a process with this pid is running."""
+    if pid <= 0:
+        return False
+    if sys.platform == "win32":
+        import ctypes
+
+        # os.kill(pid, 0) would terminate the process on windows.
+        kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+        process_query_limited_information = 0x1000
+        still_active = 259
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return False
+            return exit_code.value == still_active
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
 def _find_path_to_git_directory(cwd: Path) -> Path:
     path = cwd.absolute()  # Make sure we have absolute path
     while True:
@@ -37,6 +79,7 @@ def _find_path_to_git_directory(cwd: Path) -> Path:
     raise FileNotFoundError("No git directory found")
 
 
+@traced("check_gitdirectory")
 def check_gitdirectory() -> bool:
     try:
         cwd = Path.cwd()
@@ -48,12 +91,15 @@ def check_gitdirectory() -> bool:
         return False
 
 
+# Written by aider next to the .git directory, removed at exit unless --keep.
+CHAT_HISTORY_FILES = [
+    ".aider.chat.history.md",
+    ".aider.input.history",
+]
+
+
 def cleanup_chat_history(cwd: Path) -> None:
-    files = [
-        ".aider.chat.history.md",
-        ".aider.input.history",
-    ]
-    for file in files:
+    for file in CHAT_HISTORY_FILES:
         file_path = cwd / file
         if file_path.exists():
             try:
@@ -0,0 +1,83 @@
+"""
+Where the latest aider version comes from.
+
+The update check used to start aider with --just-check-update and scrape
+its output. Now the installed version is read from the venv's dist-info and
+the latest one is asked from a VersionSource, no aider process involved.
+
+The source is picked with AICODE_VERSION_SOURCE:
+  - unset: the PyPI JSON API
+  - an http(s) URL: a JSON index with the same layout as PyPI's,
+    <url>/<package>/json returning {"info": {"version": ...}}
+  - a directory: a local mirror or wheelhouse with wheels/sdists in it
+"""
+
+import json
+import os
+import re
+import urllib.request
+from pathlib import Path
+from typing import Protocol
+
+VERSION_SOURCE_ENV = "AICODE_VERSION_SOURCE"
+DEFAULT_INDEX_URL = "https://pypi.org/pypi"
+AIDER_PACKAGE = "aider-chat"
+
+_TIMEOUT = 10  # seconds
+
+# Wheels and sdists, "aider_chat-0.86.2-py3-none-any.whl", "aider-chat-0.86.2.tar.gz"
+_DIST_FILE = re.compile(
+    r"^(?P<name>.+?)-(?P<version>\d[^-]*?)(-.+\.whl|\.tar\.gz|\.zip)$"
+)
+
+
+class VersionSource(Protocol):
+    def latest_version(self, package: str) -> str:
+        """The newest released version of package."""
+
+
+class JsonIndexSource:
+    def __init__(self, url: str = DEFAULT_INDEX_URL) -> None:
+        self.url = url.rstrip("/")
+
+    def latest_version(self, package: str) -> str:
+        with urllib.request.urlopen(
+            f"{self.url}/{package}/json", timeout=_TIMEOUT
+        ) as response:
+            data = json.loads(response.read().decode("utf-8"))
+        return str(data["info"]["version"])
+
+
+def _normalize(package: str) -> str:
+    return re.sub(r"[-_.]+", "_", package).lower()
+
+
+def _version_key(version: str) -> tuple:
+    return tuple(int(part) if part.isdigit() else -1 for part in version.split("."))
+
+
+class MirrorDirSource:
+    """Finds the highest version among the distribution files in a directory."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def latest_version(self, package: str) -> str:
+        versions: list[str] = []
+        for _, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                match = _DIST_FILE.match(filename)
+                if match and _normalize(match["name"]) == _normalize(package):
+                    versions.append(match["version"])
+        if not versions:
+            raise LookupError(f"No {package} distributions in {self.path}")
+        return max(versions, key=_version_key)
+
+
+def get_version_source() -> VersionSource:
+    source = os.environ.get(VERSION_SOURCE_ENV, "")
+    if not source:
+        return JsonIndexSource()
+    if source.startswith(("http://", "https://")):
+        return JsonIndexSource(source)
+    return MirrorDirSource(Path(source))
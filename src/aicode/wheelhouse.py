@@ -0,0 +1,252 @@
+"""
+Offline provisioning of aider installs from a local wheelhouse.
+
+export_wheelhouse turns the active install generation into a directory of
+wheels for this platform plus a requirements.txt that pins every wheel by
+name, version and sha256, and a wheelhouse.json with the aider and Python
+versions. install_from_wheelhouse builds a new generation from that directory
+with uv in offline mode, so a fresh machine or CI runner provisions in
+seconds from local disk and never touches the package index.
+
+    aicode --export-wheelhouse DIR
+    aicode --install-from-wheelhouse DIR
+
+The bundle is platform specific. The Python interpreter itself is not
+bundled, a local Python matching the pin has to be present when installing.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sysconfig
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+WHEELHOUSE_FILE = "wheelhouse.json"
+REQUIREMENTS_FILE = "requirements.txt"
+WHEELS_DIR = "wheels"
+_WHEELHOUSE_VERSION = 1
+
+# Build files of an iso-env venv, copied so that iso-env accepts the
+# generation as installed and "uv run" finds its lock.
+_ISO_ENV_FILES = ["pyproject.toml", "uv.lock", "requirements.compiled.txt"]
+
+
+class WheelhouseError(Exception):
+    pass
+
+
+@dataclass
+class Wheelhouse:
+    aider_version: str | None
+    python_version: str
+    platform: str
+    requirements_in: str
+    created: float
+    wheels: dict[str, str] = field(default_factory=dict)  # file name -> sha256
+
+    def to_json_data(self) -> dict:
+        return {"version": _WHEELHOUSE_VERSION, **asdict(self)}
+
+    @classmethod
+    def from_json(cls, json_data: dict) -> "Wheelhouse":
+        if json_data.get("version") != _WHEELHOUSE_VERSION:
+            raise WheelhouseError(
+                f"Unknown wheelhouse version {json_data.get('version')}"
+            )
+        data = dict(json_data)
+        del data["version"]
+        return Wheelhouse(**data)
+
+
+def _uv() -> str:
+    uv = shutil.which("uv")
+    if uv is None:
+        raise WheelhouseError("uv not found")
+    return uv
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_wheel_name(filename: str) -> tuple[str, str]:
+    """Returns (name, version) of a wheel file name, see PEP 427."""
+    parts = filename[: -len(".whl")].split("-")
+    if not filename.endswith(".whl") or len(parts) not in (5, 6):
+        raise WheelhouseError(f"Not a wheel: {filename}")
+    return parts[0], parts[1]
+
+
+def pinned_requirements(wheels: dict[str, str]) -> str:
+    """Hash-pinned requirements for exactly these wheels."""
+    lines = []
+    for filename, sha256 in sorted(wheels.items()):
+        name, version = parse_wheel_name(filename)
+        lines.append(f"{name}=={version} --hash=sha256:{sha256}")
+    return "\n".join(lines) + "\n"
+
+
+def _run(cmd_list: list[str], **process_args) -> None:
+    try:
+        subprocess.run(
+            cmd_list, check=True, capture_output=True, text=True, **process_args
+        )
+    except subprocess.CalledProcessError as err:
+        raise WheelhouseError(
+            f"{subprocess.list2cmdline(cmd_list)} failed:\n{err.stdout}\n{err.stderr}"
+        ) from err
+
+
+def export_wheelhouse(out_dir: Path, install_path: Path | None = None) -> Wheelhouse:
+    """Bundles the wheels of the active install generation into out_dir."""
+    from aicode.aider_control import (
+        _get_path,
+        _get_requirements,
+        aider_installed,
+        get_venv_python,
+    )
+    from aicode.install_manifest import read_aider_version, read_python_version
+
+    install_path = _get_path(install_path)
+    if not aider_installed(install_path):
+        raise WheelhouseError(f"aider is not installed at {install_path}")
+    project = install_path / ".venv"
+    venv = project / ".venv"
+    if not (project / "uv.lock").exists():
+        raise WheelhouseError(f"{install_path} has no uv.lock, run aider once first")
+    wheels_dir = out_dir / WHEELS_DIR
+    wheels_dir.mkdir(parents=True, exist_ok=True)
+    locked = out_dir / ".locked-requirements.txt"
+    uv = _uv()
+    # Everything the lock resolved, pinned to the hashes on the index.
+    _run(
+        [uv, "export", "--project", str(project), "--frozen", "--no-emit-project"]
+        + ["--no-header", "--output-file", str(locked)]
+    )
+    # pip builds wheels for packages that only ship sdists, run with the
+    # generation's own interpreter so that the tags match.
+    _run(
+        [uv, "tool", "run", "--python", str(get_venv_python(install_path))]
+        + ["pip", "wheel", "--require-hashes", "--no-deps"]
+        + ["-r", str(locked), "--wheel-dir", str(wheels_dir)]
+    )
+    locked.unlink()
+    wheels = {p.name: _sha256(p) for p in wheels_dir.glob("*.whl")}
+    python_version = read_python_version(venv)
+    if python_version is None:
+        raise WheelhouseError(f"Unknown Python version of {venv}")
+    wheelhouse = Wheelhouse(
+        aider_version=read_aider_version(venv),
+        python_version=python_version,
+        platform=sysconfig.get_platform(),
+        requirements_in=_get_requirements(install_path),
+        created=time.time(),
+        wheels=wheels,
+    )
+    for name in _ISO_ENV_FILES:
+        if (project / name).exists():
+            shutil.copyfile(project / name, out_dir / name)
+    (out_dir / REQUIREMENTS_FILE).write_text(
+        pinned_requirements(wheels), encoding="utf-8"
+    )
+    (out_dir / WHEELHOUSE_FILE).write_text(
+        json.dumps(wheelhouse.to_json_data(), indent=2), encoding="utf-8"
+    )
+    return wheelhouse
+
+
+def load_wheelhouse(wheelhouse_dir: Path) -> Wheelhouse:
+    """Loads the wheelhouse and checks every wheel against its recorded hash."""
+    try:
+        data = json.loads(
+            (wheelhouse_dir / WHEELHOUSE_FILE).read_text(encoding="utf-8")
+        )
+        wheelhouse = Wheelhouse.from_json(data)
+    except (OSError, ValueError, TypeError) as err:
+        raise WheelhouseError(f"{wheelhouse_dir} is not a wheelhouse: {err}") from err
+    if wheelhouse.platform != sysconfig.get_platform():
+        raise WheelhouseError(
+            f"Wheelhouse is for {wheelhouse.platform}, this is {sysconfig.get_platform()}"
+        )
+    for filename, sha256 in wheelhouse.wheels.items():
+        path = wheelhouse_dir / WHEELS_DIR / filename
+        if not path.exists():
+            raise WheelhouseError(f"Missing wheel {filename}")
+        if _sha256(path) != sha256:
+            raise WheelhouseError(f"Hash mismatch of {filename}")
+    return wheelhouse
+
+
+def _python_request(python_version: str) -> str:
+    # Any patch release works, wheels are tagged by major.minor.
+    return ".".join(python_version.split(".")[:2])
+
+
+def install_from_wheelhouse(wheelhouse_dir: Path, root: Path | None = None) -> Path:
+    """Builds and activates a new generation from the wheelhouse, offline."""
+    from aicode.aider_control import (
+        _REQUIREMENTS_FILE,
+        _reserve_next_install_path,
+        _save_install_breadcrumb,
+        _set_generation,
+        get_venv_path,
+        get_venv_python,
+        mark_generation_failed,
+    )
+    from aicode.install_lock import install_lock, write_owner
+    from aicode.install_manifest import STATUS_INSTALLED, describe_generation
+    from aicode.paths import AIDER_INSTALL_PATH
+    from aicode.staged_upgrade import smoke_test
+
+    wheelhouse_dir = wheelhouse_dir.absolute()
+    wheelhouse = load_wheelhouse(wheelhouse_dir)
+    root = root or AIDER_INSTALL_PATH
+    with install_lock(root) as owner:
+        path = _reserve_next_install_path(root, wheelhouse.aider_version)
+        owner.generation = path.name
+        write_owner(root, owner)
+        print(f"Installing aider from {wheelhouse_dir} to {path}...")
+        uv = _uv()
+        env = dict(os.environ, UV_OFFLINE="1", UV_NO_CONFIG="1")
+        try:
+            path.mkdir(parents=True, exist_ok=True)
+            (path / _REQUIREMENTS_FILE).write_text(
+                wheelhouse.requirements_in, encoding="utf-8"
+            )
+            project = path / ".venv"
+            project.mkdir()
+            for name in _ISO_ENV_FILES:
+                if (wheelhouse_dir / name).exists():
+                    shutil.copyfile(wheelhouse_dir / name, project / name)
+            _run(
+                [uv, "venv", "--python", _python_request(wheelhouse.python_version)]
+                + ["--no-python-downloads", str(get_venv_path(path))],
+                env=env,
+            )
+            _run(
+                [uv, "pip", "install", "--python", str(get_venv_python(path))]
+                + ["--no-index", "--find-links", str(wheelhouse_dir / WHEELS_DIR)]
+                + ["--require-hashes", "-r", str(wheelhouse_dir / REQUIREMENTS_FILE)],
+                env=env,
+            )
+            (project / "installed").touch()  # iso-env's marker
+            try:
+                smoke_test(path, wheelhouse.aider_version)
+            except (OSError, subprocess.SubprocessError, RuntimeError) as err:
+                raise WheelhouseError(f"Smoke test of {path} failed: {err}") from err
+        except BaseException:
+            mark_generation_failed(root, path.name)
+            raise
+        _save_install_breadcrumb(path)
+        generation = describe_generation(path, STATUS_INSTALLED)
+        _set_generation(root, generation, activate=True)
+        print("Aider installed successfully.")
+        return path
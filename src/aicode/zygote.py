@@ -0,0 +1,296 @@
+"""
+Client side of the warm aider worker ("zygote"), enabled with --warm.
+
+A worker per install generation runs zygote_server.py inside the aider venv
+with aider's heavy modules already imported. run_warm hands it our terminal
+and gets a freshly forked aider session back, skipping seconds of imports.
+When no worker is up, run_warm starts one in the background for the next
+launch and returns None so the caller falls back to the normal spawn path.
+
+    python -m aicode.zygote start|stop|status|bench
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import TextIO
+
+from aicode import startup_trace
+from aicode.paths import ZYGOTE_PATH
+
+DEFAULT_IDLE_TIMEOUT = 30 * 60  # seconds
+DEFAULT_MAX_RSS_MB = 1024
+
+_SERVER_SCRIPT = Path(__file__).with_name("zygote_server.py")
+
+# Signals that the terminal delivers to us but that are meant for aider.
+_FORWARDED_SIGNALS = ["SIGINT", "SIGTERM", "SIGHUP", "SIGQUIT", "SIGWINCH"]
+
+# Does every startup activity, including loading litellm, then exits.
+BENCH_CMD = [
+    "aider",
+    "--exit",
+    "--no-git",
+    "--no-check-update",
+    "--no-show-model-warnings",
+    "--no-analytics",
+    "--no-pretty",
+    "--yes-always",
+]
+
+
+def is_supported() -> bool:
+    return sys.platform != "win32" and hasattr(socket, "send_fds")
+
+
+def _get_install_path(install_path: Path | None) -> Path:
+    from aicode.aider_control import _get_path
+
+    return _get_path(install_path).resolve()
+
+
+def _socket_path(install_path: Path) -> Path:
+    # Unix socket paths are limited to ~100 bytes, keep the name short.
+    name = hashlib.sha256(str(install_path).encode("utf-8")).hexdigest()[:12]
+    return ZYGOTE_PATH / f"{name}.sock"
+
+
+def _connect(sock_path: Path) -> socket.socket | None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(sock_path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def start_worker(
+    install_path: Path | None = None,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    max_rss_mb: float = DEFAULT_MAX_RSS_MB,
+) -> subprocess.Popen:
+    """Starts a detached worker, it takes a few seconds to become ready."""
+    from aicode.aider_control import get_venv_env, get_venv_python
+    from aicode.install_gc import write_lease
+
+    install_path = _get_install_path(install_path)
+    sock_path = _socket_path(install_path)
+    ZYGOTE_PATH.mkdir(parents=True, exist_ok=True, mode=0o700)
+    log_path = sock_path.with_suffix(".log")
+    with open(log_path, "ab") as log_file:
+        proc = subprocess.Popen(
+            [
+                str(get_venv_python(install_path)),
+                str(_SERVER_SCRIPT),
+                "--socket",
+                str(sock_path),
+                "--idle-timeout",
+                str(idle_timeout),
+                "--max-rss-mb",
+                str(max_rss_mb),
+            ],
+            env=get_venv_env(install_path),
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    # The worker runs out of the generation, so --gc must leave it alone.
+    write_lease(install_path, proc.pid)
+    return proc
+
+
+def stop_worker(install_path: Path | None = None) -> bool:
+    install_path = _get_install_path(install_path)
+    lock_path = Path(str(_socket_path(install_path)) + ".lock")
+    try:
+        pid = int(lock_path.read_text(encoding="utf-8").strip())
+        os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def wait_for_worker(install_path: Path | None = None, timeout: float = 120) -> bool:
+    sock_path = _socket_path(_get_install_path(install_path))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if _is_running(sock_path):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def _is_running(sock_path: Path) -> bool:
+    sock = _connect(sock_path)
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def _start_session(
+    sock: socket.socket, argv: list[str], env: dict[str, str], fds: list[int]
+) -> tuple[int, TextIO]:
+    """Sends the request, returns the session pid and the reply stream."""
+    body = json.dumps({"argv": argv, "env": env, "cwd": os.getcwd()}).encode("utf-8")
+    payload = struct.pack("!I", len(body)) + body
+    sent = socket.send_fds(sock, [payload], fds)
+    sock.sendall(payload[sent:])
+    replies = sock.makefile("r", encoding="utf-8")
+    reply = json.loads(replies.readline())
+    return int(reply["pid"]), replies
+
+
+def _wait_session(replies: TextIO) -> int:
+    line = replies.readline()
+    if not line:
+        warnings.warn("Warm aider worker went away before the session ended")
+        return 1
+    return int(json.loads(line)["exit"])
+
+
+def _wait_forwarding_signals(pid: int, replies: TextIO) -> int:
+    def _forward(signum, _frame) -> None:
+        try:
+            os.kill(pid, signum)
+        except OSError:
+            pass
+
+    # The session runs in its own process group, so terminal generated
+    # signals only reach us.
+    signums = [getattr(signal, name) for name in _FORWARDED_SIGNALS]
+    old_handlers = {signum: signal.signal(signum, _forward) for signum in signums}
+    try:
+        return _wait_session(replies)
+    finally:
+        for signum, handler in old_handlers.items():
+            signal.signal(signum, handler)
+
+
+def run_warm(cmd_list: list[str], install_path: Path | None = None) -> int | None:
+    """Runs aider in the warm worker and returns its exit code.
+
+    Returns None if no worker is ready, in which case one is started for the
+    next launch and the caller should spawn aider the normal way.
+    """
+    from aicode.aider_control import get_venv_env
+
+    if not is_supported():
+        return None
+    install_path = _get_install_path(install_path)
+    sock = _connect(_socket_path(install_path))
+    if sock is None:
+        print("Starting a warm aider worker for the next launch.")
+        start_worker(install_path)
+        return None
+    with sock:
+        try:
+            with startup_trace.span("run_process.warm_spawn"):
+                pid, replies = _start_session(
+                    sock, cmd_list, get_venv_env(install_path), [0, 1, 2]
+                )
+        except (OSError, ValueError, KeyError) as err:
+            # The worker may have hit its idle timeout or memory cap while we
+            # connected, nothing has run yet so falling back is safe.
+            warnings.warn(f"Warm aider worker failed, falling back: {err}")
+            return None
+        return _wait_forwarding_signals(pid, replies)
+
+
+def benchmark(
+    runs: int = 3, install_path: Path | None = None
+) -> dict[str, list[float]]:
+    """Times cold and warm launches of BENCH_CMD, returns seconds per run."""
+    from aicode.aider_control import get_venv_bin, get_venv_env
+
+    install_path = _get_install_path(install_path)
+    env = get_venv_env(install_path)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    cold_cmd = [str(get_venv_bin(install_path) / BENCH_CMD[0])] + BENCH_CMD[1:]
+    results: dict[str, list[float]] = {"cold": [], "warm": []}
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            cold_cmd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        results["cold"].append(time.perf_counter() - start)
+
+    if not _is_running(_socket_path(install_path)):
+        start_worker(install_path)
+    if not wait_for_worker(install_path):
+        raise RuntimeError("Warm aider worker did not start")
+    with open(os.devnull, "r+b") as devnull:
+        fds = [devnull.fileno()] * 3
+        for _ in range(runs):
+            start = time.perf_counter()
+            sock = _connect(_socket_path(install_path))
+            assert sock is not None
+            with sock:
+                _, replies = _start_session(sock, BENCH_CMD, env, fds)
+                _wait_session(replies)
+            results["warm"].append(time.perf_counter() - start)
+    return results
+
+
+def _print_benchmark(results: dict[str, list[float]]) -> None:
+    print(f"{'mode':<6} {'min':>8} {'mean':>8} {'max':>8}")
+    for mode, times in results.items():
+        mean = sum(times) / len(times)
+        print(f"{mode:<6} {min(times):8.2f} {mean:8.2f} {max(times):8.2f}  (seconds)")
+    cold = min(results["cold"])
+    warm = min(results["warm"])
+    print(f"speedup: {cold / warm:.1f}x")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Manage the warm aider worker")
+    parser.add_argument("command", choices=["start", "stop", "status", "bench"])
+    parser.add_argument("--runs", type=int, default=3, help="Runs per mode for bench")
+    args = parser.parse_args()
+    if not is_supported():
+        print("Warm aider workers are not supported on this platform.")
+        return 1
+    install_path = _get_install_path(None)
+    sock_path = _socket_path(install_path)
+    if args.command == "start":
+        if not _is_running(sock_path):
+            start_worker(install_path)
+        ok = wait_for_worker(install_path)
+        print(
+            "Warm aider worker is ready."
+            if ok
+            else "Warm aider worker failed to start."
+        )
+        return 0 if ok else 1
+    if args.command == "stop":
+        stopped = stop_worker(install_path)
+        print(
+            "Stopped warm aider worker." if stopped else "No warm aider worker running."
+        )
+        return 0
+    if args.command == "status":
+        running = _is_running(sock_path)
+        print(f"{sock_path}: {'ready' if running else 'not running'}")
+        return 0
+    _print_benchmark(benchmark(runs=args.runs, install_path=install_path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
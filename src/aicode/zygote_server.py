@@ -0,0 +1,234 @@
+"""
+Warm aider worker ("zygote").
+
+This script runs inside the aider venv with the venv's interpreter, so it must
+only use the standard library and aider itself, never aicode. It imports
+aider's heavy modules once, then listens on a unix socket. Each request
+carries the client's stdin/stdout/stderr file descriptors, argv, env and cwd,
+and is served by forking a child that runs aider.main with them. The client
+is told the child's pid and later its exit code.
+
+The worker exits when it has been idle for --idle-timeout seconds, or when its
+own RSS grows past --max-rss-mb, so the next launch starts a fresh one.
+
+See aicode/zygote.py for the client side.
+"""
+
+import argparse
+import fcntl
+import importlib
+import io
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import time
+
+# Imported up front so that every forked session starts with them loaded.
+_PRELOAD = [
+    "aider.main",
+    "aider.coders",
+    "aider.models",
+    "aider.repomap",
+    "aider.io",
+    "prompt_toolkit",
+]
+
+_MAX_FDS = 3
+
+
+def _preload() -> None:
+    for module in _PRELOAD:
+        try:
+            importlib.import_module(module)
+        except Exception as err:  # pylint: disable=broad-except
+            print(f"zygote: failed to preload {module}: {err}", flush=True)
+    try:
+        from aider.llm import litellm  # type: ignore
+
+        # litellm is wrapped in a lazy loader, force it now.
+        litellm._load_litellm()  # pylint: disable=protected-access
+    except Exception as err:  # pylint: disable=broad-except
+        print(f"zygote: failed to preload litellm: {err}", flush=True)
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        import resource
+
+        # Peak RSS, in KB on linux and bytes on macOS.
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def _recv_request(conn: socket.socket) -> tuple[dict, list[int]] | None:
+    """Reads a length prefixed json request, the fds ride on the first chunk.
+
+    Returns None when the client only connected to check that we are up.
+    """
+    data, fds, _, _ = socket.recv_fds(conn, 65536, _MAX_FDS)
+    if not data:
+        return None
+    if len(data) < 4:
+        raise ValueError("short request")
+    (size,) = struct.unpack("!I", data[:4])
+    body = data[4:]
+    while len(body) < size:
+        chunk = conn.recv(size - len(body))
+        if not chunk:
+            raise ValueError("truncated request")
+        body += chunk
+    return json.loads(body.decode("utf-8")), fds
+
+
+def _send_msg(conn: socket.socket, msg: dict) -> None:
+    try:
+        conn.sendall((json.dumps(msg) + "\n").encode("utf-8"))
+    except OSError:
+        pass  # client went away, nothing to report to
+
+
+def _run_session(request: dict, fds: list[int]) -> int:
+    """Runs in the forked child, never returns to the accept loop."""
+    os.setsid()
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD, signal.SIGHUP):
+        signal.signal(signum, signal.SIG_DFL)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    # The std streams were set up for the worker's log file, rebuild them
+    # against the client's terminal.
+    sys.stdin = io.TextIOWrapper(
+        io.FileIO(0, "r", closefd=False), encoding="utf-8", errors="replace"
+    )
+    sys.stdout = io.TextIOWrapper(
+        io.FileIO(1, "w", closefd=False),
+        encoding="utf-8",
+        errors="replace",
+        line_buffering=True,
+    )
+    sys.stderr = io.TextIOWrapper(
+        io.FileIO(2, "w", closefd=False),
+        encoding="utf-8",
+        errors="replace",
+        line_buffering=True,
+    )
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    argv: list[str] = request["argv"]
+    sys.argv = argv
+    from aider.main import main  # type: ignore
+
+    try:
+        rtn = main(argv[1:])
+    except SystemExit as err:
+        rtn = err.code if isinstance(err.code, int) else 1
+    except KeyboardInterrupt:
+        rtn = 130
+    except BaseException:  # pylint: disable=broad-except
+        import traceback
+
+        traceback.print_exc()
+        rtn = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return rtn if isinstance(rtn, int) else 0
+
+
+def serve(sock_path: str, idle_timeout: float, max_rss_mb: float) -> int:
+    # Held for the life of the worker, so only one worker serves a socket.
+    lock_file = open(  # pylint: disable=consider-using-with
+        sock_path + ".lock", "a+", encoding="utf-8"
+    )
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print("zygote: another worker owns this socket", flush=True)
+        return 0
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    # So "aicode.zygote stop" still removes the socket on the way out.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    _preload()
+    if os.path.exists(sock_path):
+        os.unlink(sock_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(sock_path)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+    print(f"zygote: ready pid={os.getpid()} rss={_rss_mb():.0f}MB", flush=True)
+
+    sessions: dict[int, socket.socket] = {}
+    last_active = time.monotonic()
+    try:
+        while True:
+            readable, _, _ = select.select([server], [], [], 0.5)
+            if readable:
+                conn, _ = server.accept()
+                try:
+                    received = _recv_request(conn)
+                except (OSError, ValueError) as err:
+                    print(f"zygote: bad request: {err}", flush=True)
+                    received = None
+                if received is None:
+                    conn.close()
+                    continue
+                request, fds = received
+                pid = os.fork()
+                if pid == 0:
+                    lock_file.close()
+                    server.close()
+                    for other in sessions.values():
+                        other.close()
+                    conn.close()
+                    os._exit(_run_session(request, fds))
+                for fd in fds:
+                    os.close(fd)
+                sessions[pid] = conn
+                _send_msg(conn, {"pid": pid})
+            while sessions:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                conn = sessions.pop(pid)
+                _send_msg(conn, {"exit": os.waitstatus_to_exitcode(status)})
+                conn.close()
+            if sessions:
+                last_active = time.monotonic()
+                continue
+            if time.monotonic() - last_active > idle_timeout:
+                print("zygote: idle timeout, exiting", flush=True)
+                return 0
+            if _rss_mb() > max_rss_mb:
+                print(f"zygote: rss {_rss_mb():.0f}MB over cap, exiting", flush=True)
+                return 0
+    finally:
+        server.close()
+        if os.path.exists(sock_path):
+            os.unlink(sock_path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Warm aider worker")
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--idle-timeout", type=float, default=30 * 60)
+    parser.add_argument("--max-rss-mb", type=float, default=1024)
+    args = parser.parse_args()
+    return serve(args.socket, args.idle_timeout, args.max_rss_mb)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
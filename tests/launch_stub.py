@@ -0,0 +1,55 @@
+"""
+A launch with everything stubbed out, for tests that run build_cmd_list.
+
+The install root, config storage, launch plans, prewarm state and the git
+repo are all made up in a temp directory, so nothing touches the real ones.
+"""
+
+import contextlib
+import io
+import os
+from pathlib import Path
+from typing import Iterator
+from unittest import mock
+
+from aicode import openaicfg
+from aicode.config import Config
+
+
+def make_repo(tmp: Path) -> Path:
+    repo = tmp / "repo"
+    (repo / ".git").mkdir(parents=True)
+    (repo / ".gitignore").write_text(
+        ".aider*\n!.aider.conf.yml\n!.aiderignore\n", encoding="utf-8"
+    )
+    (repo / ".aiderignore").write_text("run\n", encoding="utf-8")
+    return repo
+
+
+@contextlib.contextmanager
+def stubbed_launch(tmp: Path) -> Iterator[Path]:
+    """Runs the block in a made up repo under tmp, with a config that has
+    keys and an aider install that counts as installed. Yields the repo."""
+    repo = make_repo(tmp)
+    config = Config.from_dict({"anthropic_key": "sk-ant-test", "openai_key": "sk-test"})
+    (tmp / "install" / "0").mkdir(parents=True)
+    (tmp / "install" / "0" / "installed").touch()
+    old_cwd = Path.cwd()
+    patches: list[contextlib.AbstractContextManager] = [
+        mock.patch("aicode.build_cmd_list.Config.load", return_value=config),
+        mock.patch("aicode.build_cmd_list.aider_installed", return_value=True),
+        mock.patch("aicode.launch_plan.AIDER_INSTALL_PATH", tmp / "install"),
+        mock.patch("aicode.launch_plan.CONFIG_STORAGE_PATH", tmp / "config"),
+        mock.patch("aicode.launch_plan.LAUNCH_PLAN_PATH", tmp / "plans"),
+        mock.patch("aicode.prewarm.PREWARM_PATH", tmp / "prewarm"),
+        mock.patch.object(openaicfg, "STORAGE_PATH", tmp / "config"),
+        # build_cmd_list exports the keys, keep them out of this process.
+        mock.patch.dict(os.environ),
+    ]
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        os.chdir(repo)
+        stack.callback(os.chdir, old_cwd)
+        yield repo
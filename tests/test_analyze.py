@@ -0,0 +1,102 @@
+"""
+Unit test file.
+"""
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aicode import analyze
+
+
+def _write(root: Path, rel: str, data: bytes = b"x = 1\n") -> None:
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+class AnalyzeTester(unittest.TestCase):
+    """Flags what only costs context and keeps the hand written rules."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        _write(self.root, ".gitignore", b"build/\n")
+        _write(self.root, ".aiderignore", b"# mine\nscratch/\n")
+        _write(self.root, "src/app.py", b"print('hi')\n" * 100)
+        _write(self.root, "src/logo.png", b"\x89PNG")
+        _write(self.root, "src/blob.txt", b"abc\0def")
+        _write(self.root, "src/api_pb2.py", b"x = 1\n")
+        _write(
+            self.root,
+            "src/models.go",
+            b"// Code generated by protoc-gen-go. DO NOT EDIT.\npackage x\n",
+        )
+        _write(self.root, "src/big.py", b"#" * 3000)
+        _write(self.root, "third_party/lib/a.c", b"int a;\n")
+        _write(self.root, "build/out.js", b"x")
+        _write(self.root, "scratch/notes.md", b"x")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_analyze(self) -> None:
+        result = analyze.analyze_repo(self.root, max_file_kb=2, workers=4)
+        flagged = {f.path: f.reason for f in result.flagged}
+        self.assertEqual(
+            {
+                "src/logo.png": "binary",
+                "src/blob.txt": "binary",
+                "src/api_pb2.py": "generated",
+                "src/models.go": "generated",
+                "src/big.py": "oversized",
+                "third_party/": "vendored",
+            },
+            flagged,
+        )
+        # .gitignore, .aiderignore and what is under src, third_party isn't
+        # walked.
+        self.assertEqual(8, result.files)
+        self.assertEqual(["src", "."], [d.path for d in result.dirs])
+
+    def test_collapses_entries(self) -> None:
+        for i in range(12):
+            _write(self.root, f"assets/img/{i}.png", b"\x89PNG")
+            _write(self.root, f"assets/{i}.woff", b"font")
+            _write(self.root, f"static/{i}.png", b"\x89PNG")
+        _write(self.root, "static/app.js", b"run()\n")
+        result = analyze.analyze_repo(self.root, max_file_kb=2)
+        self.assertEqual(
+            [
+                "/assets/",
+                "/src/api_pb2.py",
+                "/src/big.py",
+                "/src/blob.txt",
+                "/src/logo.png",
+                "/src/models.go",
+                "/static/*.png",
+                "/third_party/",
+            ],
+            result.ignore_entries,
+        )
+
+    def test_merge_keeps_own_lines(self) -> None:
+        result = analyze.analyze_repo(self.root, max_file_kb=2)
+        analyze.write_aiderignore(self.root, result.ignore_entries)
+        lines = (self.root / ".aiderignore").read_text(encoding="utf-8").splitlines()
+        self.assertEqual(["# mine", "scratch/", ""], lines[:3])
+        self.assertIn("/third_party/", lines)
+
+        # A second run sees the same files and replaces its block.
+        (self.root / "src" / "logo.png").unlink()
+        result = analyze.analyze_repo(self.root, max_file_kb=2)
+        self.assertNotIn("/src/logo.png", result.ignore_entries)
+        analyze.write_aiderignore(self.root, result.ignore_entries)
+        text = (self.root / ".aiderignore").read_text(encoding="utf-8")
+        self.assertEqual(1, text.count("# Added by aicode analyze"))
+        self.assertNotIn("logo.png", text)
+        self.assertIn("scratch/", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Unit test file.
+"""
+
+import json
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aicode.batch import BatchRunner, load_manifest
+
+# Stands in for aicode: appends the message to notes.txt, or hangs.
+_FAKE_AICODE = """
+import sys, time
+message = open(sys.argv[sys.argv.index("--message-file") + 1]).read()
+assert "--yes-always" in sys.argv
+if message == "hang":
+    time.sleep(60)
+with open("notes.txt", "a") as file:
+    file.write(message)
+print("done", message)
+"""
+
+
+def _git(repo: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@test", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+class BatchTester(unittest.TestCase):
+    """Tests for aicode batch."""
+
+    def test_batch(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            repo = root / "repo"
+            repo.mkdir()
+            _git(repo, "init")
+            (repo / "README.md").write_text("hello", encoding="utf-8")
+            _git(repo, "add", "README.md")
+            _git(repo, "commit", "-m", "init")
+            (root / "edit.md").write_text("edit", encoding="utf-8")
+            (root / "hang.md").write_text("hang", encoding="utf-8")
+            jobs = [
+                {"id": "edit", "repo": "repo", "message_file": "edit.md"},
+                {"id": "hang", "repo": "repo", "message_file": "hang.md", "timeout": 1},
+                {"id": "missing", "repo": "nope", "message_file": "edit.md"},
+            ]
+            manifest = root / "manifest.jsonl"
+            manifest.write_text(
+                "\n".join(json.dumps(job) for job in jobs), encoding="utf-8"
+            )
+            fake = root / "fake_aicode.py"
+            fake.write_text(_FAKE_AICODE, encoding="utf-8")
+            report = root / "report.jsonl"
+            runner = BatchRunner(
+                report, workers=2, aicode_cmd=[sys.executable, str(fake)]
+            )
+            runner.run(load_manifest(manifest))
+            lines = report.read_text(encoding="utf-8").splitlines()
+            results = {r["id"]: r for r in map(json.loads, lines)}
+            self.assertEqual(3, len(results))
+            self.assertEqual(0, results["edit"]["returncode"])
+            self.assertEqual(["notes.txt"], results["edit"]["changed_files"])
+            self.assertIn("done edit", results["edit"]["log_tail"])
+            self.assertTrue(results["hang"]["timed_out"])
+            self.assertIsNone(results["hang"]["returncode"])
+            self.assertIsNotNone(results["missing"]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Unit test file.
+"""
+
+import json
+import os
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode.bench_models import (
+    EDIT_TASKS,
+    Endpoint,
+    _stream_request,
+    bench_endpoint,
+    default_endpoints,
+    measure_stream,
+    run_edit_task,
+)
+from aicode.stub_llm import StubConfig, StubServer
+
+# Stands in for aider: asks the endpoint from OPENAI_API_BASE for the
+# message and writes the files of the "whole" format reply.
+_FAKE_AIDER = """
+import json, os, re, sys, urllib.request
+message = sys.argv[sys.argv.index("--message") + 1]
+body = json.dumps({"model": "stub", "messages": [{"role": "user", "content": message}]}).encode()
+request = urllib.request.Request(os.environ["OPENAI_API_BASE"] + "/chat/completions", data=body)
+with urllib.request.urlopen(request) as response:
+    reply = json.loads(response.read())["choices"][0]["message"]["content"]
+for name, content in re.findall(r"^(\\S+)\\n```\\n(.*?)\\n```", reply, re.S | re.M):
+    with open(name, "w") as f:
+        f.write(content + "\\n")
+"""
+
+
+class BenchModelsTester(unittest.TestCase):
+    """Tests for the model benchmark and its stub server."""
+
+    def setUp(self) -> None:
+        config = StubConfig(
+            latency=0.2,
+            token_rate=200,
+            reply_tokens=40,
+            solutions={task.id: task.solution for task in EDIT_TASKS},
+        )
+        self.server = StubServer(config).start()
+
+    def tearDown(self) -> None:
+        self.server.stop()
+
+    def test_stream_openai_and_anthropic(self) -> None:
+        for endpoint in [
+            Endpoint("openai/stub", f"{self.server.url}/v1"),
+            Endpoint("anthropic/stub", self.server.url),
+        ]:
+            sample = measure_stream(endpoint, "sk-test")
+            self.assertGreaterEqual(sample.ttft, 0.2, endpoint.model)
+            self.assertLess(sample.ttft, 0.5, endpoint.model)
+            self.assertEqual(40, sample.tokens, endpoint.model)
+            tps = sample.tokens_per_second
+            assert tps is not None
+            # 200 tokens per second, give or take scheduling.
+            self.assertLess(tps, 260, endpoint.model)
+            self.assertGreater(tps, 100, endpoint.model)
+
+    def test_edit_tasks(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            fake_aider = Path(temp_dir) / "fake_aider.py"
+            fake_aider.write_text(_FAKE_AIDER, encoding="utf-8")
+            endpoint = Endpoint(
+                "openai/stub", f"{self.server.url}/v1", edit_format="whole"
+            )
+            sample = run_edit_task(
+                endpoint,
+                "sk-test",
+                EDIT_TASKS[0],
+                aider_cmd=[sys.executable, str(fake_aider)],
+            )
+            self.assertTrue(sample.success, sample.error)
+            report = bench_endpoint(
+                endpoint, runs=2, aider_cmd=[sys.executable, str(fake_aider)]
+            )
+        self.assertEqual([], report.errors)
+        self.assertEqual(1.0, report.success_rate)
+        assert report.ttft_p50 is not None
+        self.assertGreaterEqual(report.ttft_p50, 0.2)
+
+    def test_failed_check(self) -> None:
+        endpoint = Endpoint("openai/stub", f"{self.server.url}/v1")
+        # Exits 0 without touching anything.
+        sample = run_edit_task(
+            endpoint, None, EDIT_TASKS[0], aider_cmd=[sys.executable, "-c", "pass"]
+        )
+        self.assertFalse(sample.success)
+        self.assertIn("check failed", sample.error or "")
+
+    def test_default_endpoints(self) -> None:
+        from aicode.config import Config
+
+        keys = dict.fromkeys(
+            ["ANTHROPIC_API_KEY", "GEMINI_API_KEY", "DEEPSEEK_API_KEY"], ""
+        )
+        keys["OPENAI_API_KEY"] = "sk-test"
+        with (
+            mock.patch.dict(os.environ, keys),
+            mock.patch.object(Config, "load", return_value=Config()),
+        ):
+            self.assertEqual(
+                ["openai/gpt-4.1", "openai/o3"],
+                [e.model for e in default_endpoints()],
+            )
+            os.environ["DEEPSEEK_API_KEY"] = "sk-deepseek"
+            deepseek = default_endpoints()[-1]
+        self.assertEqual("deepseek/deepseek-chat", deepseek.model)
+        self.assertEqual("https://api.deepseek.com/v1", deepseek.api_base())
+
+    def test_openai_token_limit(self) -> None:
+        def _body(model: str) -> dict:
+            request = _stream_request(Endpoint(model), "sk-test", "hi", 10)
+            assert isinstance(request.data, bytes)
+            return json.loads(request.data)
+
+        self.assertEqual(10, _body("openai/o3")["max_completion_tokens"])
+        self.assertNotIn("max_tokens", _body("openai/o3"))
+        self.assertEqual(10, _body("deepseek/deepseek-chat")["max_tokens"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Unit test file.
+"""
+
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import openaicfg
+from aicode.config import Config
+
+# Each writer process sets its own field, many times, through a stale copy.
+_WRITER = """
+import sys
+from pathlib import Path
+from aicode import openaicfg
+from aicode.config import Config
+openaicfg.STORAGE_PATH = Path(sys.argv[1])
+config = Config.load()
+for i in range(int(sys.argv[3])):
+    setattr(config, sys.argv[2], str(i))
+    config.save()
+"""
+
+
+class ConfigStoreTester(unittest.TestCase):
+    """Tests for the cached, merging config store."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        self.storage_path = Path(self.temp_dir.name)
+        self.patch = mock.patch.object(openaicfg, "STORAGE_PATH", self.storage_path)
+        self.patch.start()
+        openaicfg.reload_storage()
+
+    def tearDown(self) -> None:
+        self.patch.stop()
+        openaicfg.reload_storage()
+        self.temp_dir.cleanup()
+
+    def test_stale_save_keeps_other_fields(self) -> None:
+        stale = Config.load()
+        fresh = Config.load()
+        fresh.openai_key = "sk-openai"
+        fresh.save()
+        stale.aider_update_failures = 3
+        stale.save()
+        config = Config.load()
+        self.assertEqual("sk-openai", config.openai_key)
+        self.assertEqual(3, config.aider_update_failures)
+
+    def test_cached_until_the_file_changes(self) -> None:
+        Config(openai_key="a").save()
+        fernet = openaicfg._get_storage().fernet
+        with mock.patch.object(fernet, "decrypt", wraps=fernet.decrypt) as decrypt:
+            for _ in range(5):
+                self.assertEqual("a", Config.load().openai_key)
+            # Our own write updates the cache too.
+            openaicfg.update_config({"openai_key": "b"})
+            self.assertEqual("b", Config.load().openai_key)
+            self.assertEqual(0, decrypt.call_count)
+            # As if another process wrote it.
+            openaicfg.reload_storage()
+            self.assertEqual("b", Config.load().openai_key)
+            self.assertEqual(1, decrypt.call_count)
+        self.assertEqual(
+            ["config.lock", "secrets.enc"],
+            sorted(p.name for p in self.storage_path.iterdir()),
+        )
+
+    def test_batch_is_one_write(self) -> None:
+        with mock.patch.object(
+            openaicfg, "_write_secrets", wraps=openaicfg._write_secrets
+        ) as write:
+            with openaicfg.batch_updates():
+                openaicfg.update_config({"openai_key": "a"})
+                openaicfg.update_config({"gemini_key": "g"})
+                self.assertEqual(0, write.call_count)
+            self.assertEqual(1, write.call_count)
+        config = Config.load()
+        self.assertEqual(("a", "g"), (config.openai_key, config.gemini_key))
+
+    def test_concurrent_processes(self) -> None:
+        fields = ["openai_key", "anthropic_key", "gemini_key"]
+        procs = [
+            subprocess.Popen(
+                [sys.executable, "-c", _WRITER, str(self.storage_path), name, "20"]
+            )
+            for name in fields
+        ]
+        for proc in procs:
+            self.assertEqual(0, proc.wait(timeout=120))
+        config = Config.load()
+        for name in fields:
+            self.assertEqual("19", getattr(config, name), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Unit test file.
+"""
+
+import os
+import stat
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import cred_agent, openaicfg
+from aicode.config import Config
+
+
+@unittest.skipUnless(
+    cred_agent.is_supported(), "the credential agent needs unix sockets"
+)
+class CredAgentTester(unittest.TestCase):
+    """Runs a credential agent against a temporary config store."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        root = Path(self.temp_dir.name)
+        self.storage_path = root / "config"
+        self.patches = [
+            mock.patch.object(openaicfg, "STORAGE_PATH", self.storage_path),
+            mock.patch.object(cred_agent, "CRED_AGENT_PATH", root / "agent"),
+            mock.patch.object(openaicfg, "CRED_AGENT_PATH", root / "agent"),
+        ]
+        for patch in self.patches:
+            patch.start()
+        openaicfg.reload_storage()
+        Config(openai_key="sk-first").save()
+
+    def tearDown(self) -> None:
+        if cred_agent.stop_agent():
+            self.proc.wait(timeout=30)
+        for patch in self.patches:
+            patch.stop()
+        openaicfg.reload_storage()
+        self.temp_dir.cleanup()
+
+    def _start(self, idle_timeout: float = 60) -> None:
+        self.proc = cred_agent.start_agent(idle_timeout)
+        self.assertTrue(cred_agent.wait_for_agent())
+
+    def test_serves_fresh_config(self) -> None:
+        self._start()
+        sock_path = cred_agent.socket_path()
+        self.assertEqual(0o600, stat.S_IMODE(sock_path.stat().st_mode))
+        self.assertEqual(0o700, stat.S_IMODE(sock_path.parent.stat().st_mode))
+        openaicfg.reload_storage()
+        with mock.patch.object(openaicfg, "_read_secrets") as read_secrets:
+            self.assertEqual("sk-first", Config.load().openai_key)
+            read_secrets.assert_not_called()
+        # Saved by another process, the agent sees it on the next request.
+        Config(openai_key="sk-second").save()
+        openaicfg.reload_storage()
+        self.assertEqual("sk-second", Config.load().openai_key)
+        status = cred_agent.agent_status()
+        assert status is not None
+        self.assertEqual(2, status["served"])
+        self.assertGreater(status["direct_seconds"], status["serve_seconds_mean"])
+        self.assertGreater(status["saved_seconds"], 0)
+
+    def test_falls_back_without_agent(self) -> None:
+        self.assertIsNone(cred_agent.fetch_config())
+        openaicfg.reload_storage()
+        self.assertEqual("sk-first", Config.load().openai_key)
+
+    def test_idle_expiry(self) -> None:
+        self._start(idle_timeout=0.5)
+        self.assertEqual(0, self.proc.wait(timeout=30))
+        self.assertFalse(cred_agent.socket_path().exists())
+        self.assertIsNone(cred_agent.fetch_config())
+
+    def test_stop(self) -> None:
+        self._start()
+        self.assertTrue(cred_agent.stop_agent())
+        self.assertEqual(0, self.proc.wait(timeout=30))
+        self.assertFalse(cred_agent.socket_path().exists())
+
+    def test_stop_ignores_stale_pid(self) -> None:
+        self._start(idle_timeout=0.5)
+        self.proc.wait(timeout=30)
+        # The agent's pid, reused by now by some other process.
+        lock_path = Path(str(cred_agent.socket_path()) + ".lock")
+        lock_path.write_text(str(os.getpid()), encoding="utf-8")
+        with mock.patch.object(os, "kill") as kill:
+            self.assertFalse(cred_agent.stop_agent())
+        kill.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
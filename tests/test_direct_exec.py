@@ -0,0 +1,85 @@
+"""
+Unit test file.
+"""
+
+import json
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aicode.aider_control import get_venv_bin, get_venv_python
+from aicode.direct_exec import _SUPERVISOR_SCRIPT, resolve_aider
+
+
+class DirectExecTester(unittest.TestCase):
+    """Tests for the direct-exec launch path."""
+
+    def test_supervisor_cleans_up(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            history = Path(temp_dir) / ".aider.chat.history.md"
+            history.write_text("chat", encoding="utf-8")
+            cp = subprocess.run(
+                [
+                    sys.executable,
+                    "-S",
+                    "-E",
+                    str(_SUPERVISOR_SCRIPT),
+                    "--remove",
+                    str(history),
+                    "--",
+                    sys.executable,
+                    "-c",
+                    "import sys; sys.exit(5)",
+                ],
+                check=False,
+            )
+            self.assertEqual(5, cp.returncode)
+            self.assertFalse(history.exists())
+
+    def test_supervisor_runs_then(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            marker = Path(temp_dir) / "archived"
+            then = [
+                sys.executable,
+                "-c",
+                "import sys; open(sys.argv[1], 'w').close()",
+                str(marker),
+            ]
+            cp = subprocess.run(
+                [
+                    sys.executable,
+                    "-S",
+                    "-E",
+                    str(_SUPERVISOR_SCRIPT),
+                    "--then",
+                    json.dumps(then),
+                    "--",
+                    sys.executable,
+                    "-c",
+                    "pass",
+                ],
+                check=False,
+            )
+            self.assertEqual(0, cp.returncode)
+            self.assertTrue(marker.exists())
+
+    def test_resolution_is_cached(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            install_path = Path(temp_dir)
+            self.assertIsNone(resolve_aider(install_path))
+            get_venv_bin(install_path).mkdir(parents=True)
+            get_venv_python(install_path).touch()
+            (get_venv_bin(install_path) / "aider").touch()
+            (install_path / "installed").touch()
+            resolution = resolve_aider(install_path)
+            assert resolution is not None
+            self.assertTrue((install_path / "resolved.json").exists())
+            # Served from the cache even once the breadcrumb is gone.
+            (install_path / "installed").unlink()
+            self.assertEqual(resolution, resolve_aider(install_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Unit test file.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import fanout
+from aicode.fanout import (
+    CONFLICT,
+    MERGED,
+    NO_CHANGES,
+    group_by_directory,
+    group_by_globs,
+    run_fanout,
+)
+
+# Stands in for aicode: appends a line naming the worktree to every file
+# listed in the message.
+_FAKE_AICODE = """
+import os, sys
+# aicode's own edits of the repo it launches in.
+with open(".gitignore", "a") as file:
+    file.write(".aider*\\n")
+open(".aiderignore", "w").close()
+print("session of", os.path.basename(os.getcwd()))
+message = open(sys.argv[sys.argv.index("--message-file") + 1]).read()
+for line in message.splitlines():
+    if line.startswith("- ") and "skip" not in line:
+        with open(line[2:], "a") as file:
+            file.write("edited in " + os.path.basename(os.getcwd()) + "\\n")
+"""
+
+
+def _git(repo: Path, *args: str) -> str:
+    cp = subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@test", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return cp.stdout
+
+
+class FanoutTester(unittest.TestCase):
+    """Tests for fanning a task out over worktrees."""
+
+    def _make_repo(self, root: Path) -> Path:
+        repo = root / "repo"
+        for name in ["a/one.txt", "b/two.txt", "skip/three.txt", "top.txt"]:
+            (repo / name).parent.mkdir(parents=True, exist_ok=True)
+            (repo / name).write_text("start\n", encoding="utf-8")
+        _git(repo, "init")
+        _git(repo, "add", "-A")
+        _git(repo, "commit", "-m", "init")
+        return repo
+
+    def test_grouping(self) -> None:
+        files = ["a/one.txt", "a/x/two.txt", "b/three.txt", "top.txt"]
+        groups = {g.name: g.files for g in group_by_directory(files)}
+        self.assertEqual(["a/one.txt", "a/x/two.txt"], groups["a"])
+        self.assertEqual(["top.txt"], groups["."])
+        globs = group_by_globs(files, ["*.txt", "b/*", "none/*"])
+        self.assertEqual(["*.txt", "b/*"], [g.name for g in globs])
+
+    @mock.patch.dict(
+        os.environ,
+        {
+            "GIT_AUTHOR_NAME": "test",
+            "GIT_AUTHOR_EMAIL": "test@test",
+            "GIT_COMMITTER_NAME": "test",
+            "GIT_COMMITTER_EMAIL": "test@test",
+        },
+    )
+    def test_fanout_merges_and_reports_conflicts(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            repo = self._make_repo(root)
+            fake = root / "fake_aicode.py"
+            fake.write_text(_FAKE_AICODE, encoding="utf-8")
+            files = _git(repo, "ls-files").split()
+            fanout_path = root / "fanout"
+            # top.txt is in both glob groups, so the second merge conflicts.
+            groups = group_by_directory(files) + group_by_globs(files, ["top*"])
+            with mock.patch.object(fanout, "FANOUT_PATH", fanout_path):
+                results = run_fanout(
+                    repo,
+                    "Add a line",
+                    groups,
+                    workers=3,
+                    aicode_cmd=[sys.executable, str(fake)],
+                )
+            status = {r.group: r.status for r in results}
+            self.assertEqual(MERGED, status["a"])
+            self.assertEqual(MERGED, status["b"])
+            self.assertEqual(NO_CHANGES, status["skip"])
+            self.assertEqual(MERGED, status["."])
+            self.assertEqual(CONFLICT, status["top*"])
+            conflict = [r for r in results if r.status == CONFLICT][0]
+            self.assertEqual(["top.txt"], conflict.conflicts)
+            # A group failed, so its log outlives the run.
+            assert conflict.log_file is not None
+            self.assertTrue(Path(conflict.log_file).is_relative_to(fanout_path))
+            self.assertIn("session of", Path(conflict.log_file).read_text())
+            # aicode's .gitignore and .aiderignore edits stay out of the branches.
+            self.assertFalse((repo / ".gitignore").exists())
+            self.assertFalse((repo / ".aiderignore").exists())
+            self.assertIn("edited in", (repo / "a/one.txt").read_text(encoding="utf-8"))
+            # Merged branches and all worktrees are gone, the conflict's branch stays.
+            branches = _git(repo, "branch", "--list", "aicode/*").split()
+            self.assertEqual([conflict.branch], branches)
+            self.assertEqual(1, len(_git(repo, "worktree", "list").splitlines()))
+            self.assertEqual("", _git(repo, "status", "--porcelain"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Unit test file.
+"""
+
+import os
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import history
+
+
+def _session(started: str, prompt: str) -> str:
+    return f"\n# aider chat started at {started}\n\n> aider --model x\n\n#### {prompt}\n\nDone, {prompt}.\n"
+
+
+def _inputs(*entries: tuple[str, str]) -> str:
+    return "".join(f"\n# {stamp}\n+{text}\n" for stamp, text in entries)
+
+
+class HistoryArchiveTester(unittest.TestCase):
+    """Sessions move into the archive and come back out."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name) / "repo"
+        self.root.mkdir()
+        self.archive = history.HistoryArchive(
+            self.root, archive_dir=Path(self.temp_dir.name) / "archive"
+        )
+        chat = _session("2025-01-01 10:00:00", "add tests") + _session(
+            "2025-01-02 10:00:00", "fix lint"
+        )
+        (self.root / history.CHAT_HISTORY).write_text(chat, encoding="utf-8")
+        inputs = _inputs(
+            ("2025-01-01 10:01:00.5", "add tests"),
+            ("2025-01-02 10:01:00.5", "fix lint"),
+        )
+        (self.root / history.INPUT_HISTORY).write_text(inputs, encoding="utf-8")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_archive_and_restore(self) -> None:
+        added = self.archive.archive()
+        self.assertEqual(["20250101-100000", "20250102-100000"], [s.id for s in added])
+        self.assertEqual(["add tests", "fix lint"], [s.title for s in added])
+        self.assertFalse((self.root / history.CHAT_HISTORY).exists())
+        self.assertFalse((self.root / history.INPUT_HISTORY).exists())
+        data = self.archive.load(added[1])
+        self.assertIn("#### fix lint", data["chat"])
+        self.assertIn("+fix lint", data["inputs"])
+        self.assertNotIn("add tests", data["inputs"])
+
+        self.assertEqual(2, self.archive.restore(self.archive.sessions()))
+        chat = (self.root / history.CHAT_HISTORY).read_text(encoding="utf-8")
+        self.assertLess(chat.index("add tests"), chat.index("fix lint"))
+        inputs = (self.root / history.INPUT_HISTORY).read_text(encoding="utf-8")
+        self.assertEqual(
+            ["+add tests", "+fix lint"],
+            [line for line in inputs.splitlines() if line.startswith("+")],
+        )
+        # Already archived, nothing is added twice.
+        self.assertEqual([], self.archive.archive())
+        self.assertEqual(2, len(self.archive.sessions()))
+
+    def test_keep_leaves_last_session(self) -> None:
+        self.archive.archive(keep=True)
+        chat = (self.root / history.CHAT_HISTORY).read_text(encoding="utf-8")
+        self.assertNotIn("add tests", chat)
+        self.assertIn("fix lint", chat)
+        with open(self.root / history.CHAT_HISTORY, "a", encoding="utf-8") as f:
+            f.write(_session("2025-01-03 10:00:00", "bump version"))
+        self.assertEqual(
+            ["20250103-100000"], [s.id for s in self.archive.archive(keep=True)]
+        )
+
+    def test_caps(self) -> None:
+        self.archive.archive()
+        sessions = self.archive.sessions()
+        capped = history.HistoryArchive(
+            self.root, max_bytes=sessions[-1].stored_bytes, archive_dir=self.archive.dir
+        )
+        (self.root / history.CHAT_HISTORY).write_text(
+            _session("2025-01-03 10:00:00", "bump"), encoding="utf-8"
+        )
+        capped.archive()
+        self.assertEqual(["20250103-100000"], [s.id for s in capped.sessions()])
+        self.assertEqual(
+            ["20250103-100000.json.gz"], sorted(p.name for p in capped.dir.glob("*.gz"))
+        )
+
+        old = time.time() - 400 * 24 * 60 * 60
+        aged = history.HistoryArchive(
+            self.root, max_age_days=365, archive_dir=self.archive.dir
+        )
+        with mock.patch.object(history.time, "time", return_value=old):
+            (self.root / history.CHAT_HISTORY).write_text(
+                _session("2024-01-01 10:00:00", "old"), encoding="utf-8"
+            )
+            aged.archive()
+        aged.archive()
+        self.assertNotIn("20240101-100000", [s.id for s in aged.sessions()])
+
+    def test_disabled(self) -> None:
+        with mock.patch.dict(os.environ, {"AICODE_NO_HISTORY_ARCHIVE": "1"}):
+            self.assertFalse(history.archive_enabled())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+"""
+Unit test file.
+"""
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import history, history_search
+
+_CHAT = """
+# aider chat started at {started}
+
+> aider --model {model}
+> Aider v0.86.2
+> Main model: {model} with diff edit format
+
+#### {prompt}
+#### and keep it short
+
+{response}
+
+> Applied edit to {file}
+
+#### /ask what changed?
+
+Only {file}.
+"""
+
+
+def _write_session(
+    root: Path, started: str, model: str, prompt: str, response: str, file: str
+) -> None:
+    chat = _CHAT.format(
+        started=started, model=model, prompt=prompt, response=response, file=file
+    )
+    with open(root / history.CHAT_HISTORY, "a", encoding="utf-8") as f:
+        f.write(chat)
+
+
+class HistorySearchTester(unittest.TestCase):
+    """Archived sessions of several repos end up searchable."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        tmp = Path(self.temp_dir.name)
+        self.history_path = tmp / "history"
+        self.conn = history_search.connect(tmp / "history.sqlite3")
+        self.archives = []
+        for name, sessions in {
+            "webapp": [
+                (
+                    "2025-02-01 09:00:00",
+                    "gpt-4o",
+                    "fix the login redirect loop",
+                    "Changed the session cookie path.",
+                    "auth/login.py",
+                ),
+                (
+                    "2025-03-01 09:00:00",
+                    "sonnet",
+                    "add a retry to the upload",
+                    "Wrapped upload in a retry loop.",
+                    "upload.py",
+                ),
+            ],
+            "parser": [
+                (
+                    "2025-02-15 09:00:00",
+                    "sonnet",
+                    "speed up the tokenizer",
+                    "Precompiled the regexes.",
+                    "lexer.py",
+                ),
+            ],
+        }.items():
+            root = tmp / name
+            root.mkdir()
+            for session in sessions:
+                _write_session(root, *session)
+            archive = history.HistoryArchive(root, archive_dir=self.history_path / name)
+            archive.archive()
+            self.archives.append(archive)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        self.temp_dir.cleanup()
+
+    def test_parse_chat(self) -> None:
+        chat = _CHAT.format(
+            started="2025-01-01 00:00:00",
+            model="gpt-4o",
+            prompt="rename foo",
+            response="Renamed.",
+            file="a.py",
+        )
+        model, turns = history_search.parse_chat(chat)
+        self.assertEqual("gpt-4o", model)
+        self.assertEqual(
+            ["rename foo\nand keep it short", "/ask what changed?"],
+            [t.prompt for t in turns],
+        )
+        self.assertEqual("Renamed.", turns[0].response)
+        self.assertEqual(["a.py"], turns[0].files)
+
+    def test_search(self) -> None:
+        self.assertEqual(3, history_search.index_pending(self.conn, self.history_path))
+        self.assertEqual(0, history_search.index_pending(self.conn, self.history_path))
+
+        hits = history_search.search(self.conn, history_search.fts_query("retry loop"))
+        self.assertEqual(["20250301-090000"], [h.session for h in hits])
+        self.assertEqual(
+            ("sonnet", 1, "upload.py"), (hits[0].model, hits[0].turn, hits[0].files)
+        )
+        self.assertIn("[retry]", hits[0].snippet)
+
+        # Porter stemming, "regexes" finds "regex".
+        self.assertEqual(
+            1, len(history_search.search(self.conn, history_search.fts_query("regex")))
+        )
+        loop = history_search.fts_query("loop")
+        self.assertEqual(2, len(history_search.search(self.conn, loop)))
+        self.assertEqual(1, len(history_search.search(self.conn, loop, model="gpt")))
+        self.assertEqual(0, len(history_search.search(self.conn, loop, repo="parser")))
+        self.assertEqual(
+            1, len(history_search.search(self.conn, loop, since="2025-02-10"))
+        )
+        self.assertEqual(
+            1, len(history_search.search(self.conn, loop, until="2025-02-01"))
+        )
+        # Files are searchable too, and weigh more than a mention.
+        hits = history_search.search(self.conn, history_search.fts_query("lexer"))
+        self.assertEqual(
+            [("20250215-090000", 1), ("20250215-090000", 2)],
+            [(h.session, h.turn) for h in hits],
+        )
+
+    def test_pruned_sessions_leave_the_index(self) -> None:
+        history_search.index_pending(self.conn, self.history_path)
+        webapp = self.archives[0]
+        webapp.max_bytes = 0
+        webapp.archive()
+        history_search.index_pending(self.conn, self.history_path)
+        self.assertEqual(
+            0, len(history_search.search(self.conn, history_search.fts_query("login")))
+        )
+        self.assertEqual(
+            1,
+            len(
+                history_search.search(self.conn, history_search.fts_query("tokenizer"))
+            ),
+        )
+
+    def test_exit_hook_indexes_in_background(self) -> None:
+        root = Path(self.temp_dir.name) / "webapp"
+        _write_session(
+            root,
+            "2025-04-01 09:00:00",
+            "gpt-4o",
+            "bump deps",
+            "Bumped.",
+            "pyproject.toml",
+        )
+        with (
+            mock.patch.object(history, "HISTORY_PATH", self.history_path),
+            mock.patch.object(history_search, "start_indexing") as start,
+        ):
+            with mock.patch.object(
+                history, "archive_dir_for", return_value=self.archives[0].dir
+            ):
+                history.archive_on_exit(root, keep=False)
+        start.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
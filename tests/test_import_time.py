@@ -0,0 +1,70 @@
+"""
+Unit test file.
+"""
+
+import subprocess
+import sys
+import unittest
+
+# Cumulative import time budget for the aicode modules on the --help path,
+# in microseconds. Generous so that slow CI runners don't flake.
+IMPORT_BUDGET_US = 150_000
+
+# These must never be imported on a fast path.
+HEAVY_MODULES = [
+    "iso_env",
+    "semi_secret",
+    "cryptography",
+    "aicode.aider_control",
+    "aicode.background",
+    "aicode.build_cmd_list",
+    "aicode.openaicfg",
+]
+
+_SCRIPT = (
+    "import sys\n"
+    "from aicode.__main__ import main\n"
+    "sys.argv = ['aicode'] + sys.argv[1:]\n"
+    "sys.exit(main())\n"
+)
+
+
+def _import_times(*argv: str) -> dict[str, int]:
+    """Runs aicode under -X importtime, returns module -> cumulative us."""
+    cp = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SCRIPT, *argv],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    out: dict[str, int] = {}
+    for line in cp.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header line
+        out[parts[2].strip()] = int(parts[1])
+    return out
+
+
+class ImportTimeTester(unittest.TestCase):
+    """Enforces the import time budget of the entry point."""
+
+    def _check_fast_path(self, *argv: str) -> None:
+        times = _import_times(*argv)
+        self.assertIn("aicode.cli", times)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times, f"{module} imported by {argv}")
+        total = times["aicode.cli"]
+        self.assertLess(total, IMPORT_BUDGET_US, f"aicode.cli import took {total}us")
+
+    def test_help(self) -> None:
+        self._check_fast_path("--help")
+
+    def test_bad_args(self) -> None:
+        self._check_fast_path("--model", "not-a-model")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Unit test file.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aicode.install_gc import active_leases, collect_garbage, write_lease
+from aicode.install_manifest import load_manifest
+
+
+class InstallGcTester(unittest.TestCase):
+    """Tests for collecting stale install generations."""
+
+    def _make_generation(self, root: Path, name: str, payload: bytes) -> None:
+        (root / name / "lib").mkdir(parents=True)
+        (root / name / "lib" / "module.py").write_bytes(payload)
+        (root / name / "installed").touch()
+
+    def test_retention_and_dedup(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            for name in ["0", "1", "2", "3"]:
+                self._make_generation(root, name, b"x" * 4096)
+            report = collect_garbage(root, keep=2)
+            self.assertEqual(["0", "1"], report.deleted)
+            self.assertEqual(
+                ["2", "3"], sorted(p.name for p in root.iterdir() if p.name.isdigit())
+            )
+            self.assertEqual(["2", "3"], sorted(load_manifest(root).generations))
+            self.assertEqual(1, report.deduped_files)
+            self.assertEqual(4096, report.deduped_bytes)
+            st2 = (root / "2" / "lib" / "module.py").stat()
+            st3 = (root / "3" / "lib" / "module.py").stat()
+            self.assertEqual(st2.st_ino, st3.st_ino)
+            # A second run has nothing left to do.
+            self.assertEqual(0, collect_garbage(root, keep=2).reclaimed_bytes)
+
+    def test_leased_generation_is_kept(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            for name in ["0", "1"]:
+                self._make_generation(root, name, name.encode("utf-8"))
+            write_lease(root / "0")
+            report = collect_garbage(root, keep=1)
+            self.assertEqual([], report.deleted)
+            self.assertEqual(["0"], report.skipped_in_use)
+            self.assertTrue((root / "0").exists())
+
+    def test_dead_lease_is_pruned(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            generation = Path(temp_dir)
+            dead = subprocess.Popen([sys.executable, "-c", "pass"])
+            dead.wait()
+            write_lease(generation, dead.pid)
+            write_lease(generation)
+            self.assertEqual([os.getpid()], active_leases(generation))
+            self.assertFalse((generation / "leases" / str(dead.pid)).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
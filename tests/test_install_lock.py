@@ -0,0 +1,103 @@
+"""
+Unit test file.
+"""
+
+import multiprocessing
+import socket
+import subprocess
+import sys
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import aider_control
+from aicode.install_lock import OWNER_FILE, InstallOwner, read_owner, write_owner
+from aicode.install_manifest import (
+    STATUS_FAILED,
+    STATUS_INSTALLED,
+    load_manifest,
+)
+
+_WORKERS = 8
+
+
+class _FakeIsoEnv:
+    """Stands in for iso-env, a slow build that logs itself."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def run(self, cmd_list: list[str], **process_args) -> subprocess.CompletedProcess:
+        if not (self.path / "built").exists():
+            with open(self.path.parent / "builds.log", "a", encoding="utf-8") as f:
+                f.write(f"{self.path.name}\n")
+            time.sleep(0.5)
+            (self.path / "built").touch()
+        return subprocess.CompletedProcess(cmd_list, 0)
+
+
+def _run_aider(root: str) -> int:
+    with mock.patch.object(aider_control, "get_iso_env", _FakeIsoEnv):
+        return aider_control.aider_run(
+            ["aider", "--version"], path=Path(root)
+        ).returncode
+
+
+class InstallLockTester(unittest.TestCase):
+    """Concurrent installs into one root build a single generation."""
+
+    @unittest.skipIf(sys.platform == "win32", "needs fork")
+    def test_concurrent_runs_install_once(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir) / "aider"
+            ctx = multiprocessing.get_context("fork")
+            with ctx.Pool(_WORKERS) as pool:
+                codes = pool.map(_run_aider, [str(root)] * _WORKERS)
+            self.assertEqual([0] * _WORKERS, codes)
+            self.assertEqual(
+                ["0"], (root / "builds.log").read_text(encoding="utf-8").split()
+            )
+            manifest = load_manifest(root)
+            self.assertEqual("0", manifest.active)
+            self.assertEqual(
+                {"0": STATUS_INSTALLED},
+                {n: g.status for n, g in manifest.generations.items()},
+            )
+            self.assertFalse((root / OWNER_FILE).exists())
+
+    def test_crashed_install_is_reclaimed(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            aider_control._reserve_next_install_path(root)
+            # The pid of a process that has exited.
+            proc = subprocess.Popen([sys.executable, "-c", "pass"])
+            proc.wait()
+            owner = InstallOwner(
+                pid=proc.pid,
+                host=socket.gethostname(),
+                started=time.time(),
+                generation="0",
+            )
+            write_owner(root, owner)
+            stale = read_owner(root)
+            assert stale is not None
+            self.assertTrue(stale.is_dead())
+            with mock.patch.object(aider_control, "get_iso_env", _FakeIsoEnv):
+                path = aider_control.ensure_installed(root)
+            self.assertEqual(root / "1", path)
+            manifest = load_manifest(root)
+            self.assertEqual(STATUS_FAILED, manifest.generations["0"].status)
+            self.assertEqual(STATUS_INSTALLED, manifest.generations["1"].status)
+            self.assertIsNone(read_owner(root))
+            # Installed now, nothing is built again.
+            with mock.patch.object(aider_control, "get_iso_env", _FakeIsoEnv):
+                self.assertEqual(root / "1", aider_control.ensure_installed(root))
+            self.assertEqual(
+                ["1"], (root / "builds.log").read_text(encoding="utf-8").split()
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
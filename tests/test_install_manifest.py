@@ -0,0 +1,73 @@
+"""
+Unit test file.
+"""
+
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aicode.aider_control import (
+    _get_highest_version_path,
+    _get_next_install_path,
+    _get_path,
+    _reserve_next_install_path,
+)
+from aicode.install_manifest import (
+    MANIFEST_FILE,
+    STATUS_FAILED,
+    STATUS_INSTALLING,
+    load_manifest,
+)
+
+
+class InstallManifestTester(unittest.TestCase):
+    """Tests for the install generation manifest."""
+
+    def _make_generation(self, root: Path, name: str, installed: bool) -> None:
+        (root / name).mkdir(parents=True)
+        if installed:
+            (root / name / "installed").touch()
+
+    def test_missing_root(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir) / "does-not-exist"
+            self.assertEqual(root, _get_highest_version_path(root))
+            self.assertEqual(root / "0", _get_next_install_path(root))
+
+    def test_rebuild_from_scan(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            self._make_generation(root, "0", installed=True)
+            self._make_generation(root, "1", installed=True)
+            self._make_generation(root, "2", installed=False)
+            self.assertEqual(root / "1", _get_highest_version_path(root))
+            self.assertEqual(root / "3", _get_next_install_path(root))
+            manifest = load_manifest(root)
+            self.assertEqual(STATUS_FAILED, manifest.generations["2"].status)
+            self.assertTrue((root / MANIFEST_FILE).exists())
+            # An install root given as a path resolves to its active generation.
+            self.assertEqual(root / "1", _get_path(root))
+
+    def test_corrupt_manifest_recovers(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            self._make_generation(root, "0", installed=True)
+            (root / MANIFEST_FILE).write_text("{not json", encoding="utf-8")
+            self.assertEqual(root / "0", _get_highest_version_path(root))
+            data = json.loads((root / MANIFEST_FILE).read_text(encoding="utf-8"))
+            self.assertEqual("0", data["active"])
+
+    def test_reserve_never_reuses(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            first = _reserve_next_install_path(root)
+            second = _reserve_next_install_path(root)
+            self.assertEqual([root / "0", root / "1"], [first, second])
+            manifest = load_manifest(root)
+            self.assertEqual(STATUS_INSTALLING, manifest.generations["1"].status)
+            self.assertIsNone(manifest.active)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Unit test file.
+"""
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from aicode.args import Args
+from aicode.launch_plan import (
+    LaunchPlan,
+    compute_launch_key,
+    load_launch_plan,
+    save_launch_plan,
+)
+
+
+class LaunchPlanTester(unittest.TestCase):
+    """Tests for the persisted launch plan cache."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory(ignore_cleanup_errors=True)
+        root = Path(self.temp_dir.name)
+        self.repo = root / "repo"
+        (self.repo / ".git").mkdir(parents=True)
+        (self.repo / ".gitignore").write_text(".aider*\n", encoding="utf-8")
+        install_path = root / "install"
+        (install_path / "0").mkdir(parents=True)
+        (install_path / "0" / "installed").touch()
+        self.patches = [
+            patch("aicode.launch_plan.AIDER_INSTALL_PATH", install_path),
+            patch("aicode.launch_plan.CONFIG_STORAGE_PATH", root / "config"),
+            patch("aicode.launch_plan.LAUNCH_PLAN_PATH", root / "plans"),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self) -> None:
+        for p in self.patches:
+            p.stop()
+        self.temp_dir.cleanup()
+
+    def _make_plan(self, key: str) -> LaunchPlan:
+        return LaunchPlan(
+            key=key,
+            git_root=str(self.repo),
+            cmd_list=["aider", "--no-check-update", "--watch"],
+            env={"AIDER_MODEL": "openai/gpt-4.1", "OPENAI_API_KEY": "sk-test"},
+            gui_index=2,
+        )
+
+    def test_roundtrip(self) -> None:
+        args = Args()
+        key = compute_launch_key(args, cwd=self.repo)
+        assert key is not None
+        save_launch_plan(self._make_plan(key), cwd=self.repo)
+        plan = load_launch_plan(key, cwd=self.repo)
+        self.assertIsNotNone(plan)
+        assert plan is not None
+        self.assertEqual(["aider", "--no-check-update", "--watch"], plan.cmd_list)
+        self.assertEqual("sk-test", plan.env["OPENAI_API_KEY"])
+        # The resolved keys never hit the disk in the clear.
+        plan_files = list(Path(self.temp_dir.name, "plans").glob("*.plan"))
+        self.assertEqual(1, len(plan_files))
+        self.assertNotIn(b"sk-test", plan_files[0].read_bytes())
+
+    def test_invalidated_by_inputs(self) -> None:
+        args = Args()
+        key = compute_launch_key(args, cwd=self.repo)
+        self.assertNotEqual(key, compute_launch_key(Args(keep=True), cwd=self.repo))
+        (self.repo / ".aiderignore").write_text("run\n", encoding="utf-8")
+        self.assertNotEqual(key, compute_launch_key(args, cwd=self.repo))
+
+    def test_config_change_drops_plans(self) -> None:
+        other = self.repo / "sub"
+        other.mkdir()
+        config = Path(self.temp_dir.name, "config")
+        config.mkdir()
+        (config / "secrets.enc").write_bytes(b"old keys")
+        save_launch_plan(self._make_plan("a"), cwd=self.repo)
+        save_launch_plan(self._make_plan("b"), cwd=other)
+        plans = Path(self.temp_dir.name, "plans")
+        self.assertEqual(2, len(list(plans.glob("*.plan"))))
+        # A key change: the next plan saved is the only one left.
+        (config / "secrets.enc").write_bytes(b"the new keys")
+        save_launch_plan(self._make_plan("c"), cwd=self.repo)
+        self.assertEqual(1, len(list(plans.glob("*.plan"))))
+        self.assertIsNone(load_launch_plan("b", cwd=other))
+        self.assertIsNotNone(load_launch_plan("c", cwd=self.repo))
+
+    def test_state_changing_args_not_cached(self) -> None:
+        self.assertIsNone(compute_launch_key(Args(upgrade=True), cwd=self.repo))
+        self.assertIsNone(compute_launch_key(Args(set_key="sk"), cwd=self.repo))
+
+
+if __name__ == "__main__":
+    unittest.main()
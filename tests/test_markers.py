@@ -0,0 +1,233 @@
+"""
+Unit test file.
+"""
+
+import os
+import select
+import threading
+import time
+import unittest
+from contextlib import ExitStack
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import markers
+from aicode.ignore_rules import IgnoreRules
+
+
+def _write(root: Path, rel: str, text: str = "x = 1\n") -> None:
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+class IgnoreRulesTester(unittest.TestCase):
+    """gitignore semantics of the compiled rules."""
+
+    def test_walk(self) -> None:
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _write(root, ".gitignore", "*.log\nbuild/\n/top.txt\n!keep.log\n")
+            _write(root, ".aiderignore", "secret/\n")
+            _write(root, ".git/info/exclude", "local.txt\n")
+            _write(root, "sub/.gitignore", "*.py\n!main.py\n")
+            for rel in [
+                "a.log",
+                "keep.log",
+                "top.txt",
+                "local.txt",
+                "ok.txt",
+                "build/out.txt",
+                "sub/build/out.txt",
+                "sub/top.txt",
+                "sub/x.py",
+                "sub/main.py",
+                "secret/key.txt",
+                ".git/config",
+            ]:
+                _write(root, rel)
+            rules = IgnoreRules(root, extra_files=[".aiderignore"])
+            files = sorted(rel for rel, _ in rules.walk_files())
+            self.assertEqual(
+                [
+                    ".aiderignore",
+                    ".gitignore",
+                    "keep.log",
+                    "ok.txt",
+                    "sub/.gitignore",
+                    "sub/main.py",
+                    "sub/top.txt",
+                ],
+                files,
+            )
+            self.assertTrue(rules.is_ignored("build/new/deeper.txt"))
+            self.assertFalse(rules.is_ignored("sub/main.py"))
+
+
+class MarkerIndexTester(unittest.TestCase):
+    """The index only reads the files that changed."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name) / "repo"
+        (self.root / ".git").mkdir(parents=True)
+        self.index_path = Path(self.temp_dir.name) / "index.json"
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_scan(self) -> None:
+        found = markers.scan_text(
+            "x = 1\n# make this faster, AI!\ny = 2  # ai?\n// AI: context\nmaid = 3\n"
+        )
+        self.assertEqual(
+            [
+                (2, "# make this faster, AI!", "!"),
+                (3, "# ai?", "?"),
+                (4, "// AI: context", None),
+            ],
+            found,
+        )
+
+    def test_incremental(self) -> None:
+        _write(self.root, "a.py", "# fix it AI!\n")
+        _write(self.root, "b.py")
+        _write(self.root, "node_modules/c.js", "// AI!\n")
+        index = markers.MarkerIndex(self.root, self.index_path)
+        self.assertEqual({"a.py"}, index.refresh())
+        self.assertEqual(
+            [markers.Marker("a.py", 1, "# fix it AI!", "!")], index.markers()
+        )
+        index.save()
+
+        index = markers.MarkerIndex(self.root, self.index_path)
+        self.assertTrue(index.exists)
+        _write(self.root, "b.py", "x = 2\n# AI?\n")
+        with mock.patch.object(markers, "scan_file", wraps=markers.scan_file) as scan:
+            self.assertEqual({"b.py"}, index.refresh())
+        self.assertEqual([mock.call(self.root.resolve() / "b.py")], scan.call_args_list)
+
+        (self.root / "a.py").unlink()
+        self.assertEqual({"a.py"}, index.update(["a.py"]))
+        self.assertEqual(["b.py"], [m.path for m in index.markers()])
+
+
+@unittest.skipUnless(markers.watch_supported(), "inotify is linux only")
+class MarkerWatcherTester(unittest.TestCase):
+    """Edits within the debounce window make one request."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        self.root = Path(self.temp_dir.name) / "repo"
+        (self.root / ".git").mkdir(parents=True)
+        _write(self.root, "old.py", "# AI! already there\n")
+        self.requests: list[list[markers.Marker]] = []
+        self.got_request = threading.Event()
+        index = markers.MarkerIndex(self.root, Path(self.temp_dir.name) / "index.json")
+        self.watcher = markers.MarkerWatcher(
+            index, self._on_request, debounce=0.5
+        ).start()
+        self.assertTrue(self.watcher.wait_ready(10))
+
+    def tearDown(self) -> None:
+        self.watcher.stop()
+        self.temp_dir.cleanup()
+
+    def _on_request(self, found: list[markers.Marker]) -> None:
+        self.requests.append(found)
+        self.got_request.set()
+
+    def test_burst_is_one_request(self) -> None:
+        _write(self.root, "a.py", "# rename this AI!\n")
+        time.sleep(0.1)
+        _write(self.root, "new_dir/b.py", "x = 1  # and this, ai!\n")
+        _write(self.root, "c.py", "# nothing asked here, AI\n")
+        self.assertTrue(self.got_request.wait(10))
+        time.sleep(1)
+        self.assertEqual(1, len(self.requests))
+        self.assertEqual(
+            ["a.py", "c.py", "new_dir/b.py"], [m.path for m in self.requests[0]]
+        )
+
+        # Saving again without new comments asks for nothing.
+        self.got_request.clear()
+        _write(self.root, "a.py", "# rename this AI!\n\n")
+        self.assertFalse(self.got_request.wait(1.5))
+
+
+@unittest.skipUnless(markers.watch_supported(), "inotify is linux only")
+class MarkerRequestsTester(unittest.TestCase):
+    """Requests are typed only at aider's prompt with an empty line."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        self.stack = ExitStack()
+        self.stack.enter_context(
+            mock.patch.object(
+                markers, "MARKERS_PATH", Path(self.temp_dir.name) / "markers"
+            )
+        )
+        self.tap = markers.MarkerRequests(Path(self.temp_dir.name))
+        self.found = [markers.Marker("my file.py", 3, "# AI!", "!")]
+
+    def tearDown(self) -> None:
+        self.tap.close()
+        self.stack.close()
+        self.temp_dir.cleanup()
+
+    def _request(self) -> None:
+        time.sleep(0.2)
+        self.tap._on_request(self.found)  # pylint: disable=protected-access
+
+    def _sent(self, timeout: float) -> str | None:
+        fd = self.tap.input_fd
+        assert fd is not None
+        if not select.select([fd], [], [], timeout)[0]:
+            return None
+        return os.read(fd, 4096).decode("utf-8")
+
+    def test_waits_for_enter(self) -> None:
+        self.tap.output(b"\x1b[?25l\r\x1b[K> \x1b[?25h")
+        self.tap.input(b"half a li")
+        self._request()
+        self.assertIsNone(self._sent(0.3))
+        self.tap.input(b"ne\r")
+        self.assertIsNone(self._sent(0.3))
+        self.tap.output(b"\r\nDone.\r\n\r\n> ")
+        sent = self._sent(5)
+        self.assertEqual(markers.format_request(self.found), sent)
+        assert sent is not None
+        self.assertTrue(sent.startswith('/add "my file.py"\r'))
+
+    def test_waits_while_aider_is_busy(self) -> None:
+        # Streaming a response, then asking a question.
+        self.tap.output(b"Sure, here is the change:\r\n")
+        self._request()
+        self.assertIsNone(self._sent(0.3))
+        self.tap.output(b"Add main.py to the chat? (Y)es/(N)o [Yes]: ")
+        self.assertIsNone(self._sent(0.3))
+        self.tap.input(b"y\r")
+        self.tap.output(b"\r\nAdded main.py to the chat\r\ndiff multi> ")
+        self.assertEqual(markers.format_request(self.found), self._sent(5))
+
+    def test_ignores_prompt_lookalikes(self) -> None:
+        self._request()
+        # Tool output that ends in "> ", and a prompt that is only passed.
+        self.tap.output(b"$ make\r\nbuild> ")
+        self.assertIsNone(self._sent(0.5))
+        self.tap.output(b"\r\n> ")
+        self.tap.output(b"\r\nstill running\r\n")
+        self.assertIsNone(self._sent(0.5))
+        self.tap.output(b"> ")
+        self.assertEqual(markers.format_request(self.found), self._sent(5))
+
+    def test_opt_in(self) -> None:
+        with mock.patch.dict(os.environ, {"AICODE_MARKER_WATCH": ""}):
+            self.assertFalse(markers.use_marker_watch(["aider", "--watch"]))
+        with mock.patch.dict(os.environ, {"AICODE_MARKER_WATCH": "1"}):
+            self.assertTrue(markers.marker_watch_enabled())
+
+
+if __name__ == "__main__":
+    unittest.main()
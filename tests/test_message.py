@@ -2,56 +2,42 @@
 Unit test for message file functionality.
 """
 
-import os
-import subprocess
-import tempfile
 import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from launch_stub import stubbed_launch
+
+from aicode.args import Args
+from aicode.build_cmd_list import build_cmd_list_or_die
 
 
 class MessageFileTester(unittest.TestCase):
     """Test class for message file functionality."""
 
-    @unittest.skip(
-        "This will block forever, we need an option for a file to run this in script mode."
-    )
     def test_message_file_arg(self) -> None:
-        """Test that --message-file argument is properly passed to aider."""
-        # Create a temporary message file
-        with tempfile.NamedTemporaryFile(mode="w", delete=False) as temp_file:
-            temp_file.write("Test message for aider")
-            temp_path = temp_file.name
-
-        stdout: str = "NOTHING YET"
-        stderr: str = "NOTHING YET"
-
-        try:
-            # Run aicode with --message-file and capture the command that would be executed
-            result = subprocess.run(
-                ["python", "-m", "aicode", "--message-file", temp_path],
-                capture_output=True,
-                text=True,
-                check=False,
-                shell=True,
-            )
-
-            stdout = result.stdout
-            stderr = result.stderr
-            assert stdout is not None
-            assert stderr is not None
-
-            # Check that the output contains the --message-file argument with the correct path
-            self.assertIn(f"--message-file {temp_path}", result.stdout)
-
-            # Verify the command executed successfully
-            self.assertEqual(0, result.returncode)
-        finally:
-            # Clean up the temporary file
-
-            # print out stdout and stderr for debugging
-            print("STDOUT:", stdout)
-            print("STDERR:", stderr)
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        """Test that --message-file is passed to aider without any prompt."""
+        with TemporaryDirectory() as temp_dir:
+            tmp = Path(temp_dir)
+            message_file = tmp / "message.md"
+            message_file.write_text("Test message for aider", encoding="utf-8")
+            with (
+                stubbed_launch(tmp) as repo,
+                mock.patch("builtins.input", side_effect=AssertionError("prompted")),
+                mock.patch("aicode.build_cmd_list.maybe_prewarm") as prewarm,
+            ):
+                # Missing .gitignore entries would be asked about otherwise.
+                (repo / ".gitignore").unlink()
+                args = Args.parse(["--claude", "--message-file", str(message_file)])
+                cmd_list, _ = build_cmd_list_or_die(args)
+        # aider starts right away, there is no prompt to warm during.
+        prewarm.assert_not_called()
+        index = cmd_list.index("--message-file")
+        self.assertEqual(str(message_file), cmd_list[index + 1])
+        # CLI, and no --watch since aider exits after the message.
+        self.assertNotIn("--gui", cmd_list)
+        self.assertNotIn("--watch", cmd_list)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+"""
+Unit test file.
+"""
+
+import os
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode.metrics import (
+    SessionMetrics,
+    connect,
+    metrics_enabled,
+    parse_token_count,
+    percentile,
+    query_stats,
+)
+
+_TOKENS_LINE = (
+    b"\x1b[32mTokens: 2.4k sent, 1.1k cache write, 156 received. "
+    b"Cost: $0.01 message, $0.05 session.\x1b[0m\r\n"
+)
+
+
+class MetricsTester(unittest.TestCase):
+    """Tests for the session metrics database."""
+
+    def test_parse_token_count(self) -> None:
+        self.assertEqual(2400, parse_token_count("2.4k"))
+        self.assertEqual(156, parse_token_count("156"))
+        self.assertEqual(1_000_000, parse_token_count("1M"))
+
+    def test_opt_in(self) -> None:
+        # Off by default, so that launches keep the direct-exec path.
+        with mock.patch.dict(os.environ, {"AICODE_METRICS": ""}):
+            self.assertFalse(metrics_enabled())
+        with mock.patch.dict(os.environ, {"AICODE_METRICS": "1"}):
+            self.assertTrue(metrics_enabled())
+
+    def test_percentile(self) -> None:
+        self.assertIsNone(percentile([], 50))
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(50.0, percentile(values, 50))
+        self.assertEqual(95.0, percentile(values, 95))
+        self.assertEqual(2.0, percentile([3.0, 2.0], 50))
+
+    def test_session_is_recorded(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "metrics.sqlite3"
+            tap = SessionMetrics(
+                "anthropic/claude-opus-4-20250514", repo=Path(temp_dir), db_path=db_path
+            )
+            t0 = tap._start  # pylint: disable=protected-access
+            # The tap's thread is idle, events are fed in directly with
+            # made up times.
+            events = [
+                (1.0, "o", b"Aider v0.86.2\r\n"),
+                (2.0, "i", b"fix it\r"),
+                (2.01, "o", b"fix it\r\n"),
+                (5.0, "o", _TOKENS_LINE),
+                (6.0, "o", b"Applied edit to a.py\r\n"),
+                (9.0, "o", b"1 passed\r\n"),
+                (20.0, "o", b"> "),
+                (20.0, "i", b"/add b.py\r"),
+                (30.0, "i", b"and b too\r"),
+                (32.0, "o", b"Tokens: 1M sent, 12 received.\r\n"),
+            ]
+            for offset, kind, data in events:
+                tap.handle(t0 + offset, kind, data)
+            tap.close()
+
+            conn = connect(db_path)
+            try:
+                turns = conn.execute(
+                    "SELECT turn, llm_seconds, tokens_sent, tokens_received, cost, edit_seconds, lint_test_seconds FROM turns ORDER BY turn"
+                ).fetchall()
+                startup = conn.execute(
+                    "SELECT startup_seconds, model FROM sessions"
+                ).fetchall()
+                stats = query_stats(conn, since=time.time() - 60)
+            finally:
+                conn.close()
+        self.assertEqual(
+            [(1.0, "anthropic/claude-opus-4-20250514")],
+            [(round(s, 3), m) for s, m in startup],
+        )
+        self.assertEqual(2, len(turns))
+        turn, llm, sent, received, cost, edit, lint_test = turns[0]
+        self.assertEqual((0, 2400, 156), (turn, sent, received))
+        self.assertAlmostEqual(3.0, llm)
+        self.assertAlmostEqual(0.01, cost)
+        self.assertAlmostEqual(1.0, edit)
+        # Up to the prompt, not up to the next Enter.
+        self.assertAlmostEqual(14.0, lint_test)
+        self.assertAlmostEqual(2.0, turns[1][1])
+        self.assertIsNone(turns[1][5])
+        self.assertEqual(1, len(stats.models))
+        self.assertEqual(2, stats.models[0].turns)
+        model = stats.models[0]
+        assert model.p50_llm_seconds is not None
+        assert model.p95_llm_seconds is not None
+        self.assertAlmostEqual(2.0, model.p50_llm_seconds)
+        self.assertAlmostEqual(3.0, model.p95_llm_seconds)
+        self.assertEqual(1_002_400, stats.days[0].tokens_sent)
+        self.assertEqual(1, len(stats.slowest_repos))
+
+
+if __name__ == "__main__":
+    unittest.main()
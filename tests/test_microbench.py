@@ -0,0 +1,69 @@
+"""
+Unit test file.
+"""
+
+import json
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+# The runner is not part of the package, it lives next to its baseline.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+from microbench import (  # noqa: E402
+    BENCHMARKS,
+    compare,
+    main,
+    run_benchmarks,
+    to_json_data,
+)
+
+
+def _data(**normalized: float) -> dict:
+    return {
+        "results": {
+            name: {"name": name, "seconds": value, "normalized": value}
+            for name, value in normalized.items()
+        }
+    }
+
+
+class MicrobenchTester(unittest.TestCase):
+    """Tests for the microbenchmark runner."""
+
+    def test_compare(self) -> None:
+        baseline = _data(fast=1.0, slow=1.0, gone=1.0)
+        current = _data(fast=0.5, slow=2.0, new=1.0)
+        ratios, regressions = compare(baseline, current, threshold=1.5)
+        self.assertEqual({"fast": 0.5, "slow": 2.0}, ratios)
+        self.assertEqual(["slow"], [r.name for r in regressions])
+
+    def test_every_benchmark_runs(self) -> None:
+        calibration, results = run_benchmarks(min_time=0.01)
+        self.assertGreater(calibration, 0)
+        self.assertEqual(list(BENCHMARKS), [r.name for r in results])
+        data = to_json_data(calibration, results)
+        self.assertTrue(all(r["normalized"] > 0 for r in data["results"].values()))
+
+    def test_threshold_fails_the_run(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            baseline = Path(temp_dir) / "baseline.json"
+            argv = [
+                "--baseline",
+                str(baseline),
+                "--only",
+                "update_result_from_json",
+                "--min-time",
+                "0.01",
+            ]
+            self.assertEqual(0, main(argv + ["--save"]))
+            data = json.loads(baseline.read_text(encoding="utf-8"))
+            data["results"]["update_result_from_json"]["normalized"] /= 100
+            baseline.write_text(json.dumps(data), encoding="utf-8")
+            self.assertEqual(1, main(argv))
+            self.assertEqual(0, main(argv + ["--threshold", "1000"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
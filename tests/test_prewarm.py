@@ -0,0 +1,167 @@
+"""
+Unit test file.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from contextlib import ExitStack
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import prewarm
+
+# Stands in for the parts of aider that the worker uses, so the test needs
+# no aider install. The tags cache is a json file of fname -> mtime.
+_FAKE_AIDER = {
+    "__init__.py": "",
+    "utils.py": """
+import os
+
+
+def safe_abs_path(res):
+    return os.path.realpath(res)
+""",
+    "repo.py": """
+import subprocess
+
+
+class GitRepo:
+    def __init__(self, io, fnames, git_dname, aider_ignore_file=None):
+        self.root = git_dname
+
+    def get_tracked_files(self):
+        out = subprocess.run(["git", "ls-files"], cwd=self.root, capture_output=True, text=True, check=True)
+        return out.stdout.split()
+
+    def ignored_file(self, fname):
+        return fname.startswith("ignored")
+""",
+    "repomap.py": """
+import json
+import os
+
+
+class RepoMap:
+    def __init__(self, root=None, io=None):
+        self.path = os.path.join(root, ".fake.tags.json")
+        self.cache = json.load(open(self.path)) if os.path.exists(self.path) else {}
+
+    def get_tags_raw(self, fname, rel_fname):
+        return []
+
+    def get_tags(self, fname, rel_fname):
+        mtime = os.path.getmtime(fname)
+        if self.cache.get(fname) != mtime:
+            self.get_tags_raw(fname, rel_fname)
+            self.cache[fname] = mtime
+            with open(self.path, "w") as f:
+                json.dump(self.cache, f)
+        return []
+""",
+}
+
+
+def _git(repo: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+class PrewarmTester(unittest.TestCase):
+    """Runs the prewarm worker against a fake aider."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        root = Path(self.temp_dir.name)
+        (root / "aider").mkdir()
+        for name, content in _FAKE_AIDER.items():
+            (root / "aider" / name).write_text(content, encoding="utf-8")
+        self.repo = root / "repo"
+        self.repo.mkdir()
+        for name in ["a.py", "b.py", "ignored.py"]:
+            (self.repo / name).write_text("x = 1\n", encoding="utf-8")
+        _git(self.repo, "init", "-q")
+        _git(self.repo, "add", ".")
+        _git(self.repo, "commit", "-qm", "init")
+        self.stack = ExitStack()
+        self.stack.enter_context(
+            mock.patch.object(prewarm, "PREWARM_PATH", root / "prewarm")
+        )
+        self.stack.enter_context(
+            mock.patch.object(prewarm, "_venv_python", return_value=sys.executable)
+        )
+        self.stack.enter_context(mock.patch.dict(os.environ, {"PYTHONPATH": str(root)}))
+
+    def tearDown(self) -> None:
+        self.stack.close()
+        self.temp_dir.cleanup()
+
+    def test_warms_then_hits(self) -> None:
+        result = prewarm.prewarm_repo(self.repo)
+        self.assertIsNone(result.error)
+        self.assertEqual((2, 2), (result.files, result.parsed))
+        cache = json.loads((self.repo / ".fake.tags.json").read_text(encoding="utf-8"))
+        self.assertEqual(2, len(cache))
+        result = prewarm.prewarm_repo(self.repo)
+        self.assertEqual((2, 0), (result.files, result.parsed))
+
+    @unittest.skipIf(sys.platform == "win32", "the test holds the lock with fcntl")
+    def test_one_worker_per_repo(self) -> None:
+        lock_path = prewarm._state_path(self.repo.resolve()).with_suffix(".lock")
+        lock_path.parent.mkdir(parents=True)
+        holder = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import fcntl, sys, time; f = open(sys.argv[1], 'a'); fcntl.flock(f, fcntl.LOCK_EX); print(flush=True); time.sleep(60)",
+                str(lock_path),
+            ],
+            stdout=subprocess.PIPE,
+        )
+        try:
+            assert holder.stdout is not None
+            holder.stdout.readline()
+            self.assertTrue(prewarm.prewarm_repo(self.repo).busy)
+        finally:
+            holder.kill()
+            holder.wait()
+
+    def test_background_start(self) -> None:
+        with mock.patch("aicode.install_gc.write_lease"):
+            proc = prewarm.start_prewarm(self.repo)
+            assert proc is not None
+            self.assertEqual(0, proc.wait(timeout=60))
+            # Just warmed, the next launch leaves it alone.
+            self.assertIsNone(prewarm.start_prewarm(self.repo))
+        self.assertTrue((self.repo / ".fake.tags.json").exists())
+
+    def test_launch_hook(self) -> None:
+        with (
+            mock.patch.object(
+                prewarm, "start_prewarm", wraps=prewarm.start_prewarm
+            ) as start,
+            # No install to start a worker with.
+            mock.patch.object(prewarm, "_venv_python", return_value=None),
+        ):
+            prewarm.maybe_prewarm(self.repo, [])
+            prewarm.finish_prewarm(timeout=10)
+            # Counts as warmed once tried, the next launch only does a stat.
+            prewarm.maybe_prewarm(self.repo, [])
+            prewarm.finish_prewarm(timeout=10)
+        self.assertEqual(1, start.call_count)
+
+    def test_repo_map_disabled(self) -> None:
+        self.assertTrue(prewarm.repo_map_disabled(["--map-tokens", "0"]))
+        self.assertTrue(prewarm.repo_map_disabled(["--map-tokens=0"]))
+        self.assertFalse(prewarm.repo_map_disabled(["--map-tokens", "1024", "x.py"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
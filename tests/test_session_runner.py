@@ -0,0 +1,104 @@
+"""
+Unit test file.
+"""
+
+import gzip
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode.session_runner import (
+    RingBuffer,
+    SessionLog,
+    _run_in_pty,
+    _run_with_pipe,
+)
+
+# Prints 200 numbered lines, a multi-byte character split over two writes,
+# then fails.
+_CHILD = """
+import sys, time
+for i in range(200):
+    print(f"line {i}")
+sys.stdout.flush()
+sys.stdout.buffer.write("\\u00e9".encode()[:1]); sys.stdout.flush(); time.sleep(0.05)
+sys.stdout.buffer.write("\\u00e9".encode()[1:] + b"\\n"); sys.stdout.flush()
+sys.exit(3)
+"""
+
+
+def _fake_open_proc(cmd_list: list[str], **process_args) -> subprocess.Popen:
+    return subprocess.Popen(
+        cmd_list, **process_args
+    )  # pylint: disable=consider-using-with
+
+
+def _read_events(path: Path) -> tuple[dict, list[list]]:
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    return json.loads(lines[0]), [json.loads(line) for line in lines[1:]]
+
+
+class SessionRunnerTester(unittest.TestCase):
+    """Tests for the aider session runner."""
+
+    def test_ring_buffer_keeps_tail(self) -> None:
+        ring = RingBuffer(10)
+        for i in range(100):
+            ring.write(f"{i:03d}".encode("ascii"))
+        self.assertEqual(b"7098099", ring.getvalue()[-7:])
+        self.assertEqual(10, len(ring.getvalue()))
+
+    @mock.patch("aicode.aider_control.aider_open_proc", _fake_open_proc)
+    def test_pipe_session(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            cmd_list = [sys.executable, "-c", _CHILD]
+            log = SessionLog(Path(temp_dir) / "session.cast.gz", cmd_list)
+            ring = RingBuffer(64)
+            read_fd, write_fd = os.pipe()
+            returncode = _run_with_pipe(cmd_list, ring, [log], write_fd)
+            log.close()
+            os.close(write_fd)
+            with os.fdopen(read_fd, "rb") as forwarded:
+                self.assertIn(b"line 199", forwarded.read())
+            self.assertEqual(3, returncode)
+            self.assertTrue(ring.getvalue().endswith("line 199\né\n".encode("utf-8")))
+            header, events = _read_events(log.path)
+            self.assertEqual(2, header["version"])
+            text = "".join(event[2] for event in events if event[1] == "o")
+            self.assertIn("line 0\n", text)
+            self.assertIn("é", text)
+            offsets = [event[0] for event in events]
+            self.assertEqual(sorted(offsets), offsets)
+
+    @unittest.skipIf(sys.platform == "win32", "no pty on Windows")
+    @mock.patch("aicode.aider_control.aider_open_proc", _fake_open_proc)
+    def test_pty_session(self) -> None:
+        import pty
+
+        # Stands in for the user's terminal.
+        term_master, term_slave = pty.openpty()
+        ring = RingBuffer()
+        try:
+            os.write(term_master, b"hello\r")
+            cmd_list = [
+                sys.executable,
+                "-c",
+                "import os, sys; print('got', input(), os.tcgetpgrp(0) == os.getpgrp()); sys.exit(2)",
+            ]
+            returncode = _run_in_pty(cmd_list, ring, [], term_slave, term_slave)
+        finally:
+            os.close(term_slave)
+            os.close(term_master)
+        self.assertEqual(2, returncode)
+        # The pty is the controlling terminal of aider's process group.
+        self.assertIn(b"got hello True", ring.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Unit test file.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode.aider_control import _get_highest_version_path, get_venv_bin
+from aicode.install_manifest import STATUS_FAILED, load_manifest
+from aicode.staged_upgrade import stage_upgrade
+
+_FAKE_AIDER = """#!{python}
+print("aider {version}")
+"""
+
+
+def _fake_install(version: str):
+    """Stands in for aider_install, builds a generation with a fake aider."""
+    from aicode.aider_control import _reserve_next_install_path, _set_generation
+    from aicode.install_manifest import STATUS_INSTALLED, describe_generation
+
+    def _install(root: Path, aider_version: str | None = None, activate: bool = True):
+        path = _reserve_next_install_path(root, aider_version)
+        get_venv_bin(path).mkdir(parents=True)
+        aider = get_venv_bin(path) / "aider"
+        aider.write_text(
+            _FAKE_AIDER.format(python=sys.executable, version=version), encoding="utf-8"
+        )
+        aider.chmod(0o755)
+        (path / "installed").touch()
+        generation = describe_generation(path, STATUS_INSTALLED)
+        generation.aider_version = aider_version
+        _set_generation(root, generation, activate)
+        return path
+
+    return _install
+
+
+@unittest.skipIf(sys.platform == "win32", "fake aider is a shebang script")
+class StagedUpgradeTester(unittest.TestCase):
+    """Tests for staged background upgrades."""
+
+    def _stage(self, root: Path, built: str, wanted: str | None) -> Path | None:
+        with (
+            mock.patch("aicode.aider_control.aider_install", _fake_install(built)),
+            mock.patch("aicode.staged_upgrade._clear_update_info"),
+        ):
+            return stage_upgrade(root, wanted)
+
+    def test_activates_after_smoke_test(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            first = self._stage(root, "0.1.0", "0.1.0")
+            self.assertEqual(first, _get_highest_version_path(root))
+            second = self._stage(root, "0.2.0", "0.2.0")
+            self.assertEqual(second, _get_highest_version_path(root))
+            # Already there, nothing to do.
+            self.assertIsNone(self._stage(root, "0.2.0", "0.2.0"))
+
+    def test_failed_smoke_test_keeps_active(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            first = self._stage(root, "0.1.0", "0.1.0")
+            with self.assertRaises(RuntimeError):
+                # Built something else than what was asked for.
+                self._stage(root, "0.1.0", "0.2.0")
+            manifest = load_manifest(root)
+            self.assertEqual(first, root / str(manifest.active))
+            self.assertEqual(STATUS_FAILED, manifest.generations["1"].status)
+
+
+if __name__ == "__main__":
+    unittest.main()
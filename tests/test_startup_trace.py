@@ -0,0 +1,57 @@
+"""
+Unit test file.
+"""
+
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aicode import startup_trace
+from aicode.args import Args, pop_trace_startup
+
+
+class StartupTraceTester(unittest.TestCase):
+    """Tests for the --trace-startup tracer."""
+
+    def test_pop_trace_startup(self) -> None:
+        trace_file, rest = pop_trace_startup(["--trace-startup", "main.py"])
+        self.assertEqual(startup_trace.DEFAULT_TRACE_FILE, trace_file)
+        # The bare flag must not swallow the next positional arg.
+        self.assertEqual(["main.py"], rest)
+        trace_file, rest = pop_trace_startup(["--trace-startup=out.json", "--cli"])
+        self.assertEqual("out.json", trace_file)
+        self.assertEqual(["--cli"], rest)
+        self.assertEqual(
+            "out.json", Args.parse(["--trace-startup=out.json"]).trace_startup
+        )
+
+    def test_chrome_trace_output(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            out_path = Path(temp_dir) / "trace.json"
+            startup_trace.enable(out_path)
+            try:
+                with startup_trace.span("outer"):
+                    with startup_trace.span("inner"):
+                        pass
+                startup_trace.mark("first_byte")
+            finally:
+                startup_trace.finish()
+            self.assertIsNone(startup_trace.get_tracer())
+            data = json.loads(out_path.read_text(encoding="utf-8"))
+        events = {e["name"]: e for e in data["traceEvents"]}
+        self.assertEqual("X", events["outer"]["ph"])
+        self.assertGreaterEqual(events["outer"]["dur"], events["inner"]["dur"])
+        self.assertEqual("i", events["first_byte"]["ph"])
+
+    def test_disabled_is_noop(self) -> None:
+        @startup_trace.traced("noop")
+        def add(a: int, b: int) -> int:
+            return a + b
+
+        self.assertIsNone(startup_trace.get_tracer())
+        self.assertEqual(3, add(1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Unit test file.
+"""
+
+import threading
+import time
+import unittest
+from contextlib import ExitStack
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode import openaicfg
+from aicode.aider_update_result import AiderUpdateResult
+from aicode.background import (
+    _check_for_update,
+    background_update_process,
+    backoff_seconds,
+    clear_update_info,
+    update_check_maybe_due,
+)
+from aicode.config import Config
+
+
+class UpdateCheckTester(unittest.TestCase):
+    """Tests for the TTL based background update check."""
+
+    def setUp(self) -> None:
+        self.temp_dir = TemporaryDirectory()
+        storage_path = Path(self.temp_dir.name)
+        self.stack = ExitStack()
+        self.stack.enter_context(
+            mock.patch.object(openaicfg, "STORAGE_PATH", storage_path)
+        )
+        self.stack.enter_context(
+            mock.patch(
+                "aicode.background._UPDATE_CHECK_LOCK",
+                storage_path / "update_check.lock",
+            )
+        )
+        self.stack.enter_context(mock.patch("aicode.staged_upgrade.maybe_stage_update"))
+        openaicfg.reload_storage()
+
+    def tearDown(self) -> None:
+        self.stack.close()
+        openaicfg.reload_storage()
+        self.temp_dir.cleanup()
+
+    def test_concurrent_checks_run_once(self) -> None:
+        calls: list[int] = []
+
+        def _fetch() -> AiderUpdateResult:
+            calls.append(1)
+            time.sleep(0.5)
+            return AiderUpdateResult(True, "0.2.0", "0.1.0")
+
+        with mock.patch("aicode.aider_control.aider_fetch_update_status", _fetch):
+            threads = [threading.Thread(target=_check_for_update) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Within the TTL, so nothing to do.
+            _check_for_update()
+        self.assertEqual(1, len(calls))
+        openaicfg.reload_storage()
+        config = Config.load()
+        self.assertEqual("0.2.0", config.aider_update_info["latest_version"])
+        self.assertGreater(config.aider_update_next_check, time.time())
+
+    def test_stamp_skips_the_process(self) -> None:
+        # No stamp yet, a check may be due.
+        self.assertTrue(update_check_maybe_due(None))
+        with mock.patch(
+            "aicode.aider_control.aider_fetch_update_status",
+            return_value=AiderUpdateResult(False, "0.1.0", "0.1.0"),
+        ):
+            _check_for_update()
+        self.assertFalse(update_check_maybe_due(None))
+        with mock.patch("subprocess.Popen") as popen:
+            self.assertIsNone(background_update_process(None))
+        popen.assert_not_called()
+        clear_update_info()
+        self.assertTrue(update_check_maybe_due(None))
+
+    def test_failure_backs_off(self) -> None:
+        def _fetch() -> AiderUpdateResult:
+            raise RuntimeError("no network")
+
+        with mock.patch("aicode.aider_control.aider_fetch_update_status", _fetch):
+            with self.assertRaises(RuntimeError):
+                _check_for_update()
+        openaicfg.reload_storage()
+        config = Config.load()
+        self.assertEqual(1, config.aider_update_failures)
+        self.assertGreater(config.aider_update_next_check, time.time())
+
+    def test_backoff_grows_with_jitter(self) -> None:
+        self.assertLessEqual(backoff_seconds(1), 1.5 * 5 * 60)
+        self.assertGreaterEqual(backoff_seconds(3), 0.5 * 20 * 60)
+        self.assertLessEqual(backoff_seconds(100), 1.5 * 12 * 60 * 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
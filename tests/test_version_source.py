@@ -0,0 +1,85 @@
+"""
+Unit test file.
+"""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from aicode.aider_control import aider_fetch_update_status, get_venv_path
+from aicode.install_manifest import get_site_packages
+from aicode.version_source import JsonIndexSource, MirrorDirSource
+
+
+class _IndexHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        if self.path != "/aider-chat/json":
+            self.send_error(404)
+            return
+        body = json.dumps({"info": {"version": "0.90.1"}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+        pass
+
+
+class VersionSourceTester(unittest.TestCase):
+    """Tests for the in-process aider version lookup."""
+
+    def test_json_index(self) -> None:
+        server = HTTPServer(("127.0.0.1", 0), _IndexHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            source = JsonIndexSource(f"http://127.0.0.1:{server.server_port}")
+            self.assertEqual("0.90.1", source.latest_version("aider-chat"))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_mirror_dir(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            mirror = Path(temp_dir)
+            (mirror / "wheels").mkdir()
+            (mirror / "wheels" / "aider_chat-0.9.0-py3-none-any.whl").touch()
+            (mirror / "wheels" / "aider_chat-0.10.0-py3-none-any.whl").touch()
+            (mirror / "aider-chat-0.8.0.tar.gz").touch()
+            (mirror / "other-1.0.0-py3-none-any.whl").touch()
+            source = MirrorDirSource(mirror)
+            self.assertEqual("0.10.0", source.latest_version("aider-chat"))
+
+    def test_update_status_without_aider(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            install_path = Path(temp_dir)
+            (install_path / "installed").touch()
+            site_packages = (
+                get_venv_path(install_path) / "lib" / "python3.11" / "site-packages"
+            )
+            site_packages.mkdir(parents=True)
+            self.assertEqual(
+                site_packages, get_site_packages(get_venv_path(install_path))
+            )
+            (site_packages / "aider_chat-0.86.2.dist-info").mkdir()
+            mirror = install_path / "mirror"
+            mirror.mkdir()
+            (mirror / "aider_chat-0.87.0-py3-none-any.whl").touch()
+            with mock.patch("aicode.aider_control.aider_run") as aider_run:
+                result = aider_fetch_update_status(
+                    install_path, MirrorDirSource(mirror)
+                )
+                aider_run.assert_not_called()
+            self.assertTrue(result.has_update)
+            self.assertEqual("0.86.2", result.current_version)
+            self.assertEqual("0.87.0", result.latest_version)
+
+
+if __name__ == "__main__":
+    unittest.main()
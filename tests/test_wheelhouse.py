@@ -0,0 +1,102 @@
+"""
+Unit test file.
+"""
+
+import json
+import platform
+import shutil
+import sys
+import sysconfig
+import time
+import unittest
+import zipfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aicode.aider_control import REQUIREMENTS_TXT, _get_highest_version_path
+from aicode.install_manifest import read_aider_version
+from aicode.wheelhouse import (
+    REQUIREMENTS_FILE,
+    WHEELHOUSE_FILE,
+    WHEELS_DIR,
+    Wheelhouse,
+    WheelhouseError,
+    _sha256,
+    install_from_wheelhouse,
+    load_wheelhouse,
+    pinned_requirements,
+)
+
+_WHEEL = "aider_chat-0.1.0-py3-none-any.whl"
+_WHEEL_FILES = {
+    "aider_fake/__init__.py": "def main():\n    print('aider 0.1.0')\n",
+    "aider_chat-0.1.0.dist-info/METADATA": (
+        "Metadata-Version: 2.1\nName: aider-chat\nVersion: 0.1.0\n"
+    ),
+    "aider_chat-0.1.0.dist-info/WHEEL": (
+        "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\nTag: py3-none-any\n"
+    ),
+    "aider_chat-0.1.0.dist-info/entry_points.txt": (
+        "[console_scripts]\naider = aider_fake:main\n"
+    ),
+}
+
+
+def _make_wheelhouse(out_dir: Path) -> None:
+    """A wheelhouse with a single fake aider-chat wheel."""
+    (out_dir / WHEELS_DIR).mkdir(parents=True)
+    wheel = out_dir / WHEELS_DIR / _WHEEL
+    with zipfile.ZipFile(wheel, "w") as zf:
+        for name, content in _WHEEL_FILES.items():
+            zf.writestr(name, content)
+        record = [f"{name},," for name in _WHEEL_FILES]
+        record.append("aider_chat-0.1.0.dist-info/RECORD,,")
+        zf.writestr("aider_chat-0.1.0.dist-info/RECORD", "\n".join(record) + "\n")
+    wheels = {_WHEEL: _sha256(wheel)}
+    wheelhouse = Wheelhouse(
+        aider_version="0.1.0",
+        python_version=platform.python_version(),
+        platform=sysconfig.get_platform(),
+        requirements_in=REQUIREMENTS_TXT,
+        created=time.time(),
+        wheels=wheels,
+    )
+    (out_dir / REQUIREMENTS_FILE).write_text(
+        pinned_requirements(wheels), encoding="utf-8"
+    )
+    (out_dir / WHEELHOUSE_FILE).write_text(
+        json.dumps(wheelhouse.to_json_data()), encoding="utf-8"
+    )
+
+
+class WheelhouseTester(unittest.TestCase):
+    """Tests for offline installs from a wheelhouse."""
+
+    def test_pinned_requirements(self) -> None:
+        reqs = pinned_requirements({_WHEEL: "abc"})
+        self.assertEqual("aider_chat==0.1.0 --hash=sha256:abc\n", reqs)
+
+    def test_tampered_wheel_is_rejected(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            out_dir = Path(temp_dir)
+            _make_wheelhouse(out_dir)
+            self.assertIn(_WHEEL, load_wheelhouse(out_dir).wheels)
+            with open(out_dir / WHEELS_DIR / _WHEEL, "ab") as file:
+                file.write(b"tampered")
+            with self.assertRaises(WheelhouseError):
+                load_wheelhouse(out_dir)
+
+    @unittest.skipIf(shutil.which("uv") is None, "uv not installed")
+    @unittest.skipIf(sys.platform == "win32", "posix venv layout")
+    def test_offline_install(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            out_dir = Path(temp_dir) / "wheelhouse"
+            root = Path(temp_dir) / "install"
+            _make_wheelhouse(out_dir)
+            path = install_from_wheelhouse(out_dir, root)
+            self.assertEqual(path, _get_highest_version_path(root))
+            self.assertEqual("0.1.0", read_aider_version(path / ".venv" / ".venv"))
+
+
+if __name__ == "__main__":
+    unittest.main()
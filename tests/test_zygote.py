@@ -0,0 +1,87 @@
+"""
+Unit test file.
+"""
+
+import os
+import subprocess
+import sys
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from aicode import zygote
+
+# Stands in for aider inside the worker, so the test needs no aider install.
+_FAKE_AIDER_MAIN = """
+import os
+import sys
+
+
+def main(argv):
+    print("fake aider", " ".join(argv), os.environ.get("AICODE_TEST"))
+    return 3
+"""
+
+
+@unittest.skipUnless(zygote.is_supported(), "warm workers need unix sockets")
+class ZygoteTester(unittest.TestCase):
+    """Runs the warm worker protocol end to end against a fake aider."""
+
+    def test_fork_session(self) -> None:
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root / "aider").mkdir()
+            (root / "aider" / "__init__.py").write_text("", encoding="utf-8")
+            (root / "aider" / "main.py").write_text(_FAKE_AIDER_MAIN, encoding="utf-8")
+            sock_path = root / "w.sock"
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    str(zygote._SERVER_SCRIPT),  # pylint: disable=protected-access
+                    "--socket",
+                    str(sock_path),
+                    "--idle-timeout",
+                    "30",
+                ],
+                env={**os.environ, "PYTHONPATH": str(root)},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                self.assertTrue(self._wait_for_socket(sock_path))
+                read_fd, write_fd = os.pipe()
+                sock = zygote._connect(sock_path)  # pylint: disable=protected-access
+                assert sock is not None
+                with sock, open(os.devnull, "rb") as devnull:
+                    env = {"AICODE_TEST": "env-ok"}
+                    fds = [devnull.fileno(), write_fd, write_fd]
+                    pid, replies = (
+                        zygote._start_session(  # pylint: disable=protected-access
+                            sock, ["aider", "--yes-always"], env, fds
+                        )
+                    )
+                    os.close(write_fd)
+                    self.assertGreater(pid, 0)
+                    rtn = zygote._wait_session(
+                        replies
+                    )  # pylint: disable=protected-access
+                with os.fdopen(read_fd, "r", encoding="utf-8") as output:
+                    text = output.read()
+                self.assertEqual(3, rtn)
+                self.assertIn("fake aider --yes-always env-ok", text)
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+            self.assertFalse(sock_path.exists())
+
+    def _wait_for_socket(self, sock_path: Path) -> bool:
+        for _ in range(100):
+            if zygote._is_running(sock_path):  # pylint: disable=protected-access
+                return True
+            time.sleep(0.05)
+        return False
+
+
+if __name__ == "__main__":
+    unittest.main()